@@ -2,8 +2,26 @@ import math
 import wpilib
 import sys
 
+from autonomous import timeline
+
+#: Drive towards the switch while raising the lift, then eject the cube (as
+#: planned by autonomous.schedule_planner, from the drive, lift and eject
+#: times the routine has always used on the robot). The drive angle and
+#: speed depend on the game data. Can be overridden by the
+#: 'Auto: Baseline Timeline' preference.
+baseline_timeline = timeline.Timeline([
+    (1, {'angle': 'drive angle', 'lift': -0.6, 'speed': 'drive speed'}),
+    (2, {'lift': -0.08}),
+    (1, {'claw': -0.5, 'speed': 0}),
+    (0, {'angle': 0, 'claw': 0, 'lift': -0.03}),
+])
+
 
 class Autonomous:
+    #: How long to wait for the game data before going ahead without it, in
+    #: seconds.
+    game_data_timeout = 1
+
     def __init__(self, robot, robot_position):
         self.robot = robot
         if robot_position is None:
@@ -19,14 +37,6 @@ class Autonomous:
         self.timer.start()
 
         self.field_string = ''
-        ds = wpilib.DriverStation.getInstance()
-        while self.timer.get() < 1 and len(self.field_string) == 0:
-            fms_message = ds.getGameSpecificMessage().decode("utf-8")
-            if fms_message is None:
-                fms_message = ''
-
-            self.field_string = fms_message.upper()
-
         self.drive_speed = 150
 
         # Note: positive angles = rightward
@@ -43,46 +53,57 @@ class Autonomous:
         except:  # noqa: E772
             self.drive_angle = 0
 
-        if self.field_string != '':
-            print("[auto] Got field string in {:.3f} ms: {}".format(
-                self.timer.get()*1000, self.field_string
-            ))
-
-            # Set drive angle to zero if switch position matches robot position
-            if (
-                (self.field_string[0] == 'L' and self.robot_position == 'left')
-                or (self.field_string[0] == 'R' and self.robot_position == 'right')  # noqa: E501
-                or self.robot_position == 'middle-placement'
-            ):
-                self.drive_angle = 0
-                self.drive_speed = 250
-
-                if self.robot_position == 'left':
-                    self.drive_angle = math.radians(15)
-                elif self.robot_position == 'right':
-                    self.drive_angle = math.radians(-15)
-                elif self.robot_position == 'middle-placement':
-                    if self.field_string[0] == 'R':
-                        self.drive_angle = math.radians(25)
-                    elif self.field_string[0] == 'L':
-                        self.drive_angle = math.radians(-30)
-
-                print("[auto] Driving into switch at angle={:.3f}".format(
-                    self.drive_angle
-                ), file=sys.stderr)
-            else:
-                print("[auto] Diverting at angle={:.3f}".format(
-                    self.drive_angle
-                ), file=sys.stderr)
-
-            print("[auto] Driving at speed={}".format(self.drive_speed))
-
         self.start_timer = wpilib.Timer()
         self.start_timer.reset()
         self.start_timer.start()
         self.startup_routine = True
         self.start_timer_started = False
 
+        self.startup_sequence = timeline.Sequencer(
+            timeline.from_preferences(
+                'Auto: Baseline Timeline', baseline_timeline
+            ),
+            timeline.robot_actuators(self.robot)
+        )
+
+        self.robot.game_data.when_available(self.on_game_data)
+
+    def on_game_data(self, game_data):
+        self.field_string = game_data.message
+
+        print("[auto] Got field string in {:.3f} ms: {}".format(
+            self.timer.get()*1000, self.field_string
+        ))
+
+        # Set drive angle to zero if switch position matches robot position
+        if (
+            (self.field_string[0] == 'L' and self.robot_position == 'left')
+            or (self.field_string[0] == 'R' and self.robot_position == 'right')  # noqa: E501
+            or self.robot_position == 'middle-placement'
+        ):
+            self.drive_angle = 0
+            self.drive_speed = 250
+
+            if self.robot_position == 'left':
+                self.drive_angle = math.radians(15)
+            elif self.robot_position == 'right':
+                self.drive_angle = math.radians(-15)
+            elif self.robot_position == 'middle-placement':
+                if self.field_string[0] == 'R':
+                    self.drive_angle = math.radians(25)
+                elif self.field_string[0] == 'L':
+                    self.drive_angle = math.radians(-30)
+
+            print("[auto] Driving into switch at angle={:.3f}".format(
+                self.drive_angle
+            ), file=sys.stderr)
+        else:
+            print("[auto] Diverting at angle={:.3f}".format(
+                self.drive_angle
+            ), file=sys.stderr)
+
+        print("[auto] Driving at speed={}".format(self.drive_speed))
+
     def update_smart_dashboard(self):
         pass
 
@@ -90,31 +111,28 @@ class Autonomous:
         try:
             if self.startup_routine:
                 if not self.start_timer_started:
+                    # Everything here depends on which side is ours, so
+                    # hold still until the game data arrives (or we give up
+                    # on it).
+                    if (
+                        self.field_string == ''
+                        and self.timer.get() < self.game_data_timeout
+                    ):
+                        self.robot.drivetrain.set_all_module_speeds(0, True)
+                        return
+
+                    self.robot.game_data.cancel(self.on_game_data)
+
                     self.start_timer.reset()
                     self.start_timer.start()
                     self.start_timer_started = True
-                else:
-                    init_time = self.start_timer.get()
-                    self.robot.drivetrain.set_all_module_angles(
-                        self.drive_angle
-                    )
-
-                    if init_time < 3:
-                        self.robot.drivetrain.set_all_module_speeds(self.drive_speed, True)
-                    elif init_time < 3+1:
-                        self.robot.lift.setLiftPower(-0.6)
-                        self.robot.drivetrain.set_all_module_speeds(0, True)
-                    elif init_time < 3+1+1:
-                        self.robot.lift.setLiftPower(-0.08)
-                        self.robot.claw.set_power(-0.5)
-                        self.robot.drivetrain.set_all_module_speeds(0, True)
-                    else:
-                        self.robot.lift.setLiftPower(-0.03)
-                        self.robot.claw.set_power(0)
-                        self.robot.drivetrain.set_all_module_angles(0)
-                        self.robot.drivetrain.set_all_module_speeds(0, True)
-                        self.robot.drivetrain.reset_drive_position()
-                        self.startup_routine = False
+                    self.startup_sequence.start(0, {
+                        'drive angle': self.drive_angle,
+                        'drive speed': self.drive_speed,
+                    })
+                elif self.startup_sequence.update(self.start_timer.get()):
+                    self.robot.drivetrain.reset_drive_position()
+                    self.startup_routine = False
         except:  # noqa: E772
             print(
                 "[auto] Caught exception in auto :periodic() - "
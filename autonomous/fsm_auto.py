@@ -2,9 +2,10 @@
 Autonomous module.
 
 This module contains classes and functions for autonomous, which is designed as
-a finite-state automaton updated per tick in autonomousPeriodic.
+a routine of actions (see :mod:`autonomous.routine`) updated per tick in
+autonomousPeriodic.
 
-Autonomous transitions between these states:
+Autonomous runs through these states:
 
     - **init**: The robot closes the claw, fully lowers the lift, and
       transitions onto the **turn** state to angle toward the next waypoint.
@@ -14,7 +15,8 @@ Autonomous transitions between these states:
       into the turning state or the lifting state if there are no other
       waypoints.
     - **lift**: the RD4B lifts to a predetermined height (either the height of
-      the scale or switch), then transitions to the target states.
+      the scale or switch). This runs at the same time as the **turn**,
+      **drive** and **target-turn** states.
     - **target-turn**: Turns the entire chassis towards the target (either the
       switch or the scale).
     - **target-drive**: Drives the robot towards the target. This differs
@@ -27,7 +29,8 @@ Autonomous transitions between these states:
 import math
 import wpilib
 import numpy as np
-from collections import deque
+import settle
+from autonomous import path_planner, routine
 
 start_pos_left = np.array((21.25, 82.5))
 start_pos_middle = np.array((21.25, 197))
@@ -43,6 +46,10 @@ staging_right = np.array((120, 279.5))
 align_pt_left = np.array((168, 48.5))
 align_pt_right = np.array((168, 279.5))
 
+#: Plans paths around the switch and platform; see
+#: :mod:`autonomous.path_planner`.
+planner = path_planner.PathPlanner()
+
 
 class Autonomous:
     """
@@ -56,8 +63,9 @@ class Autonomous:
 
     """
 
-    #: Dictionary of paths (arrays of waypoints).  The right one is chosen
-    #: at runtime.
+    #: Dictionary of hand-written paths (arrays of waypoints). Paths are
+    #: normally planned at runtime by :data:`planner`; these are used if that
+    #: fails.
     PATHS = {
         "l-drive-left": [
             start_pos_left,
@@ -99,8 +107,14 @@ class Autonomous:
     ##################################################################
 
     turn_angle_tolerance = math.radians(2.5)  #: a tolerance range for turning
+    #: how fast the module angles can still be changing when done turning, in
+    #: radians per second.
+    turn_rate_tolerance = math.radians(30)
+    turn_settle_time = 0.1  #: how long the modules must hold their angle.
+    turn_timeout = 1.5  #: how long to wait for the modules to turn.
     drive_dist_tolerance = 3  #: a tolerance range for driving, in inches.
     lift_height_tolerance = 2  #: a tolerance range for lifting, in inches.
+    lift_timeout = 3  #: how long to wait for the lift to reach its height.
     drive_speed = 100  #: how fast to drive, in native units per 100ms
     init_lift_height = 6  #: initial lift height, in inches above the ground.
 
@@ -109,9 +123,10 @@ class Autonomous:
         Initialize autonomous.
 
         This constructor mainly initializes the software.
-        The correct path is chosen from SmartDashboard and initialized into
-        numpy-based waypoints.  The current position is set.  Then, the state
-        is set to 'init' and physical initializations are done there.
+        The correct path is chosen once the game data arrives (see
+        :meth:`on_game_data`) and initialized into numpy-based waypoints.
+        The current position is set.  Then, the state is set to 'init' and
+        physical initializations are done there.
         """
 
         # basic initalization.
@@ -123,42 +138,105 @@ class Autonomous:
         self.robot.drivetrain.reset_drive_position()
         self.robot.imu.reset()
 
-        # get preferences and the field string from the Game Data API.
-        ds = wpilib.DriverStation.getInstance()
-        field_string = ds.getGameSpecificMessage().upper()
+        self.waypoints = []
+
+        # set current position (a copy, since it is updated as we drive).
+        self.current_pos = np.array([0, 0], dtype=np.float64)
+
+        position = str(robot_position).lower()
+        if position == 'left':
+            self.current_pos = start_pos_left.copy()
+        elif position.startswith('middle'):
+            self.current_pos = start_pos_middle.copy()
+        elif position == 'right':
+            self.current_pos = start_pos_right.copy()
+
+        # active waypoint: the waypoint we are currently headed towards.
+        self.active_waypoint_idx = 0
+
+        # The target and path are chosen once the game data arrives (which
+        # may be right away; paths are planned from current_pos). The init
+        # state doesn't need them, so it can run in the meantime.
+        self.robot.game_data.when_available(self.on_game_data)
 
-        if field_string == "":  # this only happens during tests
-            field_string = 'LLL'
+        self.state = 'init'
+        self.turn_settle = settle.SettleDetector(
+            self.turn_angle_tolerance,
+            dwell_time=self.turn_settle_time,
+            rate_tolerance=self.turn_rate_tolerance,
+            timeout=self.turn_timeout,
+            window=5
+        )
 
-        if field_string[0] == 'L':
+        self.hack_timer = wpilib.Timer()
+        self.hack_timer_started = False
+
+        self.lift_timer = wpilib.Timer()
+        self.lift_timer_started = False
+
+        # The lift is raised while driving to the target, rather than with
+        # the drivetrain stopped.
+        self.routine = routine.Routine(routine.sequence(
+            routine.action(self.state_init, name='init'),
+            routine.action(self.state_init_turn, name='init-turn'),
+            routine.parallel(
+                routine.sequence(
+                    routine.repeat_until(
+                        self.waypoints_done,
+                        routine.sequence(
+                            routine.action(
+                                self.state_turn,
+                                start=self.turn_settle.reset,
+                                name='turn'
+                            ),
+                            routine.action(self.state_drive, name='drive'),
+                        )
+                    ),
+                    routine.action(
+                        self.state_target_turn, name='target-turn'
+                    ),
+                ),
+                routine.action(self.state_lift, name='lift'),
+            ),
+            routine.action(self.state_target_drive, name='target-drive'),
+            routine.action(self.state_drop, name='drop'),
+        ))
+
+    def on_game_data(self, game_data):
+        """
+        Choose the target and path from the game data.
+        """
+        self.choose_path(game_data.switch)
+
+    def choose_path(self, switch_side):
+        """
+        Choose the target and path for our side of the switch.
+
+        Parameters:
+            switch_side: ``'L'`` or ``'R'``.
+        """
+        if switch_side == 'L':
             self.target = left_switch
             self.init_turn_angle = math.radians(270)
 
-            self.waypoints = self.PATHS['direct-left']
+            target, fallback = 'left-switch', 'direct-left'
         else:
             self.target = right_switch
             self.init_turn_angle = math.radians(90)
 
-            self.waypoints = self.PATHS['direct-right']
+            target, fallback = 'right-switch', 'direct-right'
 
-        # set current position. TODO: implement.
-        self.current_pos = np.array([0, 0])
-
-        if robot_position == 'Left':
-            self.current_pos = start_pos_left
-        elif robot_position == 'Middle':
-            self.current_pos = start_pos_middle
-        elif robot_position == 'Right':
-            self.current_pos = start_pos_right
-
-        # active waypoint: the waypoint we are currently headed towards.
-        self.active_waypoint_idx = 0
-
-        self.state = 'init'
-        self.__module_angle_err_window = deque([], 30)
+        try:
+            self.waypoints, self.target = planner.plan_to_target(
+                self.current_pos, target
+            )
+        except ValueError as e:
+            print("[auto] Could not plan path to {}: {}".format(target, e))
+            self.waypoints = self.PATHS[fallback]
 
-        self.hack_timer = wpilib.Timer()
-        self.hack_timer_started = False
+    def waypoints_done(self):
+        """Whether every waypoint has been driven to."""
+        return self.active_waypoint_idx >= len(self.waypoints)
 
     def state_init(self):
         """
@@ -166,6 +244,9 @@ class Autonomous:
 
         Close the claw and set the lift to its lowest position, then transition
         into the turning state.
+
+        Returns:
+            True when finished. (So do the other ``state_*`` methods.)
         """
         self.robot.drivetrain.set_all_module_angles(0)
 
@@ -197,7 +278,14 @@ class Autonomous:
                 dist *= (4 * math.pi) / (80 * 6.67)
                 self.current_pos[0] += dist
 
-                self.state = 'init-turn'
+                if self.target is None:
+                    # No game data yet; this only happens during tests.
+                    self.robot.game_data.cancel(self.on_game_data)
+                    self.choose_path('L')
+
+                return True
+
+        return False
 
     def state_init_turn(self):
         self.robot.drivetrain.drive(0, 0, 0.1)
@@ -207,7 +295,9 @@ class Autonomous:
         if abs(hdg - self.init_turn_angle) <= self.turn_angle_tolerance:
             self.robot.drivetrain.set_all_module_speeds(0, True)
             self.robot.drivetrain.reset_drive_position()
-            self.state = 'turn'
+            return True
+
+        return False
 
     def state_turn(self):
         """
@@ -230,23 +320,17 @@ class Autonomous:
         self.robot.drivetrain.set_all_module_angles(tgt_angle)
         self.robot.drivetrain.set_all_module_speeds(0, direct=True)
 
-        cur_error = np.array(
-            self.robot.drivetrain.get_closed_loop_error(),
-            dtype=np.float64
-        )
-
-        cur_error *= 180 / 512
-
-        max_err = np.amax(np.abs(cur_error))
-        self.__module_angle_err_window.append(max_err)
-        avg_max_err = np.mean(self.__module_angle_err_window)
+        # steering closed-loop errors are in native units (1024 per
+        # revolution); convert the worst one to radians.
+        max_err = max(
+            abs(err) for err in self.robot.drivetrain.get_closed_loop_error()
+        ) * (math.pi / 512)
 
-        if (
-            len(self.__module_angle_err_window) >= self.__module_angle_err_window.maxlen  # noqa: E501
-            and avg_max_err < self.turn_angle_tolerance
-        ):
+        if self.turn_settle.update(max_err):
             self.robot.drivetrain.reset_drive_position()
-            self.state = 'drive'
+            return True
+
+        return False
 
     def state_drive(self):
         """
@@ -282,31 +366,30 @@ class Autonomous:
 
             # do we still have waypoints left to go?
             if self.active_waypoint_idx < len(self.waypoints):
-                self.__module_angle_err_window.clear()
                 self.robot.drivetrain.reset_drive_position()
-                self.state = 'turn'
-            else:
-                self.state = 'target-turn'
+
+            return True
+
+        return False
 
     def state_lift(self):
         """
         Lift the RD4B to the height needed.
-        Then transition to the target states for final adjustments.
+        This doesn't touch the drivetrain, so it can run while driving.
         """
+        if not self.lift_timer_started:
+            self.lift_timer.reset()
+            self.lift_timer.start()
+            self.lift_timer_started = True
+            self.robot.lift.set_height(self.target_height)
+        elif (
+            self.robot.lift.at_target()
+            or self.lift_timer.get() > self.lift_timeout
+        ):
+            # the lift keeps holding its height from here on.
+            return True
 
-        # stop the drivetrain.
-        self.robot.drivetrain.set_all_module_speeds(0, True)
-
-        if not self.hack_timer_started:
-            self.hack_timer.reset()
-            self.hack_timer.start()
-            self.hack_timer_started = True
-        else:
-            if self.hack_timer.get() < 1.5:
-                self.robot.lift.setLiftPower(-0.6)
-            else:
-                self.robot.lift.setLiftPower(0)
-                self.state = 'target-turn'
+        return False
 
     def state_target_turn(self):
         """
@@ -327,7 +410,9 @@ class Autonomous:
         if abs(hdg - tgt_angle) <= self.turn_angle_tolerance:
             self.robot.drivetrain.set_all_module_speeds(0, True)
             self.robot.drivetrain.reset_drive_position()
-            self.state = 'target-drive'
+            return True
+
+        return False
 
     def state_target_drive(self):
         """
@@ -342,8 +427,9 @@ class Autonomous:
         self.robot.drivetrain.set_all_module_angles(0)
         self.robot.drivetrain.set_all_module_speeds(self.drive_speed, True)
 
-        if abs(avg_dist - self.final_drive_dist) <= self.drive_dist_tolerance:
-            self.state = 'drop'
+        return (
+            abs(avg_dist - self.final_drive_dist) <= self.drive_dist_tolerance
+        )
 
     def state_drop(self):
         """
@@ -352,24 +438,18 @@ class Autonomous:
         self.robot.drivetrain.set_all_module_speeds(0, True)
         self.robot.claw.open()
 
-    #: Maps state names to functions.
-    state_table = {
-        'init': state_init,
-        'init-turn': state_init_turn,
-        'turn': state_turn,
-        'drive': state_drive,
-        'lift': state_lift,
-        'target-turn': state_target_turn,
-        'target-drive': state_target_drive,
-        'drop': state_drop
-    }
+        return False
 
     def periodic(self):
         """
-        Updates and progresses the autonomous state machine.
+        Updates and progresses the autonomous routine.
         """
-        # Call function corresponding to current state.
-        self.state_table[self.state](self)
+        if self.routine.running or self.routine.finished:
+            self.routine.update()
+        else:
+            self.routine.start()
+
+        self.state = ', '.join(self.routine.active_names())
 
     def update_smart_dashboard(self):
         """
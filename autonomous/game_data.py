@@ -0,0 +1,126 @@
+"""
+Non-blocking access to the FMS game-specific message.
+
+The game data tells us which side of each switch and of the scale is ours,
+and only arrives around the start of autonomous. Rather than waiting for it
+in a loop, :class:`GameData` is polled once per robot loop (which is a
+single, cheap Driver Station call), caches the parsed sides, and calls back
+anything waiting on it when the data arrives.
+"""
+import wpilib
+
+#: Valid sides in the game data.
+sides = ('L', 'R')
+
+
+def parse(message):
+    """
+    Parse a game-specific message.
+
+    Args:
+        message: the message, as returned by
+            ``DriverStation.getGameSpecificMessage()`` (a ``str``, or
+            ``bytes`` on some versions of RobotPy), or None.
+
+    Returns:
+        The message as an upper-case string of three sides (near switch,
+        scale, far switch), or None if it is missing or malformed.
+    """
+    if message is None:
+        return None
+
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', 'replace')
+
+    message = message.strip().upper()
+    if len(message) < 3 or any(c not in sides for c in message[:3]):
+        return None
+
+    return message[:3]
+
+
+class GameData(object):
+    """
+    Polls for, caches, and hands out the game data.
+
+    Args:
+        ds: the driver station to poll. Defaults to
+            ``wpilib.DriverStation.getInstance()``.
+
+    Attributes:
+        message (str): the current game data, such as ``'LRL'``, or None if
+            none has been received yet.
+        received_time (float): the FPGA timestamp at which :attr:`message`
+            was received, or None.
+    """
+
+    def __init__(self, ds=None):
+        self.ds = ds or wpilib.DriverStation.getInstance()
+        self.message = None
+        self.received_time = None
+        self._callbacks = []
+
+    @property
+    def available(self):
+        """Whether valid game data has been received."""
+        return self.message is not None
+
+    @property
+    def switch(self):
+        """Our side of the near switch (``'L'`` or ``'R'``), or None."""
+        return self.message[0] if self.available else None
+
+    @property
+    def scale(self):
+        """Our side of the scale, or None."""
+        return self.message[1] if self.available else None
+
+    @property
+    def far_switch(self):
+        """Our side of the far switch, or None."""
+        return self.message[2] if self.available else None
+
+    def poll(self):
+        """
+        Check for new game data, and call any waiting callbacks if some has
+        arrived. Call this once per robot loop while it may change.
+
+        Returns:
+            True if the game data is available.
+        """
+        message = parse(self.ds.getGameSpecificMessage())
+        if message == self.message:
+            return self.available
+
+        # The Driver Station clears the message between matches; don't keep
+        # handing out the last match's data.
+        self.message = message
+        if message is None:
+            self.received_time = None
+            return False
+
+        self.received_time = wpilib.Timer.getFPGATimestamp()
+
+        callbacks = self._callbacks
+        self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+        return True
+
+    def when_available(self, callback):
+        """
+        Call ``callback(game_data)`` once the game data is available.
+
+        If it already is, the callback is called immediately. Otherwise, it is
+        called from :meth:`poll` when the data arrives.
+        """
+        if self.available:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def cancel(self, callback):
+        """Stop waiting to call a callback."""
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
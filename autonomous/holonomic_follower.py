@@ -0,0 +1,273 @@
+"""
+A closed-loop, holonomic trajectory follower for the swerve drive.
+
+Unlike :class:`autonomous.swerve_follower.SwerveFollower`, which follows a
+separate trajectory for each module using only that module's drive encoder,
+this follows the path of the center of the robot using a pose estimate (see
+:class:`swerve.SwerveOdometry`), and drives the chassis as a whole through
+``SwerveDrive.drive``. Since a swerve drive can translate and rotate at the
+same time, the robot's heading is controlled separately from the direction
+it travels in, so it can turn to face its target while it drives there
+instead of stopping to turn in place.
+
+Each robot loop, the follower looks up where the robot should be at the time
+elapsed since the trajectory started, and commands:
+
+- a field-frame velocity of the trajectory's velocity (the feedforward) plus
+  PID feedback on the position error, and
+- an angular velocity of the heading profile's rate of change plus PID
+  feedback on the heading error,
+
+which are rotated into the chassis frame using the current heading.
+
+Only :mod:`autonomous.pathfinder_auto` uses it so far, when the
+'Auto: Holonomic Follower' preference is set. :mod:`autonomous.fsm_auto`
+still stops and turns its modules before each leg of its path.
+
+Poses use the frame described in :mod:`swerve.odometry`: ``x`` forward, ``y``
+to the right, and headings clockwise, in meters and radians.
+"""
+import bisect
+import math
+
+import numpy as np
+
+#: The direction ``SwerveDrive.drive``'s ``rotate_cw`` input turns the robot
+#: in, relative to the direction the IMU heading increases in. (Positive
+#: ``rotate_cw`` inputs turn the robot so the IMU heading decreases.)
+rotate_direction = -1
+
+# Fields of a follower's setpoint array.
+_X, _Y, _HEADING, _VX, _VY, _OMEGA = range(6)
+
+
+def wrap_angle(angle):
+    """Wrap an angle (or array of angles) to [-pi, pi)."""
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+def heading_profile(trajectory, start_heading, end_heading):
+    """
+    Make a robot heading profile that turns smoothly from one heading to
+    another over the course of a trajectory, the short way around.
+
+    The turn is spread over the distance travelled, easing in and out, so the
+    robot turns the most where it is driving the fastest.
+
+    Args:
+        trajectory: a structured array of
+            :data:`autonomous.trajectory_store.segment_dtype`.
+        start_heading, end_heading (float): headings in radians.
+
+    Returns:
+        An array of the heading at each segment of ``trajectory``.
+    """
+    position = np.asarray(trajectory['position'], dtype=np.float64)
+    length = position[-1]
+    if length <= 0:
+        return np.full(len(position), float(end_heading))
+
+    s = np.clip(position / length, 0, 1)
+    s = s * s * (3 - 2 * s)
+
+    turn = wrap_angle(end_heading - start_heading)
+    return start_heading + turn * s
+
+
+class HolonomicFollower(object):
+    """
+    Follows a trajectory with the whole swerve drive, using pose feedback.
+
+    Args:
+        trajectory: the trajectory of the center of the robot, as a
+            structured array of
+            :data:`autonomous.trajectory_store.segment_dtype` (for example,
+            from :meth:`autonomous.trajectory_store.TrajectoryStore.get` or
+            :func:`autonomous.spline_trajectory.generate`).
+        max_velocity (float): the chassis speed, in meters per second, that a
+            ``SwerveDrive.drive`` input of 1 drives at.
+        max_angular_velocity (float): the rate, in radians per second, that
+            a ``rotate_cw`` input of 1 turns the robot at.
+        headings: the robot heading to hold along the trajectory: either a
+            single heading, or an array with one heading per segment (see
+            :func:`heading_profile`). Defaults to 0, i.e. keeping the robot
+            facing the way it started.
+
+    Attributes:
+        error: the last position and heading error, as an array of ``(x, y,
+            heading)``.
+    """
+
+    def __init__(
+        self, trajectory, max_velocity, max_angular_velocity, headings=0
+    ):
+        self.max_velocity = max_velocity
+        self.max_angular_velocity = max_angular_velocity
+
+        n = len(trajectory)
+        dt = np.asarray(trajectory['dt'], dtype=np.float64)
+        self.dt = float(dt[0])
+
+        # The time (since the start of the trajectory) of each segment:
+        # segment i at i * dt.
+        self._times = np.concatenate(([0], np.cumsum(dt[:-1]))).tolist()
+        self.duration = float(np.sum(dt))
+
+        headings = np.broadcast_to(
+            np.asarray(headings, dtype=np.float64), (n,)
+        )
+
+        # Setpoints, and the change to the next segment's setpoints, as
+        # (segment, field) arrays.
+        path_heading = np.asarray(trajectory['heading'], dtype=np.float64)
+        velocity = np.asarray(trajectory['velocity'], dtype=np.float64)
+
+        self._setpoints = np.zeros((n, 6))
+        self._setpoints[:, _X] = trajectory['x']
+        self._setpoints[:, _Y] = trajectory['y']
+        self._setpoints[:, _HEADING] = headings
+        self._setpoints[:, _VX] = velocity * np.cos(path_heading)
+        self._setpoints[:, _VY] = velocity * np.sin(path_heading)
+
+        # Trajectories are relative to the robot's starting position.
+        self._setpoints[:, _X] -= self._setpoints[0, _X]
+        self._setpoints[:, _Y] -= self._setpoints[0, _Y]
+
+        self._deltas = np.zeros_like(self._setpoints)
+        self._deltas[:-1] = np.diff(self._setpoints, axis=0)
+        self._deltas[:, _HEADING] = wrap_angle(self._deltas[:, _HEADING])
+
+        # Turn rate feedforward, from the heading profile.
+        self._setpoints[:-1, _OMEGA] = self._deltas[:-1, _HEADING] / dt[:-1]
+        self._deltas[:-1, _OMEGA] = np.diff(self._setpoints[:, _OMEGA])
+
+        self.configure_translation_pid(0, 0, 0)
+        self.configure_heading_pid(0, 0, 0)
+        self.reset()
+
+    def configure_translation_pid(self, kp, ki, kd):
+        """
+        Set the position feedback gains, in (meters per second) per meter of
+        error.
+        """
+        self.translation_gains = (kp, ki, kd)
+
+    def configure_heading_pid(self, kp, ki, kd):
+        """
+        Set the heading feedback gains, in (radians per second) per radian of
+        error.
+        """
+        self.heading_gains = (kp, ki, kd)
+
+    def reset(self):
+        self.error = np.zeros(3)
+        self._integral = np.zeros(3)
+        self._last_time = None
+
+    def finished_at(self, t):
+        """
+        Whether the trajectory is over at ``t`` seconds after it started.
+        """
+        return t >= self.duration
+
+    def settled(self, position_tolerance, heading_tolerance):
+        """
+        Whether the last position and heading errors were both within
+        tolerance.
+
+        Args:
+            position_tolerance (float): the largest acceptable distance from
+                the setpoint, in meters.
+            heading_tolerance (float): the largest acceptable heading error,
+                in radians.
+        """
+        return (
+            math.hypot(self.error[0], self.error[1]) <= position_tolerance
+            and abs(self.error[2]) <= heading_tolerance
+        )
+
+    def sample(self, t):
+        """
+        Get the setpoint at a time, interpolating linearly between segments.
+
+        Args:
+            t (float): time since the start of the trajectory, in seconds.
+                Times past the end of the trajectory give the last segment.
+
+        Returns:
+            An array of ``(x, y, heading, x velocity, y velocity, angular
+            velocity)``, in the field frame.
+        """
+        times = self._times
+        i = bisect.bisect_right(times, t) - 1
+        i = min(max(i, 0), len(times) - 1)
+
+        if i == len(times) - 1:
+            return self._setpoints[i]
+
+        frac = (t - times[i]) / (times[i + 1] - times[i])
+        frac = min(max(frac, 0), 1)
+
+        return self._setpoints[i] + frac * self._deltas[i]
+
+    def calculate(self, t, pose):
+        """
+        Compute the chassis command for a point in time.
+
+        Args:
+            t (float): time since the start of the trajectory, in seconds.
+            pose: the current ``(x, y, heading)`` of the robot, relative to
+                where it started the trajectory.
+
+        Returns:
+            A tuple of ``(forward, strafe, rotate_cw)`` inputs for
+            ``SwerveDrive.drive``. Once the trajectory is finished, the robot
+            keeps correcting towards the final setpoint with feedback alone.
+        """
+        setpoint = self.sample(t)
+        x, y, heading = pose
+
+        error = np.array((
+            setpoint[_X] - x,
+            setpoint[_Y] - y,
+            wrap_angle(setpoint[_HEADING] - heading),
+        ))
+
+        # Integrate and differentiate the error over the time that actually
+        # passed; on the first call, over one segment.
+        if self._last_time is None or t <= self._last_time:
+            elapsed = self.dt
+        else:
+            elapsed = t - self._last_time
+
+        self._integral += error * elapsed
+        derivative = (error - self.error) / elapsed
+        if self._last_time is None:
+            derivative[:] = 0
+
+        self.error = error
+        self._last_time = t
+
+        kp, ki, kd = self.translation_gains
+        vx, vy = (
+            kp * error[:2] + ki * self._integral[:2] + kd * derivative[:2]
+        )
+
+        kp, ki, kd = self.heading_gains
+        omega = kp * error[2] + ki * self._integral[2] + kd * derivative[2]
+
+        if not self.finished_at(t):
+            vx += setpoint[_VX]
+            vy += setpoint[_VY]
+            omega += setpoint[_OMEGA]
+
+        # Rotate the field-frame velocity into the chassis frame.
+        cos, sin = math.cos(heading), math.sin(heading)
+        forward = vx * cos + vy * sin
+        strafe = vy * cos - vx * sin
+
+        return (
+            forward / self.max_velocity,
+            strafe / self.max_velocity,
+            rotate_direction * omega / self.max_angular_velocity,
+        )
@@ -0,0 +1,278 @@
+"""
+Shortest collision-free paths around the field elements.
+
+The field is modelled as a rectangle containing a few rectangular
+obstacles (our switch and the platform under the scale). The obstacles are
+grown by the robot's radius, so the robot can be treated as a point; the
+shortest path between two points then only ever turns at corners of the
+grown obstacles. :class:`PathPlanner` builds a visibility graph of those
+corners -- an edge between every pair of corners that can see each other --
+and searches it with Dijkstra's algorithm.
+
+The edges between corners only depend on the field, so they are found once
+when the planner is created. Planning a path only has to check which
+corners the start and goal can see (one vectorized collision check against
+every obstacle at once) and search a graph of a couple dozen nodes, which
+takes well under a millisecond, so paths can be planned at the start of
+autonomous.
+
+Coordinates are in inches, in the same frame as the waypoints in
+:mod:`autonomous.fsm_auto`: ``x`` is measured downfield from our alliance
+wall, and ``y`` from the left side of the field.
+"""
+import math
+
+import numpy as np
+
+import constants
+
+#: Length and width of the field, in inches.
+field_length = 648
+field_width = 324
+
+#: Obstacles as ``(x min, y min, x max, y max)`` rectangles, in inches.
+#:
+#: - our switch: the fence starts 140 inches from the alliance wall, and the
+#:   switch is 56 inches deep and 153.5 inches wide.
+#: - the platform, with the scale in the middle of the field on top of it.
+obstacles = np.array([
+    (140, 164 - 76.75, 196, 164 + 76.75),
+    (261.47, 95.25, 386.53, 228.75),
+], dtype=np.float64)
+
+#: Distance to keep between the center of the robot and obstacles, in
+#: inches: half the chassis diagonal plus bumpers.
+robot_radius = math.hypot(
+    constants.chassis_length, constants.chassis_width
+) / 2 + 3.5
+
+#: Targets, as ``(approach point, target point)`` pairs: the robot drives to
+#: the approach point, then turns towards the target point and drives the
+#: rest of the way to it.
+targets = {
+    'left-switch': ((168, 48.5), (168, 164 - 54)),
+    'right-switch': ((168, 279.5), (168, 164 + 54)),
+    'left-scale': ((236, 92), (324, 92)),
+    'right-scale': ((236, 236), (324, 236)),
+}
+
+# How far outside the grown obstacles the graph's corners are, in inches, so
+# that paths along the edges of an obstacle don't count as hitting it.
+_corner_margin = 0.5
+
+
+def segments_hit_boxes(starts, ends, boxes):
+    """
+    Check line segments against axis-aligned boxes.
+
+    Args:
+        starts, ends: ``(n, 2)`` arrays of segment endpoints.
+        boxes: an ``(m, 4)`` array of ``(x min, y min, x max, y max)``
+            boxes.
+
+    Returns:
+        An ``(n, m)`` boolean array: whether each segment passes through the
+        inside of each box. Segments that only touch a box's edges don't
+        count.
+    """
+    starts = np.asarray(starts, dtype=np.float64)[:, np.newaxis, :]
+    ends = np.asarray(ends, dtype=np.float64)[:, np.newaxis, :]
+    delta = ends - starts
+
+    lower = boxes[np.newaxis, :, :2]
+    upper = boxes[np.newaxis, :, 2:]
+
+    # Slab test: find the range of the segment parameter t (from 0 at the
+    # start to 1 at the end) inside each box along each axis.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1 = (lower - starts) / delta
+        t2 = (upper - starts) / delta
+
+    t_low = np.fmin(t1, t2)
+    t_high = np.fmax(t1, t2)
+
+    # Segments parallel to an axis are inside the slab for all t, or none.
+    parallel = delta == 0
+    inside = (starts > lower) & (starts < upper)
+    t_low = np.where(parallel, np.where(inside, -np.inf, np.inf), t_low)
+    t_high = np.where(parallel, np.where(inside, np.inf, -np.inf), t_high)
+
+    enter = np.maximum(np.max(t_low, axis=2), 0)
+    leave = np.minimum(np.min(t_high, axis=2), 1)
+
+    return leave - enter > 1e-9
+
+
+def points_in_boxes(points, boxes):
+    """
+    Check which points are strictly inside any of a set of boxes.
+
+    Returns:
+        A boolean array with one entry per point.
+    """
+    points = np.asarray(points, dtype=np.float64)[:, np.newaxis, :]
+    return np.any(np.all(
+        (points > boxes[np.newaxis, :, :2])
+        & (points < boxes[np.newaxis, :, 2:]),
+        axis=2
+    ), axis=1)
+
+
+class PathPlanner(object):
+    """
+    Plans shortest collision-free paths on the field.
+
+    Args:
+        obstacles: an ``(m, 4)`` array of obstacle boxes, in inches.
+        clearance (float): how far to keep the center of the robot from
+            obstacles and the field edges, in inches.
+
+    Attributes:
+        boxes: the obstacles, grown by ``clearance``.
+        corners: an ``(n, 2)`` array of the corners of :attr:`boxes` that
+            are on the field and not inside another box.
+        corner_distances: an ``(n, n)`` array of the distance between each
+            pair of corners that can see each other, or infinity.
+    """
+
+    def __init__(self, obstacles=obstacles, clearance=robot_radius):
+        obstacles = np.asarray(obstacles, dtype=np.float64)
+        self.clearance = clearance
+        self.boxes = obstacles + np.array(
+            [-clearance, -clearance, clearance, clearance]
+        )
+
+        corners = []
+        margin = _corner_margin
+        for x0, y0, x1, y1 in self.boxes:
+            corners.extend([
+                (x0 - margin, y0 - margin), (x1 + margin, y0 - margin),
+                (x0 - margin, y1 + margin), (x1 + margin, y1 + margin),
+            ])
+
+        corners = np.array(corners)
+        corners = corners[
+            self.on_field(corners) & ~points_in_boxes(corners, self.boxes)
+        ]
+        self.corners = corners
+
+        n = len(corners)
+        i, j = np.triu_indices(n, 1)
+        visible = ~np.any(
+            segments_hit_boxes(corners[i], corners[j], self.boxes), axis=1
+        )
+
+        self.corner_distances = np.full((n, n), np.inf)
+        lengths = np.hypot(*(corners[j] - corners[i]).T)
+        self.corner_distances[i[visible], j[visible]] = lengths[visible]
+        self.corner_distances[j[visible], i[visible]] = lengths[visible]
+
+    def on_field(self, points):
+        """Check which points are far enough from the field edges."""
+        points = np.asarray(points, dtype=np.float64)
+        c = self.clearance
+        return np.all(
+            (points >= (c, c))
+            & (points <= (field_length - c, field_width - c)),
+            axis=1
+        )
+
+    def is_free(self, point):
+        """Whether the robot can be at a point without hitting anything."""
+        point = np.asarray([point], dtype=np.float64)
+        return bool(
+            self.on_field(point)[0]
+            and not points_in_boxes(point, self.boxes)[0]
+        )
+
+    def _visible_from(self, point):
+        # Distances from a point to every corner it can see.
+        starts = np.broadcast_to(point, self.corners.shape)
+        hits = np.any(
+            segments_hit_boxes(starts, self.corners, self.boxes), axis=1
+        )
+
+        distances = np.hypot(*(self.corners - point).T)
+        distances[hits] = np.inf
+        return distances
+
+    def plan(self, start, goal):
+        """
+        Find the shortest collision-free path between two points.
+
+        Args:
+            start, goal: ``(x, y)`` points, in inches.
+
+        Returns:
+            An ``(n, 2)`` array of waypoints, not including ``start`` and
+            ending at ``goal``.
+
+        Raises:
+            ValueError: if ``start`` or ``goal`` is inside an obstacle or off
+                the field, or there is no path between them.
+        """
+        start = np.asarray(start, dtype=np.float64)
+        goal = np.asarray(goal, dtype=np.float64)
+
+        for name, point in (('start', start), ('goal', goal)):
+            if not self.is_free(point):
+                raise ValueError('{} {} is blocked'.format(name, point))
+
+        if not np.any(segments_hit_boxes([start], [goal], self.boxes)):
+            return goal[np.newaxis].copy()
+
+        # Nodes: the corners, then the start, then the goal.
+        n = len(self.corners)
+        distances = np.full((n + 2, n + 2), np.inf)
+        distances[:n, :n] = self.corner_distances
+        distances[n, :n] = distances[:n, n] = self._visible_from(start)
+        distances[n + 1, :n] = distances[:n, n + 1] = self._visible_from(goal)
+
+        path = _dijkstra(distances, n, n + 1)
+        if path is None:
+            raise ValueError('no path from {} to {}'.format(start, goal))
+
+        nodes = np.vstack((self.corners, start, goal))
+        return nodes[path[1:]]
+
+    def plan_to_target(self, start, target):
+        """
+        Plan a path to one of :data:`targets`.
+
+        Returns:
+            A tuple ``(waypoints, target point)``, where ``waypoints`` ends at
+            the target's approach point.
+        """
+        approach, target_point = targets[target]
+        return self.plan(start, approach), np.array(target_point, dtype=float)
+
+
+def _dijkstra(distances, source, goal):
+    # Dense Dijkstra's algorithm; returns the list of nodes on the shortest
+    # path, or None.
+    n = len(distances)
+    best = np.full(n, np.inf)
+    previous = np.full(n, -1)
+    done = np.zeros(n, dtype=bool)
+    best[source] = 0
+
+    for _ in range(n):
+        remaining = np.where(done, np.inf, best)
+        node = int(np.argmin(remaining))
+        if not np.isfinite(remaining[node]):
+            return None
+
+        if node == goal:
+            break
+
+        done[node] = True
+        candidate = best[node] + distances[node]
+        better = candidate < best
+        best[better] = candidate[better]
+        previous[better] = node
+
+    path = [goal]
+    while path[-1] != source:
+        path.append(int(previous[path[-1]]))
+
+    return path[::-1]
@@ -1,120 +1,211 @@
 import os.path
-import pickle
 import sys
 import wpilib
 import numpy as np
 from numpy import pi
 import pathfinder as pf
-from pathfinder.followers import EncoderFollower
 import constants
+from autonomous import timeline
+from autonomous.holonomic_follower import HolonomicFollower
+from autonomous.swerve_follower import SwerveFollower, module_array
+from autonomous.trajectory_store import Route, TrajectoryStore
+from swerve import SwerveOdometry
 
-trajectory_file = os.path.join(os.path.dirname(__file__), 'trajectory.pickle')
-trajectories = {
-    'left': None,
-    'right': None,
-    'divert-left': None,
-    'divert-right': None,
-    'straght-forward': None,
-}
+trajectory_dir = os.path.join(os.path.dirname(__file__), 'trajectories')
+store = TrajectoryStore(trajectory_dir)
 
-_trajectory_dt = 0.05  # time in seconds between control updates
+_trajectory_dt = 0.05  # time in seconds between trajectory segments
 _max_speed = 200 * 10 * (4 * pi) / (80 * 6.67) * 0.0254
 
-if wpilib.RobotBase.isSimulation():
-    # waypoint specification:
-    # relative x, y coordinates in meters; exit angle in radians
+# chassis speed (m/s) and turn rate (rad/s) for SwerveDrive.drive inputs of 1
+# (370 ticks/100ms at each wheel; when turning, the wheels move around a
+# circle whose diameter is the chassis diagonal)
+_drive_speed = 370 * 10 * (4 * pi) / (80 * 6.67) * 0.0254
+_max_turn_rate = 2 * _drive_speed / (0.0254 * np.hypot(
+    constants.chassis_length, constants.chassis_width
+))
+
+# how long to keep correcting position at the end of a holonomic trajectory
+_settle_time = 0.5
+
+# Startup and cube placement timelines, as planned by
+# autonomous.schedule_planner: the drivetrain is driven forward and back to
+# loosen it up while the lift raises the cube, and for routes that place the
+# cube, the lift is raised the rest of the way before the route starts, so
+# the cube can be ejected as soon as the robot arrives.
+
+#: Startup timeline for routes that don't place a cube. Can be overridden by
+#: the 'Auto: Startup Timeline' preference.
+startup_timeline = timeline.Timeline([
+    (0.75, {'angle': 0, 'lift': -0.6, 'speed': 250}),
+    (0.75, {'lift': -0.08}),
+    (1.5, {'speed': -250}),
+    (0, {'speed': 0}),
+])
+
+#: Startup timeline for routes that place a cube on the switch. Can be
+#: overridden by the 'Auto: Placement Startup Timeline' preference.
+placement_startup_timeline = timeline.Timeline([
+    (0.75, {'angle': 0, 'lift': -0.6, 'speed': 250}),
+    (0.75, {'lift': -0.4}),
+    (0.75, {'speed': -250}),
+    (0.75, {'lift': -0.08}),
+    (0, {'speed': 0}),
+])
+
+#: Eject the cube, once at the end of the route. Can be overridden by the
+#: 'Auto: Eject Timeline' preference.
+eject_timeline = timeline.Timeline([
+    (2.5, {'claw': -0.5}),
+    (0, {'claw': 0}),
+])
+
+#: Raise the lift to the switch height and eject the cube, at the end of the
+#: route, when the game data came in too late to raise the lift during the
+#: startup routine. Can be overridden by the 'Auto: Raise and Eject Timeline'
+#: preference.
+raise_eject_timeline = timeline.Timeline([
+    (1.5, {'lift': -0.4}),
+    (2.5, {'lift': -0.08, 'claw': -0.5}),
+    (0, {'claw': 0}),
+])
+
+# waypoint specification:
+# relative x, y coordinates in meters; exit angle in radians
+
+# distance to switch fence = 140in
+start_pos_left = np.array((21.25, 82.5))
+start_pos_middle = np.array((21.25, 197))
+start_pos_right = np.array((21.25, 263.5))
+
+left_switch = np.array((136, 164-54))
+right_switch = np.array((136, 164+54))
+
+staging_left = np.array((136, 48.5))
+staging_mid = np.array((60, 164))
+staging_right = np.array((136, 279.5))
+
+align_pt_left = np.array((120, 164-54))
+align_pt_right = np.array((120, 164+54))
+
+left_leg1 = (staging_mid - start_pos_middle) * 0.0254
+left_leg2 = (align_pt_left - start_pos_middle) * 0.0254
+left_leg3 = (left_switch - start_pos_middle) * 0.0254
+
+right_leg1 = (align_pt_right - start_pos_middle) * 0.0254
+right_leg2 = (right_switch - start_pos_middle) * 0.0254
+
+ldiv_leg1 = (np.array((36, 48.5)) - start_pos_left) * 0.0254
+ldiv_leg2 = (staging_left - start_pos_left) * 0.0254
+
+rdiv_leg1 = (np.array((36, 279.5)) - start_pos_right) * 0.0254
+rdiv_leg2 = (staging_right - start_pos_right) * 0.0254
+
+straight_fwd1 = np.array((36, 0)) * 0.0254
+straight_fwd2 = np.array((132, 0)) * 0.0254
+
+
+def _route(*legs):
+    return Route(
+        [(leg[0], leg[1], 0) for leg in legs],
+        'hermite_cubic', pf.SAMPLES_HIGH,
+        _trajectory_dt, _max_speed, 2.0, 60.0
+    )
 
-    # distance to switch fence = 140in
-    start_pos_left = np.array((21.25, 82.5))
-    start_pos_middle = np.array((21.25, 197))
-    start_pos_right = np.array((21.25, 263.5))
 
-    left_switch = np.array((136, 164-54))
-    right_switch = np.array((136, 164+54))
+# Trajectories are only generated (or loaded from the store) once a route is
+# actually selected.
+routes = {
+    'left': _route(left_leg1, left_leg2, left_leg3),
+    'right': _route(right_leg1, right_leg2),
+    'divert-left': _route(ldiv_leg1, ldiv_leg2),
+    'divert-right': _route(rdiv_leg1, rdiv_leg2),
+    'straight-forward': _route(straight_fwd1, straight_fwd2),
+}
 
-    staging_left = np.array((136, 48.5))
-    staging_mid = np.array((60, 164))
-    staging_right = np.array((136, 279.5))
 
-    align_pt_left = np.array((120, 164-54))
-    align_pt_right = np.array((120, 164+54))
+#: Routes that may be selected from each starting position, depending on the
+#: game data.
+position_routes = {
+    'middle-placement': ('left', 'right', 'straight-forward'),
+    'middle-baseline': ('straight-forward',),
+    'left': ('divert-left',),
+    'right': ('divert-right',),
+}
 
-    left_leg1 = (staging_mid - start_pos_middle) * 0.0254
-    left_leg2 = (align_pt_left - start_pos_middle) * 0.0254
-    left_leg3 = (left_switch - start_pos_middle) * 0.0254
+# Route name -> swerve-modified trajectories for each module, as
+# SwerveFollower trajectory arrays (modules in constants.swerve_config
+# order).
+_prepared = {}
 
-    right_leg1 = (align_pt_right - start_pos_middle) * 0.0254
-    right_leg2 = (right_switch - start_pos_middle) * 0.0254
+# Route name -> trajectory for the center of the robot, for the
+# HolonomicFollower.
+_paths = {}
 
-    ldiv_leg1 = (np.array((36, 48.5)) - start_pos_left) * 0.0254
-    ldiv_leg2 = (staging_left - start_pos_left) * 0.0254
 
-    rdiv_leg1 = (np.array((36, 279.5)) - start_pos_right) * 0.0254
-    rdiv_leg2 = (staging_right - start_pos_right) * 0.0254
+def prepare_route(name):
+    """
+    Load (or generate) the module trajectories for one of :data:`routes`,
+    and keep them in memory for :func:`module_trajectories`.
+    """
+    if name not in _prepared:
+        modules = store.get_modules(
+            name, routes[name],
+            constants.chassis_width * 0.0254,  # distance between left and right wheels in m  # noqa: E501
+            constants.chassis_length * 0.0254  # distance between front and back wheels in m  # noqa: E501
+        )
 
-    straight_fwd1 = np.array((36, 0)) * 0.0254
-    straight_fwd2 = np.array((132, 0)) * 0.0254
+        _prepared[name] = module_array(modules)
+        _paths[name] = store.get(name, routes[name])
 
-    _, trajectories['left'] = pf.generate(
-        [
-            pf.Waypoint(left_leg1[0], left_leg1[1], 0),
-            pf.Waypoint(left_leg2[0], left_leg2[1], 0),
-            pf.Waypoint(left_leg3[0], left_leg3[1], 0),
-        ],
-        pf.FIT_HERMITE_CUBIC,
-        pf.SAMPLES_HIGH,
-        _trajectory_dt, _max_speed, 2.0, 60.0
-    )
 
-    _, trajectories['divert-left'] = pf.generate(
-        [
-            pf.Waypoint(ldiv_leg1[0], ldiv_leg1[1], 0),
-            pf.Waypoint(ldiv_leg2[0], ldiv_leg2[1], 0),
-        ],
-        pf.FIT_HERMITE_CUBIC,
-        pf.SAMPLES_HIGH,
-        _trajectory_dt, _max_speed, 2.0, 60.0
-    )
+def prepare_all():
+    """
+    Prepare the trajectories for every route, for example before deploying.
+    """
+    for name in routes:
+        prepare_route(name)
 
-    _, trajectories['right'] = pf.generate(
-        [
-            pf.Waypoint(right_leg1[0], right_leg1[1], 0),
-            pf.Waypoint(right_leg2[0], right_leg2[1], 0),
-        ],
-        pf.FIT_HERMITE_CUBIC,
-        pf.SAMPLES_HIGH,
-        _trajectory_dt, _max_speed, 2.0, 60.0
-    )
 
-    _, trajectories['divert-right'] = pf.generate(
-        [
-            pf.Waypoint(rdiv_leg1[0], rdiv_leg1[1], 0),
-            pf.Waypoint(rdiv_leg2[0], rdiv_leg2[1], 0),
-        ],
-        pf.FIT_HERMITE_CUBIC,
-        pf.SAMPLES_HIGH,
-        _trajectory_dt, _max_speed, 2.0, 60.0
-    )
+def module_trajectories(name):
+    """
+    Get the module trajectories for one of :data:`routes`, preparing them
+    first if that hasn't been done already.
+    """
+    if name not in _prepared:
+        print("[auto] Route not prepared before autonomous: " + name)
+        prepare_route(name)
 
-    _, trajectories['straight-forward'] = pf.generate(
-        [
-            pf.Waypoint(straight_fwd1[0], straight_fwd1[1], 0),
-            pf.Waypoint(straight_fwd2[0], straight_fwd2[1], 0),
-        ],
-        pf.FIT_HERMITE_CUBIC,
-        pf.SAMPLES_HIGH,
-        _trajectory_dt, _max_speed, 2.0, 60.0
-    )
+    return _prepared[name]
 
-    # and then write it out
-    with open(trajectory_file, 'wb') as fp:
-        pickle.dump(trajectories, fp)
-else:
-    with open(trajectory_file, 'rb') as fp:
-        trajectories = pickle.load(fp)
+
+def path_trajectory(name):
+    """
+    Get the trajectory of the center of the robot for one of :data:`routes`,
+    preparing it first if that hasn't been done already.
+    """
+    if name not in _paths:
+        print("[auto] Route not prepared before autonomous: " + name)
+        prepare_route(name)
+
+    return _paths[name]
 
 
 class Autonomous:
+    @staticmethod
+    def prepare(robot_position):
+        """
+        Prepare every route that might be selected from a starting position,
+        so that the constructor only has to look them up.
+        """
+        for name in position_routes.get(
+            str(robot_position).lower(), ('straight-forward',)
+        ):
+            prepare_route(name)
+
+        # Used when anything goes wrong while choosing a route.
+        prepare_route('straight-forward')
+
     # maximum auto drive speed, in m/s
     # (we convert 200 ticks/100ms to inches per second to meters per second)
     def __init__(self, robot, robot_position):
@@ -137,153 +228,231 @@ class Autonomous:
         self.lift_timer = wpilib.Timer()
         self.lift_timer_started = False
 
-        target_trajectory = trajectories['straight-forward']
-        self.eject_cube = False
+        actuators = timeline.robot_actuators(self.robot)
+        self.startup_sequence = timeline.Sequencer(
+            timeline.from_preferences(
+                'Auto: Startup Timeline', startup_timeline
+            ),
+            actuators
+        )
+        self.placement_startup_sequence = timeline.Sequencer(
+            timeline.from_preferences(
+                'Auto: Placement Startup Timeline',
+                placement_startup_timeline
+            ),
+            actuators
+        )
+        self.eject_sequence = timeline.Sequencer(
+            timeline.from_preferences('Auto: Eject Timeline', eject_timeline),
+            actuators
+        )
+        self.raise_eject_sequence = timeline.Sequencer(
+            timeline.from_preferences(
+                'Auto: Raise and Eject Timeline', raise_eject_timeline
+            ),
+            actuators
+        )
+        self.lift_raised = False
 
-        try:
-            self.field_string = ''
-            ds = wpilib.DriverStation.getInstance()
-            while self.timer.get() < 1 and len(self.field_string) == 0:
-                fms_message = ds.getGameSpecificMessage().decode("utf-8")
-                if fms_message is None:
-                    fms_message = ''
+        self.traj_timer = wpilib.Timer()
+        self.traj_timer_started = False
 
-                self.field_string = fms_message.upper()
+        self.field_string = ''
+        self.eject_cube = False
+        self.follower = None
+        self.traj_finished = False
 
-            if self.field_string != '':
-                print("[auto] Got field string in {:.3f} seconds: {}".format(
-                    self.timer.get(), self.field_string
-                ))
+        # Follow the path of the whole chassis with pose feedback, rather
+        # than each module's path with its own encoder. Off until it has
+        # been tuned on the robot.
+        self.holonomic = wpilib.Preferences.getInstance().getBoolean(
+            'Auto: Holonomic Follower', False
+        )
+        self.drive_signs = np.array(self.robot.drivetrain.get_drive_signs())
+        self.odometry = SwerveOdometry(
+            int(80 * 6.67), 4 * 0.0254, self.drive_signs
+        )
 
+        # The startup routine doesn't depend on the game data, so it can run
+        # while we wait for it. The route is chosen when the data arrives,
+        # or at the end of the startup routine without it.
+        self.robot.game_data.when_available(self.on_game_data)
+
+    def on_game_data(self, game_data):
+        self.field_string = game_data.message
+        print("[auto] Got field string in {:.3f} seconds: {}".format(
+            self.timer.get(), self.field_string
+        ))
+
+        self.select_route()
+
+    def select_route(self):
+        """
+        Choose a route from the starting position and the game data received
+        so far, and set up the follower for it.
+        """
+        robot_position = self.position
+        target_route = 'straight-forward'
+        self.eject_cube = False
+
+        try:
             if robot_position.lower() == 'middle-placement':
                 if len(self.field_string) == 0:
-                    target_trajectory = trajectories['straight-forward']
+                    target_route = 'straight-forward'
                     print("[auto] Could not retrieve field string from FMS within timeout!")  # noqa: E501
                 elif self.field_string[0] == 'L':
                     print("[auto] Selected trajectory: Left (attempting cube placement)")  # noqa: E501
-                    target_trajectory = trajectories['left']
+                    target_route = 'left'
                     self.eject_cube = True
                 elif self.field_string[0] == 'R':
                     print("[auto] Selected trajectory: Right (attempting cube placement)")  # noqa: E501
-                    target_trajectory = trajectories['right']
+                    target_route = 'right'
                     self.eject_cube = True
                 else:
-                    target_trajectory = trajectories['straight-forward']
+                    target_route = 'straight-forward'
                     print("[auto] Found unexpected data in field string: " + str(self.field_string))  # noqa: E501
             elif robot_position.lower() == 'middle-baseline':
-                target_trajectory = trajectories['straight-forward']
+                target_route = 'straight-forward'
                 print("[auto] Selected trajectory: Straight Forward")
             elif robot_position.lower() == 'left':
-                target_trajectory = trajectories['divert-left']
+                target_route = 'divert-left'
                 print("[auto] Selected trajectory: Divert Left")
             elif robot_position.lower() == 'right':
-                target_trajectory = trajectories['divert-right']
+                target_route = 'divert-right'
                 print("[auto] Selected trajectory: Divert Right")
             else:
                 print("[auto] Found unexpected data in robot position string: " + str(robot_position))  # noqa: E501
-                target_trajectory = trajectories['straight-forward']
+                target_route = 'straight-forward'
         except:  # noqa: E722
             # Don't re-raise exceptions-- just note it and default to
             # something sane
             print("[auto] Caught exception in auto trajectory decision logic: " + str(sys.exc_info()[0]))  # noqa: E501
-            target_trajectory = trajectories['straight-forward']
+            target_route = 'straight-forward'
             self.eject_cube = False
 
-        self.trajectory = pf.modifiers.SwerveModifier(
-            target_trajectory
-        ).modify(
-            constants.chassis_width * 0.0254,  # distance between left and right wheels in m  # noqa: E501
-            constants.chassis_length * 0.0254  # distance between front and back wheels in m  # noqa: E501
-        )
-
-        # Setup swerve EncoderFollowers
-        # yes, the order does matter (must match constants.swerve_config)
-        self.followers = [
-            EncoderFollower(self.trajectory.getFrontRightTrajectory()),
-            EncoderFollower(self.trajectory.getFrontLeftTrajectory()),
-            EncoderFollower(self.trajectory.getBackRightTrajectory()),
-            EncoderFollower(self.trajectory.getBackLeftTrajectory())
-        ]
-
-        self.traj_finished = False
-
-        for follower in self.followers:
+        if self.holonomic:
             # in order:
-            # current wheel position, ticks/rotation, wheel diameter in m
-            follower.configureEncoder(
-                0, int(80 * 6.67), 4 * 0.0254
+            # trajectory, chassis speed and turn rate for drive inputs of 1
+            self.follower = HolonomicFollower(
+                path_trajectory(target_route), _drive_speed, _max_turn_rate
             )
 
-            # in order:
-            # porportional gain (usually from 0.8 - 1.0)
-            # integral gain (unused)
-            # derivative gain (tweak if tracking is off, default might work)
-            # velocity ratio (= 1 / max velocity)
-            # acceleration gain (tweak if we need to get to higher/lower speeds faster)  # noqa: E501
-            follower.configurePIDVA(
-                1.0, 0.0, 0.0, 1 / _max_speed, 0
-            )
+            # position error (m) -> velocity correction (m/s), and
+            # heading error (rad) -> turn rate correction (rad/s)
+            self.follower.configure_translation_pid(2.0, 0.0, 0.0)
+            self.follower.configure_heading_pid(3.0, 0.0, 0.0)
+            return
+
+        # Setup the swerve follower
+        # (module order matches constants.swerve_config)
+        # in order:
+        # trajectories, ticks/rotation, wheel diameter in m
+        self.follower = SwerveFollower(
+            module_trajectories(target_route), int(80 * 6.67), 4 * 0.0254
+        )
+
+        # in order:
+        # porportional gain (usually from 0.8 - 1.0)
+        # integral gain (unused)
+        # derivative gain (tweak if tracking is off, default might work)
+        # velocity ratio (= 1 / max velocity)
+        # acceleration gain (tweak if we need to get to higher/lower speeds faster)  # noqa: E501
+        self.follower.configure_pidva(
+            1.0, 0.0, 0.0, 1 / _max_speed, 0
+        )
 
     def update_smart_dashboard(self):
         pass
 
+    def update_pose(self):
+        return self.odometry.update(
+            self.robot.imu.get_continuous_heading(),
+            self.robot.drivetrain.get_steer_angles(),
+            self.robot.drivetrain.get_drive_positions()
+        )
+
     def periodic(self):
         # follow trajectory if need be
         try:
+            # Track the pose from the start of autonomous, so the startup
+            # routine not quite returning to where it started is corrected
+            # for too.
+            if self.holonomic and not self.traj_finished:
+                pose = self.update_pose()
+
             if self.startup_routine:
                 if not self.start_timer_started:
                     self.start_timer.reset()
                     self.start_timer.start()
                     self.start_timer_started = True
+
+                    # If we're going to place a cube, raise the lift during
+                    # the startup routine.
+                    if self.eject_cube:
+                        self.startup_sequence = self.placement_startup_sequence
+                        self.lift_raised = True
+                    self.startup_sequence.start(0)
+                elif self.startup_sequence.update(self.start_timer.get()):
+                    self.robot.drivetrain.reset_drive_position()
+                    self.startup_routine = False
+
+                    # Keep the pose, but re-read the encoders.
+                    self.odometry.reset(*self.odometry.pose)
+
+                    if self.follower is None:
+                        self.robot.game_data.cancel(self.on_game_data)
+                        self.select_route()
+            elif not self.traj_finished:
+                # Setpoints are looked up by time every loop, so slow loops
+                # don't make us fall behind the trajectory.
+                if not self.traj_timer_started:
+                    self.traj_timer.reset()
+                    self.traj_timer.start()
+                    self.traj_timer_started = True
+
+                traj_time = self.traj_timer.get()
+                if self.holonomic:
+                    # Keep correcting towards the end of the path for a
+                    # little while after the trajectory is over.
+                    self.robot.drivetrain.drive(
+                        *self.follower.calculate(traj_time, pose)
+                    )
+
+                    if self.follower.finished_at(traj_time) and (
+                        self.follower.settled(0.02, 0.035)
+                        or self.follower.finished_at(traj_time - _settle_time)
+                    ):
+                        self.robot.drivetrain.drive(0, 0, 0)
+                        self.traj_finished = True
+                elif self.follower.finished_at(traj_time):
+                    # (the outputs set last are kept until changed.)
+                    self.robot.drivetrain.drive(0, 0, 0)
+                    self.traj_finished = True
                 else:
-                    #
-                    init_time = self.start_timer.get()
-                    if init_time < 0.75:
-                        self.robot.lift.setLiftPower(-0.6)
-                        self.robot.drivetrain.set_all_module_angles(0)
-                    elif init_time < 0.75+1.5:
-                        self.robot.lift.setLiftPower(0)
-                        self.robot.drivetrain.set_all_module_angles(0)
-                        self.robot.drivetrain.set_all_module_speeds(250, True)
-                    elif init_time < (0.75+1.5)+1.5:
-                        self.robot.drivetrain.set_all_module_angles(0)
-                        self.robot.drivetrain.set_all_module_speeds(-250, True)
-                    else:
-                        self.robot.drivetrain.set_all_module_angles(0)
-                        self.robot.drivetrain.set_all_module_speeds(0, True)
-                        self.robot.drivetrain.reset_drive_position()
-                        self.startup_routine = False
-            elif (
-                not self.traj_finished
-                and self.timer.hasPeriodPassed(_trajectory_dt)
-            ):
-                self.traj_finished = True
-                for mod, follower in zip(self.robot.drivetrain.modules, self.followers):  # noqa: E501
-                    if not follower.isFinished():
-                        output = follower.calculate(
-                            mod.drive_talon.getQuadraturePosition()
+                    # The follower wants the distance each module has
+                    # rolled forwards.
+                    outputs, headings = self.follower.calculate_at(
+                        traj_time, self.drive_signs * np.array(
+                            self.robot.drivetrain.get_drive_positions()
                         )
+                    )
 
-                        angle = follower.getHeading()
-
-                        mod.set_drive_percent_out(output)
-                        mod.set_steer_angle(angle)
-
-                        self.traj_finished = False
+                    self.robot.drivetrain.set_module_outputs(
+                        headings, outputs
+                    )
             elif self.traj_finished and self.eject_cube:
                 if not self.lift_timer_started:
                     self.lift_timer.reset()
                     self.lift_timer.start()
                     self.lift_timer_started = True
+
+                    # If the game data came in after the startup routine
+                    # began, the lift still has to be raised.
+                    if not self.lift_raised:
+                        self.eject_sequence = self.raise_eject_sequence
+                    self.eject_sequence.start(0)
                 else:
-                    if self.lift_timer.get() < 1.5:
-                        self.robot.lift.setLiftPower(-0.4)
-                    elif self.lift_timer.get() < 4:
-                        self.robot.lift.setLiftPower(0)
-                        self.robot.claw.set_power(-0.5)  # eject cube
-                    else:
-                        self.robot.lift.setLiftPower(0)
-                        self.robot.claw.set_power(0)
+                    self.eject_sequence.update(self.lift_timer.get())
         except:  # noqa: E772
             print(
                 "[auto] Caught exception in auto :periodic() - "
@@ -293,3 +462,7 @@ class Autonomous:
             self.robot.claw.set_power(0)
             self.robot.drivetrain.set_all_module_angles(0)
             self.robot.drivetrain.set_all_module_speeds(0, True)
+
+
+if __name__ == '__main__':
+    prepare_all()
@@ -0,0 +1,395 @@
+"""
+Declarative autonomous routines.
+
+A routine is written as a tree of actions, using the functions in this
+module::
+
+    sequence(
+        action(close_claw, name='grab'),
+        parallel(
+            action(drive_to_switch, name='drive'),
+            sequence(wait(0.5), action(raise_lift, name='lift')),
+        ),
+        wait_until(cube_in_claw, timeout=1),
+        action(eject_cube, name='drop'),
+    )
+
+Leaves are the actions that actually do something:
+
+- :func:`action`: calls a function every robot loop until it returns True.
+- :func:`run`: calls a function once.
+- :func:`wait`: waits for a number of seconds.
+- :func:`wait_until`: waits until a condition is true (or a timeout passes).
+
+and groups control when their children run:
+
+- :func:`sequence`: runs its children one after another.
+- :func:`parallel`: runs its children at the same time, until all of them
+  have finished.
+- :func:`race`: runs its children at the same time, until any of them
+  finishes; the others are interrupted.
+- :func:`deadline`: runs its children at the same time, until the first one
+  finishes; the others are interrupted.
+- :func:`repeat_until`: runs its child over and over, until a condition is
+  true when it finishes.
+
+A :class:`Routine` compiles the tree once into flat per-node tables (in
+depth-first order, so each node's descendants directly follow it), and runs
+it by dispatching on each node's kind. Only the leaves that are currently
+running are visited every loop, and when an action finishes, the next one
+starts (and is updated) in the same loop, so no time is lost between
+actions.
+"""
+import collections
+
+import wpilib
+
+# Node kinds.
+ACTION, RUN, WAIT, WAIT_UNTIL = range(4)
+SEQUENCE, PARALLEL, RACE, DEADLINE, REPEAT = range(4, 9)
+
+#: Node kinds that are leaves (i.e. not groups).
+leaf_kinds = frozenset([ACTION, RUN, WAIT, WAIT_UNTIL])
+
+#: A node of an uncompiled routine tree.
+#:
+#: - **kind**: the kind of node (``ACTION``, ``SEQUENCE``, and so on).
+#: - **children**: a tuple of child nodes.
+#: - **args**: a tuple of kind-specific arguments.
+#: - **name**: a name for the node, for display, or None.
+Node = collections.namedtuple('Node', ['kind', 'children', 'args', 'name'])
+
+# Node states.
+_IDLE, _RUNNING, _DONE = range(3)
+
+
+def action(update, start=None, end=None, name=None):
+    """
+    An action that calls ``update()`` every robot loop until it returns
+    True.
+
+    Args:
+        update: the function to call every loop.
+        start: a function to call when the action starts, or None.
+        end: a function to call as ``end(interrupted)`` when the action
+            finishes or is interrupted, or None.
+        name (str): a name for the action.
+    """
+    return Node(ACTION, (), (update, start, end), name)
+
+
+def run(function, name=None):
+    """An action that calls ``function()`` once, then finishes."""
+    return Node(RUN, (), (function,), name)
+
+
+def wait(seconds, name=None):
+    """An action that finishes after a number of seconds."""
+    return Node(WAIT, (), (seconds,), name)
+
+
+def wait_until(condition, timeout=None, name=None):
+    """
+    An action that finishes when ``condition()`` returns True, or after
+    ``timeout`` seconds if that isn't None.
+    """
+    return Node(WAIT_UNTIL, (), (condition, timeout), name)
+
+
+def sequence(*children, name=None):
+    """Run actions one after another."""
+    return Node(SEQUENCE, children, (), name)
+
+
+def parallel(*children, name=None):
+    """Run actions at the same time, until all of them have finished."""
+    return Node(PARALLEL, children, (), name)
+
+
+def race(*children, name=None):
+    """Run actions at the same time, until any one of them finishes."""
+    return Node(RACE, children, (), name)
+
+
+def deadline(main, *others, name=None):
+    """
+    Run actions at the same time, until ``main`` finishes. Any of the others
+    still running then are interrupted.
+    """
+    return Node(DEADLINE, (main,) + others, (), name)
+
+
+def repeat_until(condition, child, name=None):
+    """
+    Run an action repeatedly, until ``condition()`` is True when it
+    finishes. The condition is checked after every repetition, so the child
+    always runs at least once.
+
+    A new repetition starts on the robot loop after the last one finished.
+    """
+    return Node(REPEAT, (child,), (condition,), name)
+
+
+class Routine(object):
+    """
+    A compiled, runnable routine.
+
+    Args:
+        root: the :class:`Node` at the root of the routine.
+
+    Attributes:
+        kinds: the kind of each node, in depth-first order (the root is node
+            0).
+        parents: the index of each node's parent, or -1 for the root.
+        children: a tuple of the indices of each node's children.
+        ends: for each node, the index just past its last descendant.
+        names: the name of each node.
+    """
+
+    def __init__(self, root):
+        self.kinds = []
+        self.parents = []
+        self.children = []
+        self.ends = []
+        self.args = []
+        self.names = []
+        self._flatten(root, -1)
+
+        n = len(self.kinds)
+        self._status = [_IDLE] * n
+        self._cursor = [0] * n
+        self._started = [0] * n
+        self._ticked = [-1] * n
+        self._running = []
+        self._tick_count = 0
+
+        # Dispatch tables, indexed by node kind.
+        self._start_kind = [
+            self._start_action, self._start_leaf, self._start_timed,
+            self._start_timed, self._start_sequence, self._start_all,
+            self._start_all, self._start_all, self._start_sequence,
+        ]
+        self._tick_kind = [
+            self._tick_action, self._tick_run, self._tick_wait,
+            self._tick_wait_until,
+        ]
+        self._child_done_kind = [
+            None, None, None, None, self._sequence_child_done,
+            self._parallel_child_done, self._race_child_done,
+            self._deadline_child_done, self._repeat_child_done,
+        ]
+
+    def _flatten(self, node, parent):
+        index = len(self.kinds)
+
+        self.kinds.append(node.kind)
+        self.parents.append(parent)
+        self.children.append(())
+        self.ends.append(index + 1)
+        self.args.append(node.args)
+        self.names.append(node.name)
+
+        self.children[index] = tuple(
+            self._flatten(child, index) for child in node.children
+        )
+        self.ends[index] = len(self.kinds)
+
+        return index
+
+    @property
+    def running(self):
+        """Whether the routine has been started and hasn't finished."""
+        return self._status[0] == _RUNNING
+
+    @property
+    def finished(self):
+        """Whether the routine has finished."""
+        return self._status[0] == _DONE
+
+    def active_names(self):
+        """Get the names of the leaf actions that are currently running."""
+        return [
+            self.names[i] for i in self._running
+            if self.names[i] is not None
+        ]
+
+    def start(self, now=None):
+        """
+        Start (or restart) the routine, and update the actions it starts
+        with.
+
+        Args:
+            now (float): the current time, in seconds. Defaults to the FPGA
+                timestamp.
+        """
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+
+        self.stop()
+        for i in range(len(self._status)):
+            self._status[i] = _IDLE
+
+        self._tick_count += 1
+        self._start(0, now)
+
+    def update(self, now=None):
+        """
+        Update every running action. Call this once every robot loop.
+
+        Args:
+            now (float): the current time, in seconds. Defaults to the FPGA
+                timestamp.
+
+        Returns:
+            True if the routine has finished.
+        """
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+
+        self._tick_count += 1
+        tick = self._tick_count
+
+        for i in list(self._running):
+            # Skip actions that were interrupted by, or started and updated
+            # after, one that finished earlier in this loop.
+            if self._status[i] != _RUNNING or self._ticked[i] == tick:
+                continue
+
+            self._ticked[i] = tick
+            if self._tick_kind[self.kinds[i]](i, now):
+                self._finish(i, now)
+
+        return self._status[0] == _DONE
+
+    def stop(self):
+        """Interrupt every running action."""
+        self._interrupt(0)
+
+    # Starting nodes
+
+    def _start(self, i, now, tick=True):
+        self._status[i] = _RUNNING
+        self._start_kind[self.kinds[i]](i, now, tick)
+
+    def _start_leaf(self, i, now, tick):
+        self._running.append(i)
+        if tick:
+            self._ticked[i] = self._tick_count
+            if self._tick_kind[self.kinds[i]](i, now):
+                self._finish(i, now)
+
+    def _start_action(self, i, now, tick):
+        start = self.args[i][1]
+        if start is not None:
+            start()
+
+        self._start_leaf(i, now, tick)
+
+    def _start_timed(self, i, now, tick):
+        self._started[i] = now
+        self._start_leaf(i, now, tick)
+
+    def _start_sequence(self, i, now, tick):
+        self._cursor[i] = 0
+        children = self.children[i]
+        if not children:
+            self._finish(i, now)
+            return
+
+        self._start(children[0], now, tick)
+
+    def _start_all(self, i, now, tick):
+        children = self.children[i]
+        self._cursor[i] = len(children)
+        if not children:
+            self._finish(i, now)
+            return
+
+        for child in children:
+            if self._status[i] != _RUNNING:
+                break
+            self._start(child, now, tick)
+
+    # Updating leaves
+
+    def _tick_action(self, i, now):
+        return bool(self.args[i][0]())
+
+    def _tick_run(self, i, now):
+        self.args[i][0]()
+        return True
+
+    def _tick_wait(self, i, now):
+        return now - self._started[i] >= self.args[i][0]
+
+    def _tick_wait_until(self, i, now):
+        condition, timeout = self.args[i]
+        return bool(condition()) or (
+            timeout is not None and now - self._started[i] >= timeout
+        )
+
+    # Finishing nodes
+
+    def _finish(self, i, now):
+        self._status[i] = _DONE
+
+        kind = self.kinds[i]
+        if kind in leaf_kinds:
+            if i in self._running:
+                self._running.remove(i)
+            if kind == ACTION and self.args[i][2] is not None:
+                self.args[i][2](False)
+
+        parent = self.parents[i]
+        if parent >= 0 and self._status[parent] == _RUNNING:
+            self._child_done_kind[self.kinds[parent]](parent, i, now)
+
+    def _interrupt(self, i):
+        # Descendants directly follow their parent, so a node's subtree is a
+        # contiguous range of indices.
+        for j in range(i, self.ends[i]):
+            if self._status[j] != _RUNNING:
+                continue
+
+            self._status[j] = _IDLE
+            if self.kinds[j] in leaf_kinds:
+                self._running.remove(j)
+                if self.kinds[j] == ACTION and self.args[j][2] is not None:
+                    self.args[j][2](True)
+
+    def _interrupt_siblings(self, i):
+        for child in self.children[i]:
+            self._interrupt(child)
+
+    def _sequence_child_done(self, i, child, now):
+        self._cursor[i] += 1
+        children = self.children[i]
+        if self._cursor[i] < len(children):
+            self._start(children[self._cursor[i]], now)
+        else:
+            self._finish(i, now)
+
+    def _parallel_child_done(self, i, child, now):
+        self._cursor[i] -= 1
+        if self._cursor[i] == 0:
+            self._finish(i, now)
+
+    def _race_child_done(self, i, child, now):
+        self._interrupt_siblings(i)
+        self._finish(i, now)
+
+    def _deadline_child_done(self, i, child, now):
+        if child == self.children[i][0]:
+            self._race_child_done(i, child, now)
+
+    def _repeat_child_done(self, i, child, now):
+        if self.args[i][0]():
+            self._finish(i, now)
+            return
+
+        for j in range(child, self.ends[child]):
+            self._status[j] = _IDLE
+
+        # Don't update the new repetition until the next loop, so a child
+        # that finishes immediately can't repeat forever.
+        self._start(child, now, tick=False)
@@ -0,0 +1,439 @@
+"""
+Offline planner for minimum-time autonomous schedules.
+
+An autonomous routine is modelled as a set of actions, each taking a known
+amount of time, needing some of the robot's mechanisms (resources) while it
+runs, and possibly having to wait for other actions to finish first. For
+example, ejecting the cube needs the claw, and has to wait until the robot
+has driven to the switch and the lift is raised. Actions that don't share a
+resource can run at the same time -- the lift can be raised while driving.
+
+:func:`plan` finds the schedule with the shortest total time (makespan):
+for every order the actions sharing each resource could run in, it runs a
+critical-path analysis (every action starts as soon as everything it waits
+on has finished), and keeps the best. The routines here only have a handful
+of actions, so trying every order is instant.
+
+Action durations are taken from the robot, not from a model of it: driving
+a route takes as long as its trajectory (plus the time the follower may
+spend settling at the end), and raising the lift or ejecting the cube takes
+as long as it was timed to on the robot (see :data:`baseline_lift_time` and
+the constants below it). If a mechanism changes, re-time it on the robot
+and update these.
+
+Schedules are turned into :class:`autonomous.timeline.Timeline` tables that
+the autonomous modes run (see :func:`to_timelines`). Run this module to
+print the schedule for every route, the total time before (with every
+action one after another, as the routines used to) and after planning, and
+the timelines in the form the autonomous Preferences take::
+
+    python -m autonomous.schedule_planner
+"""
+import collections
+import itertools
+import math
+
+import numpy as np
+
+from autonomous.timeline import Timeline
+
+#: An action in an autonomous routine.
+#:
+#: - **name**: a unique name for the action.
+#: - **duration**: how long the action takes, in seconds.
+#: - **resources**: a tuple of the mechanisms the action needs.
+#: - **after**: a tuple of the names of actions that must finish before it
+#:   starts.
+#: - **phases**: the actuator targets to set while it runs, as a list of
+#:   ``(duration, targets)`` phases (see
+#:   :class:`autonomous.timeline.Timeline`), or None if the action isn't
+#:   run from a timeline (i.e. it is run by other code, like following a
+#:   trajectory).
+#: - **end**: actuator targets to set when it finishes.
+Action = collections.namedtuple(
+    'Action', ['name', 'duration', 'resources', 'after', 'phases', 'end']
+)
+
+#: A planned schedule.
+#:
+#: - **actions**: the actions, in the order they were given.
+#: - **starts**: a dict of the start time of each action, in seconds.
+#: - **makespan**: the time the last action finishes.
+#: - **critical_path**: the names of the actions that determine the
+#:   makespan, in order: delaying any of them delays the whole routine.
+Schedule = collections.namedtuple(
+    'Schedule', ['actions', 'starts', 'makespan', 'critical_path']
+)
+
+#: How long the lift takes to rise from the bottom to the switch height at
+#: an output of -0.6, in seconds (timed on the robot).
+baseline_lift_time = 1
+
+#: How long the lift takes to rise from the bottom to carrying height at an
+#: output of -0.6, in seconds (timed on the robot).
+carry_lift_time = 0.75
+
+#: How long the lift takes to rise from carrying height to the switch height
+#: at an output of -0.4, in seconds (timed on the robot).
+switch_lift_time = 1.5
+
+#: How long the claw takes to eject a cube, in seconds.
+baseline_eject_time = 1
+pathfinder_eject_time = 2.5
+
+#: Lift output that holds the lift up against gravity.
+lift_hold = -0.08
+
+#: How long baseline_simple drives for, in seconds.
+baseline_drive_time = 3
+
+# Schedules are rounded up to this many seconds.
+_resolution = 0.01
+
+
+def _round_up(t):
+    return math.ceil(round(t / _resolution, 6)) * _resolution
+
+
+def action(
+    name, duration, resources, after=(), phases=None, end=None
+):
+    """
+    Make an :class:`Action`. If ``phases`` is a dict of targets, they are
+    held for the whole action.
+    """
+    if isinstance(phases, dict):
+        phases = [(duration, phases)]
+
+    return Action(
+        name, duration, tuple(resources), tuple(after), phases, end or {}
+    )
+
+
+def sequential(actions):
+    """
+    Schedule actions one after another, in the order given (i.e. how a
+    routine written as a chain of timed steps runs them).
+    """
+    actions = list(actions)
+    order = {a.name: i for i, a in enumerate(actions)}
+    return _critical_path(actions, [
+        (order[a.name], order[b.name]) for a, b in zip(actions, actions[1:])
+    ])
+
+
+def plan(actions):
+    """
+    Find the schedule for a set of actions with the shortest makespan.
+
+    Actions that need the same resource never overlap, and every action
+    starts after the actions it waits on have finished. Among schedules with
+    the same makespan, the one that keeps each resource's actions in the
+    order given is preferred.
+
+    Returns:
+        A :class:`Schedule`.
+
+    Raises:
+        ValueError: if an action waits on an unknown action, or the actions
+            wait on each other in a cycle.
+    """
+    actions = list(actions)
+    order = {a.name: i for i, a in enumerate(actions)}
+
+    edges = []
+    for i, a in enumerate(actions):
+        for name in a.after:
+            if name not in order:
+                raise ValueError('{} waits on unknown action {}'.format(
+                    a.name, name
+                ))
+            edges.append((order[name], i))
+
+    resources = collections.OrderedDict()
+    for i, a in enumerate(actions):
+        for resource in a.resources:
+            resources.setdefault(resource, []).append(i)
+
+    best = None
+    for orders in itertools.product(*(
+        itertools.permutations(users) for users in resources.values()
+    )):
+        resource_edges = [
+            (a, b) for users in orders for a, b in zip(users, users[1:])
+        ]
+
+        try:
+            schedule = _critical_path(actions, edges + resource_edges)
+        except ValueError:
+            continue  # this order contradicts the actions' dependencies
+
+        if best is None or schedule.makespan < best.makespan - 1e-9:
+            best = schedule
+
+    if best is None:
+        raise ValueError('the actions wait on each other in a cycle')
+
+    return best
+
+
+def _critical_path(actions, edges):
+    # Earliest start times by longest path through the precedence graph
+    # (Kahn's algorithm); raises ValueError if the graph has a cycle.
+    n = len(actions)
+    successors = [[] for _ in range(n)]
+    waiting = [0] * n
+    for a, b in edges:
+        successors[a].append(b)
+        waiting[b] += 1
+
+    start = [0.0] * n
+    cause = [None] * n
+    ready = [i for i in range(n) if waiting[i] == 0]
+    visited = 0
+
+    while ready:
+        i = ready.pop(0)
+        visited += 1
+        finish = start[i] + actions[i].duration
+
+        for j in successors[i]:
+            if cause[j] is None or finish > start[j]:
+                start[j] = finish
+                cause[j] = i
+
+            waiting[j] -= 1
+            if waiting[j] == 0:
+                ready.append(j)
+
+    if visited < n:
+        raise ValueError('cycle')
+
+    finishes = [start[i] + actions[i].duration for i in range(n)]
+    last = max(range(n), key=lambda i: finishes[i]) if n else None
+
+    path = []
+    while last is not None:
+        path.append(actions[last].name)
+        last = cause[last]
+
+    return Schedule(
+        actions,
+        {a.name: start[i] for i, a in enumerate(actions)},
+        max(finishes) if n else 0,
+        path[::-1],
+    )
+
+
+def to_timelines(schedule, final=None):
+    """
+    Turn a schedule into timelines the robot can run.
+
+    Actions with ``phases`` are run from timelines; actions without them
+    (like following a trajectory) split the schedule into one timeline
+    before, between and after each of them, so the code running the routine
+    runs each timeline, then the next untimed action, and so on.
+
+    Args:
+        schedule (Schedule): the schedule to convert.
+        final (dict): actuator targets to set at the end of the last
+            timeline.
+
+    Returns:
+        A list of :class:`~autonomous.timeline.Timeline` objects, one more
+        than the number of untimed actions.
+
+    Raises:
+        ValueError: if a timed action overlaps an untimed one.
+    """
+    untimed = sorted(
+        (a for a in schedule.actions if a.phases is None),
+        key=lambda a: schedule.starts[a.name]
+    )
+
+    # Segment boundaries: (start, end) of the time between untimed actions.
+    segments = []
+    t = 0
+    for a in untimed:
+        segments.append((t, schedule.starts[a.name]))
+        t = schedule.starts[a.name] + a.duration
+    segments.append((t, schedule.makespan))
+
+    changes = [[] for _ in segments]
+    for a in schedule.actions:
+        if a.phases is None:
+            continue
+
+        start = schedule.starts[a.name]
+        finish = start + a.duration
+        index = [
+            i for i, (s, e) in enumerate(segments)
+            if s - 1e-9 <= start and finish <= e + 1e-9
+        ]
+        if not index:
+            raise ValueError(
+                '{} overlaps an action that is not run from a '
+                'timeline'.format(a.name)
+            )
+
+        segment = index[0]
+        offset = segments[segment][0]
+
+        # (time, priority, targets): at the same time, ends come before
+        # starts, so an action starting as another ends wins.
+        t = start
+        for duration, targets in a.phases:
+            changes[segment].append((t - offset, 1, targets))
+            t += duration
+        changes[segment].append((finish - offset, 0, a.end))
+
+    timelines = []
+    for i, (s, e) in enumerate(segments):
+        segment_changes = sorted(changes[i], key=lambda c: (c[0], c[1]))
+        if i == len(segments) - 1 and final:
+            segment_changes.append((e - s, 2, final))
+
+        times = sorted(set(_round_up(c[0]) for c in segment_changes))
+        phases = []
+        for j, t in enumerate(times):
+            targets = {}
+            for ct, _, change in segment_changes:
+                if _round_up(ct) == t:
+                    targets.update(change)
+
+            if j + 1 < len(times):
+                duration = round(times[j + 1] - t, 6)
+            else:
+                duration = 0
+            phases.append((duration, targets))
+
+        # The first phase starts at the start of the segment.
+        if phases and times[0] > 0:
+            phases.insert(0, (round(times[0], 6), {}))
+
+        timelines.append(Timeline(phases))
+
+    return timelines
+
+
+def baseline_actions():
+    """Model baseline_simple's routine: drive, lift, then eject the cube."""
+    return [
+        action(
+            'drive', baseline_drive_time, ['drivetrain'],
+            phases={'angle': 'drive angle', 'speed': 'drive speed'},
+            end={'speed': 0}
+        ),
+        action(
+            'lift', baseline_lift_time, ['lift'],
+            phases={'lift': -0.6}, end={'lift': lift_hold}
+        ),
+        action(
+            'eject', baseline_eject_time, ['claw'], after=['drive', 'lift'],
+            phases={'claw': -0.5}, end={'claw': 0}
+        ),
+    ]
+
+
+#: Targets to set at the end of baseline_simple's routine.
+baseline_final = {'lift': -0.03, 'angle': 0}
+
+
+def pathfinder_actions(route, drive_time, eject=True, late=False):
+    """
+    Model pathfinder_auto's routine for a route.
+
+    Args:
+        route (str): the name of the route.
+        drive_time (float): how long following the route's trajectory takes,
+            in seconds.
+        eject (bool): whether the route ends by ejecting a cube onto the
+            switch.
+        late (bool): whether the game data arrives after the startup
+            routine has begun, so the lift can only be raised to the switch
+            height once the route has been driven.
+    """
+    actions = [
+        action(
+            'carry', carry_lift_time, ['lift'],
+            phases={'lift': -0.6}, end={'lift': lift_hold}
+        ),
+        action(
+            'shake', 3, ['drivetrain'],
+            phases=[
+                (1.5, {'angle': 0, 'speed': 250}),
+                (1.5, {'speed': -250}),
+            ],
+            end={'speed': 0}
+        ),
+        action(route, _round_up(drive_time), ['drivetrain'], after=['shake']),
+    ]
+
+    if eject:
+        actions += [
+            action(
+                'lift', switch_lift_time, ['lift'],
+                after=['carry', route] if late else ['carry'],
+                phases={'lift': -0.4}, end={'lift': lift_hold}
+            ),
+            action(
+                'eject', pathfinder_eject_time, ['claw'],
+                after=[route, 'lift'],
+                phases={'claw': -0.5}, end={'claw': 0}
+            ),
+        ]
+
+    return actions
+
+
+def pathfinder_routes():
+    """
+    Model pathfinder_auto's routine for every route.
+
+    Returns:
+        A dict mapping route names to lists of actions.
+    """
+    from autonomous import pathfinder_auto
+
+    models = {}
+    for name in sorted(pathfinder_auto.routes):
+        trajectory = pathfinder_auto.path_trajectory(name)
+        drive_time = (
+            float(np.sum(trajectory['dt'])) + pathfinder_auto._settle_time
+        )
+        models[name] = pathfinder_actions(
+            name, drive_time, eject=name in ('left', 'right')
+        )
+
+    return models
+
+
+def report(name, actions, final=None):
+    """Print the schedule for a routine, before and after planning."""
+    before = sequential(actions)
+    after = plan(actions)
+
+    print('{}: {:.2f} s -> {:.2f} s (critical path: {})'.format(
+        name, before.makespan, after.makespan,
+        ' -> '.join(after.critical_path)
+    ))
+    for a in after.actions:
+        start = after.starts[a.name]
+        print('    {:>6.2f} - {:>6.2f}  {:<18} {}'.format(
+            start, start + a.duration, a.name, ', '.join(a.resources)
+        ))
+
+    for timeline in to_timelines(after, final):
+        print('    timeline: ' + (timeline.to_text() or '(empty)'))
+
+    return before, after
+
+
+def main():
+    report('baseline_simple', baseline_actions(), baseline_final)
+    for name, actions in sorted(pathfinder_routes().items()):
+        report('pathfinder_auto ' + name, actions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Trajectory generation in NumPy, fast enough to build paths on the robot.
+
+This produces the same kind of trajectory as ``pathfinder.generate`` with
+``FIT_HERMITE_QUINTIC``, as a structured array of
+:data:`autonomous.trajectory_store.segment_dtype`, but every step is
+vectorized:
+
+1. Each pair of waypoints is joined by a quintic Hermite spline, fit in a
+   frame rotated to point from one waypoint to the next (as pathfinder does).
+2. The splines are sampled densely to tabulate arc length.
+3. A jerk-limited trapezoidal velocity profile is computed over the total
+   path length, by running a velocity pulse through two moving-average
+   filters.
+4. Each profile position is mapped back to a point on the splines by
+   interpolating the arc length table.
+
+Waypoints are given as an ``(n, 3)`` array of ``(x, y, exit angle)``, or an
+``(n, 2)`` array of ``(x, y)`` (with all exit angles 0), in meters and
+radians -- for example, the ``left_leg*`` arrays in
+:mod:`autonomous.pathfinder_auto`.
+"""
+import math
+
+import numpy as np
+
+from autonomous.trajectory_store import segment_dtype
+
+#: Default number of arc length samples per spline.
+default_samples = 1000
+
+
+def _bound_radians(angle):
+    return np.mod(angle, 2 * math.pi)
+
+
+def fit_splines(waypoints):
+    """
+    Fit a quintic Hermite spline between each pair of waypoints.
+
+    Each spline is a polynomial ``y(x) = a x^5 + b x^4 + c x^3 + e x`` in a
+    frame with its origin at the first waypoint and its x-axis pointing at
+    the second. Its slope at each end matches the waypoint's exit angle, and
+    its curvature at each end is 0.
+
+    Args:
+        waypoints: an ``(n, 3)`` or ``(n, 2)`` array of waypoints.
+
+    Returns:
+        A dict of ``(n - 1,)`` arrays: ``x_offset``, ``y_offset``,
+        ``angle_offset`` and ``knot_distance`` (the spline frames), and
+        ``coeffs``, an ``(n - 1, 6)`` array of polynomial coefficients from
+        the highest power down.
+    """
+    waypoints = np.asarray(waypoints, dtype=np.float64)
+    if waypoints.shape[1] == 2:
+        waypoints = np.column_stack((waypoints, np.zeros(len(waypoints))))
+
+    start, end = waypoints[:-1], waypoints[1:]
+    delta = end[:, :2] - start[:, :2]
+
+    d = np.hypot(delta[:, 0], delta[:, 1])
+    angle_offset = np.arctan2(delta[:, 1], delta[:, 0])
+
+    a0 = np.tan(_bound_radians(start[:, 2] - angle_offset))
+    a1 = np.tan(_bound_radians(end[:, 2] - angle_offset))
+
+    zeros = np.zeros_like(d)
+    coeffs = np.column_stack((
+        -(3 * (a0 + a1)) / d ** 4,
+        (8 * a0 + 7 * a1) / d ** 3,
+        -(6 * a0 + 4 * a1) / d ** 2,
+        zeros,
+        a0,
+        zeros,
+    ))
+
+    return {
+        'x_offset': start[:, 0],
+        'y_offset': start[:, 1],
+        'angle_offset': angle_offset,
+        'knot_distance': d,
+        'coeffs': coeffs,
+    }
+
+
+def _evaluate(splines, index, u):
+    # Evaluate splines[index] at fractions u of their knot distance; returns
+    # world x, y and heading.
+    coeffs = splines['coeffs'][index]
+    d = splines['knot_distance'][index]
+    angle_offset = splines['angle_offset'][index]
+
+    x = u * d
+    y = (
+        ((((coeffs[..., 0] * x + coeffs[..., 1]) * x + coeffs[..., 2]) * x
+          + coeffs[..., 3]) * x + coeffs[..., 4]) * x + coeffs[..., 5]
+    )
+    slope = (
+        (((5 * coeffs[..., 0] * x + 4 * coeffs[..., 1]) * x
+          + 3 * coeffs[..., 2]) * x + 2 * coeffs[..., 3]) * x
+        + coeffs[..., 4]
+    )
+
+    cos, sin = np.cos(angle_offset), np.sin(angle_offset)
+    world_x = splines['x_offset'][index] + x * cos - y * sin
+    world_y = splines['y_offset'][index] + x * sin + y * cos
+    heading = _bound_radians(np.arctan(slope) + angle_offset)
+
+    return world_x, world_y, heading
+
+
+def arc_length_table(splines, samples=default_samples):
+    """
+    Tabulate the arc length along a chain of splines.
+
+    Returns:
+        A tuple of arrays ``(distance, index, u)``: the distance along the
+        whole path at each sample, and the spline index and spline fraction
+        of that sample.
+    """
+    n = len(splines['knot_distance'])
+    u = np.tile(np.linspace(0, 1, samples + 1), n)
+    index = np.repeat(np.arange(n), samples + 1)
+
+    x, y, _ = _evaluate(splines, index, u)
+    step = np.hypot(np.diff(x), np.diff(y))
+
+    # Don't count the jump between the end of one spline and the start of
+    # the next (they're the same point anyway).
+    step[samples::samples + 1] = 0
+
+    distance = np.concatenate(([0], np.cumsum(step)))
+    return distance, index, u
+
+
+def velocity_profile(length, dt, max_velocity, max_acceleration, max_jerk):
+    """
+    Compute a jerk-limited trapezoidal velocity profile, the same way
+    pathfinder does.
+
+    A velocity pulse of ``max_velocity`` lasting ``length / max_velocity``
+    seconds is smoothed by a moving average over ``max_velocity /
+    max_acceleration`` seconds (limiting acceleration), then by one over
+    ``max_acceleration / max_jerk`` seconds (limiting jerk). On paths too
+    short to reach ``max_velocity``, a lower peak velocity is used.
+
+    Returns:
+        A tuple of arrays ``(position, velocity, acceleration, jerk)``, one
+        value per ``dt``-second segment.
+    """
+    a2 = max_acceleration ** 2
+    j2 = max_jerk ** 2
+    max_velocity = min(max_velocity, (
+        -a2 + math.sqrt(a2 * a2 + 4 * j2 * max_acceleration * length)
+    ) / (2 * max_jerk))
+
+    f1 = int(math.ceil(max_velocity / max_acceleration / dt))
+    f2 = int(math.ceil(max_acceleration / max_jerk / dt))
+    impulse = (length / max_velocity) / dt
+    n = int(math.ceil(f1 + f2 + impulse))
+
+    # The first filter ramps up by one step per segment while the pulse
+    # lasts, then back down, clamped to [0, f1].
+    steps = np.arange(n)
+    pulse_steps = int(math.floor(impulse))
+    first = np.minimum(steps + 1, f1).astype(np.float64)
+    if pulse_steps < n:
+        peak = first[pulse_steps - 1] if pulse_steps > 0 else 0
+        after = steps[pulse_steps:] - pulse_steps
+        first[pulse_steps:] = np.clip(
+            peak + (impulse - pulse_steps) - 1 - after, 0, f1
+        )
+
+    second = np.convolve(first, np.ones(f2))[:n]
+    velocity = second / (f1 * f2) * max_velocity
+
+    previous = np.concatenate(([0], velocity[:-1]))
+    position = np.cumsum((previous + velocity) / 2 * dt)
+    acceleration = (velocity - previous) / dt
+    jerk = np.diff(acceleration, prepend=0) / dt
+
+    return position, velocity, acceleration, jerk
+
+
+def generate(
+    waypoints, dt, max_velocity, max_acceleration, max_jerk,
+    samples=default_samples
+):
+    """
+    Generate a trajectory through a list of waypoints.
+
+    Args:
+        waypoints: an ``(n, 3)`` or ``(n, 2)`` array of waypoints.
+        dt (float): the time between segments, in seconds.
+        max_velocity, max_acceleration, max_jerk (float): trajectory limits,
+            in meters and seconds.
+        samples (int): the number of arc length samples per spline.
+
+    Returns:
+        A structured array of
+        :data:`~autonomous.trajectory_store.segment_dtype`, like
+        ``pathfinder.generate`` returns (as a list of segments).
+    """
+    splines = fit_splines(waypoints)
+    distance, index, u = arc_length_table(splines, samples)
+
+    position, velocity, acceleration, jerk = velocity_profile(
+        distance[-1], dt, max_velocity, max_acceleration, max_jerk
+    )
+
+    # Find the spline and fraction along it for each profile position.
+    sample = np.clip(
+        np.searchsorted(distance, position, side='right') - 1,
+        0, len(distance) - 2
+    )
+    span = distance[sample + 1] - distance[sample]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(span > 0, (position - distance[sample]) / span, 0)
+
+    # Samples at the end of one spline are followed by the start of the
+    # next; don't interpolate across that.
+    same = index[sample + 1] == index[sample]
+    seg_u = np.where(
+        same, u[sample] + np.clip(frac, 0, 1) * (u[sample + 1] - u[sample]),
+        u[sample]
+    )
+
+    x, y, heading = _evaluate(splines, index[sample], seg_u)
+
+    trajectory = np.empty(len(position), dtype=segment_dtype)
+    trajectory['dt'] = dt
+    trajectory['x'] = x
+    trajectory['y'] = y
+    trajectory['position'] = position
+    trajectory['velocity'] = velocity
+    trajectory['acceleration'] = acceleration
+    trajectory['jerk'] = jerk
+    trajectory['heading'] = heading
+
+    return trajectory
+
+
+def swerve_modify(trajectory, wheelbase_width, wheelbase_depth):
+    """
+    Compute the trajectory each swerve module follows, like
+    :func:`autonomous.trajectory_store.swerve_modify` but without going
+    through pathfinder.
+
+    As with pathfinder's ``SwerveModifier``, every module follows the same
+    profile and heading as the center of the robot, offset by its position
+    on the frame.
+
+    Returns:
+        A ``(4, len(trajectory))`` structured array, with one row per module
+        in :data:`autonomous.trajectory_store.module_order`.
+    """
+    half_width = wheelbase_width / 2
+    half_depth = wheelbase_depth / 2
+
+    modules = np.repeat(trajectory[np.newaxis], 4, axis=0)
+    for i, (dx, dy) in enumerate((
+        (half_width, half_depth), (-half_width, half_depth),
+        (half_width, -half_depth), (-half_width, -half_depth),
+    )):
+        modules[i]['x'] += dx
+        modules[i]['y'] += dy
+
+    return modules
@@ -0,0 +1,275 @@
+"""
+A trajectory follower for all four swerve modules at once.
+
+This does the same thing as four ``pathfinder.followers.EncoderFollower``
+objects (one per module), but keeps every module's trajectory in a single
+``(time, module, field)`` NumPy array, and precomputes everything that
+doesn't depend on the encoders for every segment up front.
+
+Besides stepping through the trajectory one segment per call like
+``EncoderFollower`` (:meth:`SwerveFollower.calculate`), the follower can look
+up its setpoints by the time elapsed since the trajectory started
+(:meth:`SwerveFollower.calculate_at`), interpolating between segments. That
+way it can run every robot loop, and late or skipped loops don't make the
+robot fall behind the path.
+"""
+import bisect
+import math
+
+import numpy as np
+
+from autonomous import trajectory_store
+
+#: Indices of each segment field along the last axis of a follower's
+#: trajectory array.
+DT, X, Y, POSITION, VELOCITY, ACCELERATION, JERK, HEADING = range(8)
+
+
+def module_array(modules):
+    """
+    Convert swerve-modified module trajectories to a follower's trajectory
+    array.
+
+    Args:
+        modules: a ``(4, n)`` structured array of
+            :data:`autonomous.trajectory_store.segment_dtype`, as returned by
+            :meth:`~autonomous.trajectory_store.TrajectoryStore.get_modules`.
+
+    Returns:
+        An ``(n, 4, 8)`` float array, indexed by segment, module, and field
+        (see :data:`DT` and friends).
+    """
+    return np.stack(
+        [modules[field] for field in trajectory_store.segment_dtype.names],
+        axis=-1
+    ).transpose(1, 0, 2).astype(np.float64)
+
+
+class SwerveFollower(object):
+    """
+    Follows a trajectory for each swerve module, using encoder feedback.
+
+    The outputs match pathfinder's ``EncoderFollower``: for each module,
+    ``kp * error + kd * d(error)/dt + kv * velocity + ka * acceleration``,
+    where ``error`` is the distance the module should have covered by now
+    minus the distance it has.
+
+    Args:
+        trajectories: an ``(n, modules, 8)`` array, as returned by
+            :func:`module_array`. All modules must have the same number of
+            segments.
+        ticks_per_revolution (int): drive encoder ticks per wheel revolution.
+        wheel_diameter (float): wheel diameter, in meters.
+
+    Attributes:
+        segment (int): the index of the next segment to follow.
+        heading: the desired heading of each module at the current segment,
+            in radians.
+    """
+
+    def __init__(self, trajectories, ticks_per_revolution, wheel_diameter):
+        self.trajectories = np.asarray(trajectories, dtype=np.float64)
+        self.ticks_per_revolution = ticks_per_revolution
+        self.wheel_circumference = math.pi * wheel_diameter
+
+        n_modules = self.trajectories.shape[1]
+        self.initial_position = np.zeros(n_modules)
+
+        self.segment = 0
+        self.last_error = np.zeros(n_modules)
+        self.heading = self.trajectories[0, :, HEADING].copy()
+        self._zeros = np.zeros(n_modules)
+
+        # Per-segment terms that don't depend on the encoders are computed
+        # once up front, leaving as little as possible to do every tick.
+        self._meters_per_tick = self.wheel_circumference / ticks_per_revolution
+        self._position = np.ascontiguousarray(
+            self.trajectories[:, :, POSITION]
+        )
+        self._heading = np.ascontiguousarray(self.trajectories[:, :, HEADING])
+        self._inv_dt = 1 / self.trajectories[:, :, DT]
+
+        # The time (since the start of the trajectory) at which each segment
+        # is followed when stepping through it: segment i at i * dt.
+        dt = self.trajectories[:, 0, DT]
+        self._times = np.concatenate(([0], np.cumsum(dt[:-1]))).tolist()
+        self.duration = float(np.sum(dt))
+        self._last_time = None
+
+        # Setpoints and the change to the next segment's setpoints, for
+        # interpolation, as (segment, field, module) arrays with the fields
+        # position, velocity, acceleration and heading.
+        self._setpoints = np.ascontiguousarray(self.trajectories[
+            :, :, [POSITION, VELOCITY, ACCELERATION, HEADING]
+        ].transpose(0, 2, 1))
+        self._deltas = np.zeros_like(self._setpoints)
+        self._deltas[:-1] = np.diff(self._setpoints, axis=0)
+
+        # Headings are interpolated the short way around.
+        self._deltas[:, 3] = (self._deltas[:, 3] + math.pi) % (2 * math.pi)
+        self._deltas[:, 3] -= math.pi
+
+        self.configure_pidva(0, 0, 0, 0, 0)
+
+    def configure_pidva(self, kp, ki, kd, kv, ka):
+        """
+        Set the follower gains. These are the same as for
+        ``EncoderFollower.configurePIDVA``; ``ki`` is unused.
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.kv = kv
+        self.ka = ka
+
+        self._feedforward = (
+            kv * self.trajectories[:, :, VELOCITY]
+            + ka * self.trajectories[:, :, ACCELERATION]
+        )
+        self._kd_inv_dt = kd * self._inv_dt
+        self._setup_segment_rows()
+
+    def configure_encoders(self, initial_position):
+        """
+        Set the encoder position of each module at the start of the
+        trajectory.
+        """
+        self.initial_position = np.array(initial_position, dtype=np.float64)
+        self._setup_segment_rows()
+
+    def _setup_segment_rows(self):
+        # calculate() only works on one number per module at a time, where
+        # NumPy's per-call overhead outweighs any vectorization, so it uses
+        # plain lists of each segment's terms: the setpoint plus the starting
+        # encoder distance, the feedforward output, and the derivative gain
+        # over the segment's time step.
+        self._error_offset_rows = (
+            self._position
+            + self.initial_position * self._meters_per_tick
+        ).tolist()
+        self._feedforward_rows = self._feedforward.tolist()
+        self._kd_inv_dt_rows = self._kd_inv_dt.tolist()
+
+    def reset(self):
+        self.segment = 0
+        self.last_error = np.zeros_like(self.last_error)
+        self.heading = self._heading[0]
+        self._last_time = None
+
+    @property
+    def finished(self):
+        """Whether every module has reached the end of its trajectory."""
+        return self.segment >= len(self.trajectories)
+
+    def finished_at(self, t):
+        """
+        Whether the trajectory is over at ``t`` seconds after it started.
+        """
+        return t >= self.duration
+
+    def sample(self, t):
+        """
+        Get every module's setpoint at a time, interpolating linearly between
+        segments.
+
+        Args:
+            t (float): time since the start of the trajectory, in seconds.
+                Times past the end of the trajectory give the last segment.
+
+        Returns:
+            A ``(4, modules)`` array, whose rows are the position, velocity,
+            acceleration and heading of each module.
+        """
+        times = self._times
+        i = bisect.bisect_right(times, t) - 1
+        i = min(max(i, 0), len(times) - 1)
+
+        if i == len(times) - 1:
+            return self._setpoints[i]
+
+        frac = (t - times[i]) / (times[i + 1] - times[i])
+        frac = min(max(frac, 0), 1)
+
+        return self._setpoints[i] + frac * self._deltas[i]
+
+    def calculate(self, encoder_ticks):
+        """
+        Compute the next output for every module.
+
+        Args:
+            encoder_ticks: the current drive encoder position of each module.
+
+        Returns:
+            A tuple ``(outputs, headings)``: the percent output for each
+            drive motor, and the angle to steer each module to, in radians.
+            Once the trajectory is finished, outputs are zero and headings
+            stay at their final values.
+        """
+        i = self.segment
+        if i >= len(self.trajectories):
+            return self._zeros, self.heading
+
+        kp = self.kp
+        meters_per_tick = self._meters_per_tick
+
+        error = [
+            offset - tick * meters_per_tick
+            for offset, tick in zip(self._error_offset_rows[i], encoder_ticks)
+        ]
+        outputs = [
+            feedforward + kp * e + kd_inv_dt * (e - last)
+            for feedforward, e, kd_inv_dt, last in zip(
+                self._feedforward_rows[i], error, self._kd_inv_dt_rows[i],
+                self.last_error
+            )
+        ]
+
+        self.last_error = error
+        self.heading = self._heading[i]
+        self.segment = i + 1
+
+        return outputs, self.heading
+
+    def calculate_at(self, t, encoder_ticks):
+        """
+        Compute every module's output for a point in time, rather than for
+        the next segment.
+
+        Args:
+            t (float): time since the start of the trajectory, in seconds.
+            encoder_ticks: the current drive encoder position of each module.
+
+        Returns:
+            A tuple of arrays ``(outputs, headings)``, as for
+            :meth:`calculate`.
+        """
+        if self.finished_at(t):
+            self.heading = self._heading[-1]
+            return self._zeros, self.heading
+
+        position, velocity, acceleration, heading = self.sample(t)
+
+        distance = (
+            (np.asarray(encoder_ticks, dtype=np.float64)
+             - self.initial_position) * self._meters_per_tick
+        )
+        error = position - distance
+
+        # Differentiate the error over the time that actually passed; on the
+        # first call, over one segment (as calculate() does).
+        if self._last_time is None or t <= self._last_time:
+            elapsed = self.trajectories[0, 0, DT]
+        else:
+            elapsed = t - self._last_time
+
+        outputs = (
+            self.kv * velocity + self.ka * acceleration
+            + self.kp * error
+            + self.kd * (error - self.last_error) / elapsed
+        )
+
+        self.last_error = error
+        self.heading = heading
+        self._last_time = t
+
+        return outputs, heading
@@ -0,0 +1,367 @@
+"""
+Table-driven timed autonomous sequences.
+
+A timeline is a list of phases, each lasting a fixed amount of time and
+setting some of the robot's actuators::
+
+    Timeline([
+        (0.75, {'lift': -0.6, 'angle': 0}),
+        (1.5, {'lift': 0, 'speed': 250}),
+        (1.5, {'speed': -250}),
+        (0, {'speed': 0}),
+    ])
+
+Actuators not mentioned in a phase keep the target they had in the phase
+before. A phase lasting 0 seconds sets the targets to leave the actuators at
+when the timeline ends.
+
+Target values can also be the names of parameters (as strings), which are
+looked up when the timeline is started; for example, a drive angle that
+depends on the game data.
+
+A :class:`Sequencer` runs a timeline. The phase boundaries are computed once,
+when the timeline is created, and the sequencer keeps a cursor on the current
+phase, so every update is only a comparison until the next boundary passes.
+Actuators are only commanded when a phase starts and their target changes,
+rather than every robot loop.
+
+Timelines can be loaded from a JSON file -- a list of ``[duration,
+{targets}]`` pairs, like the example above (:func:`load`) -- or from a
+Preferences string (:func:`from_preferences`), so timing can be tuned without
+deploying code. Preferences strings can't contain quotes, so they use a
+simpler format, with phases separated by semicolons::
+
+    0.75: lift=-0.6, angle=0; 1.5: lift=0, speed=250; 1.5: speed=-250;
+    0: speed=0
+"""
+import bisect
+import json
+import sys
+
+import wpilib
+
+#: The names of the actuators in :func:`robot_actuators`.
+robot_actuator_names = ('angle', 'speed', 'lift', 'height', 'claw')
+
+
+class Timeline(object):
+    """
+    A list of timed phases.
+
+    Args:
+        phases: a sequence of ``(duration, targets)`` pairs, where
+            ``duration`` is in seconds and ``targets`` is a dict mapping
+            actuator names to the value to set them to.
+
+    Attributes:
+        phases: a list of ``(duration, targets)`` tuples.
+        boundaries: the time, from the start of the timeline, at which each
+            phase ends.
+        states: for each phase, the targets for every actuator set so far.
+        duration (float): the total length of the timeline, in seconds.
+
+    Raises:
+        ValueError: if a phase is malformed, or has a negative duration.
+    """
+
+    def __init__(self, phases):
+        self.phases = []
+        self.boundaries = []
+        self.states = []
+
+        end = 0
+        state = {}
+        for phase in phases:
+            try:
+                duration, targets = phase
+                duration = float(duration)
+                targets = dict(targets)
+            except (TypeError, ValueError):
+                raise ValueError('malformed phase: {!r}'.format(phase))
+
+            if duration < 0:
+                raise ValueError('negative phase duration: {!r}'.format(phase))
+
+            end += duration
+            state = dict(state, **targets)
+
+            self.phases.append((duration, targets))
+            self.boundaries.append(end)
+            self.states.append(state)
+
+        self.duration = end
+
+    def __len__(self):
+        return len(self.phases)
+
+    def actuators(self):
+        """Get the set of actuator names used anywhere in the timeline."""
+        return set(self.states[-1]) if self.states else set()
+
+    def phase_at(self, t):
+        """
+        Get the index of the phase running at a point in time.
+
+        Returns:
+            The index of the phase running ``t`` seconds after the timeline
+            started, or ``len(self)`` if the timeline is over by then.
+        """
+        return bisect.bisect_right(self.boundaries, t)
+
+    def to_json(self):
+        """Write the timeline as JSON, in the form :func:`parse` reads."""
+        return json.dumps([[d, targets] for d, targets in self.phases])
+
+    def to_text(self):
+        """
+        Write the timeline in the form :func:`parse_text` reads (and
+        Preferences can store).
+        """
+        return '; '.join(
+            '{:g}: {}'.format(duration, ', '.join(
+                '{}={}'.format(name, _format_value(value))
+                for name, value in sorted(targets.items())
+            ))
+            for duration, targets in self.phases
+        )
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    return '{:g}'.format(value)
+
+
+def _parse_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse(text):
+    """
+    Parse a timeline from JSON.
+
+    Raises:
+        ValueError: if the JSON is invalid, or doesn't describe a timeline.
+    """
+    phases = json.loads(text)
+    if not isinstance(phases, list):
+        raise ValueError('a timeline must be a list of phases')
+
+    return Timeline(phases)
+
+
+def parse_text(text):
+    """
+    Parse a timeline written as ``duration: name=value, ...; ...``. Values
+    that aren't numbers are parameter names.
+
+    Raises:
+        ValueError: if the text doesn't describe a timeline.
+    """
+    phases = []
+    for phase in text.split(';'):
+        if not phase.strip():
+            continue
+
+        duration, sep, targets = phase.partition(':')
+        if not sep:
+            raise ValueError('phase without a duration: {!r}'.format(phase))
+
+        values = {}
+        for target in targets.split(','):
+            if not target.strip():
+                continue
+
+            name, sep, value = target.partition('=')
+            if not sep or not name.strip() or not value.strip():
+                raise ValueError('malformed target: {!r}'.format(target))
+            values[name.strip()] = _parse_value(value.strip())
+
+        phases.append((duration.strip(), values))
+
+    return Timeline(phases)
+
+
+def load(path):
+    """Load a timeline from a JSON file."""
+    with open(path) as fp:
+        return parse(fp.read())
+
+
+def from_preferences(key, default, actuators=robot_actuator_names):
+    """
+    Load a timeline from a Preferences string (see :func:`parse_text`).
+
+    If the preference isn't set, or isn't a valid timeline, ``default`` is
+    used instead. The default is also saved to the preference if it isn't
+    set, so it can be edited from the dashboard.
+
+    Args:
+        key (str): the name of the preference.
+        default (Timeline): the timeline to use otherwise.
+        actuators: the names of the actuators the timeline may use.
+    """
+    prefs = wpilib.Preferences.getInstance()
+    text = prefs.getString(key, '')
+
+    if not text:
+        prefs.putString(key, default.to_text())
+        return default
+
+    try:
+        loaded = parse_text(text)
+        unknown = loaded.actuators() - set(actuators)
+        if unknown:
+            raise ValueError('unknown actuators: {}'.format(
+                ', '.join(sorted(unknown))
+            ))
+
+        return loaded
+    except ValueError:
+        print(
+            "[auto] Invalid timeline in preference '{}': {}".format(
+                key, sys.exc_info()[1]
+            ),
+            file=sys.stderr
+        )
+        return default
+
+
+class Sequencer(object):
+    """
+    Runs a :class:`Timeline`, commanding actuators as each phase starts.
+
+    Args:
+        timeline (Timeline): the timeline to run.
+        actuators: a sequence of ``(name, function)`` pairs. ``function`` is
+            called with the new target when the actuator's target changes.
+            When several actuators change at once, they are commanded in this
+            order.
+
+    Attributes:
+        phase (int): the index of the current phase, -1 before the first
+            update, or ``len(timeline)`` once the timeline is over.
+
+    Raises:
+        ValueError: if the timeline uses an actuator that isn't in
+            ``actuators``.
+    """
+
+    def __init__(self, timeline, actuators):
+        self.timeline = timeline
+        self.actuators = list(actuators)
+
+        unknown = timeline.actuators() - set(
+            name for name, _ in self.actuators
+        )
+        if unknown:
+            raise ValueError('unknown actuators: {}'.format(
+                ', '.join(sorted(unknown))
+            ))
+
+        self.phase = -1
+        self.params = {}
+        self._started = None
+        self._commanded = {}
+
+    @property
+    def running(self):
+        """Whether the timeline has been started and isn't over."""
+        return self._started is not None and self.phase < len(self.timeline)
+
+    @property
+    def finished(self):
+        """Whether the timeline is over."""
+        return self._started is not None and self.phase >= len(self.timeline)
+
+    def start(self, now, params=None):
+        """
+        Start the timeline. The first phase's targets are commanded on the
+        first :meth:`update`.
+
+        Args:
+            now (float): the current time, in seconds.
+            params (dict): values for the parameter names used as targets.
+        """
+        self.params = params or {}
+        self._started = now
+        self._commanded = {}
+        self.phase = -1
+
+    def update(self, now):
+        """
+        Move on to the phase running at the current time, commanding any
+        actuators whose targets change. Call this once every robot loop.
+
+        Args:
+            now (float): the current time, in seconds.
+
+        Returns:
+            True if the timeline is over.
+        """
+        t = now - self._started
+        boundaries = self.timeline.boundaries
+        phase = max(self.phase, 0)
+
+        # Phases only ever move forward, so advance the cursor past every
+        # boundary that has passed (usually none).
+        while phase < len(boundaries) and t >= boundaries[phase]:
+            phase += 1
+
+        if phase != self.phase:
+            self._enter(phase)
+
+        return phase >= len(boundaries)
+
+    def _enter(self, phase):
+        self.phase = phase
+
+        states = self.timeline.states
+        if not states:
+            return
+
+        # Skipped phases (and the end of the timeline) leave the actuators
+        # where the latest phase has them.
+        state = states[min(phase, len(states) - 1)]
+        for name, function in self.actuators:
+            if name not in state:
+                continue
+
+            target = state[name]
+            if isinstance(target, str):
+                target = self.params[target]
+
+            if name not in self._commanded or self._commanded[name] != target:
+                function(target)
+                self._commanded[name] = target
+
+
+def robot_actuators(robot):
+    """
+    Get the actuators timelines can use on the robot, in the order they are
+    commanded in:
+
+    - ``'angle'``: the steering angle of every swerve module, in radians.
+    - ``'speed'``: the drive speed of every swerve module, in native units
+      per 100ms.
+    - ``'lift'``: the lift motor output, from -1 to 1.
+    - ``'height'``: the lift height to run to, in inches (see
+      :meth:`lift.ManualControlLift.set_height`). Setting ``'lift'`` stops
+      running to a height.
+    - ``'claw'``: the claw motor output, from -1 to 1.
+
+    The steering angle comes first, since steering a module the short way
+    around can reverse its drive direction.
+    """
+    # (keep robot_actuator_names in sync with this)
+    drivetrain = robot.drivetrain
+    return [
+        ('angle', drivetrain.set_all_module_angles),
+        ('speed', lambda speed: drivetrain.set_all_module_speeds(speed, True)),
+        ('lift', robot.lift.setLiftPower),
+        ('height', robot.lift.set_height),
+        ('claw', robot.claw.set_power),
+    ]
@@ -0,0 +1,287 @@
+"""
+On-disk store for pathfinder trajectories.
+
+Each route is saved as its own ``.npy`` file, holding a flat NumPy structured
+array with one record per trajectory segment (see :data:`segment_dtype`).
+File names include a hash of everything the trajectory is generated from
+(see :func:`route_key`), so a route is only regenerated when its waypoints or
+generation parameters change. Stale files for the same route are removed
+when a new one is saved.
+
+Routes are loaded lazily, and memory-mapped rather than read and unpickled,
+so the cost of loading a route does not depend on how many other routes
+exist, and is paid only for the route actually used.
+
+The store also keeps the swerve-modified trajectory of each module for a
+route (see :meth:`TrajectoryStore.get_modules`), so that none of the
+trajectory work needs to be done when autonomous starts.
+"""
+import collections
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pathfinder as pf
+
+#: Bump this to invalidate every stored trajectory, for example if the file
+#: layout changes.
+format_version = 1
+
+#: The layout of one trajectory segment on disk, matching the fields of
+#: ``pathfinder.Segment``.
+segment_dtype = np.dtype([
+    ('dt', np.float64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('position', np.float64),
+    ('velocity', np.float64),
+    ('acceleration', np.float64),
+    ('jerk', np.float64),
+    ('heading', np.float64),
+])
+
+#: The order of the modules in swerve-modified trajectories, matching
+#: ``constants.swerve_config``.
+module_order = ('FrontRight', 'FrontLeft', 'BackRight', 'BackLeft')
+
+#: Everything a trajectory is generated from.
+#:
+#: Attributes:
+#:     waypoints: a sequence of ``(x, y, exit angle)`` tuples, in meters and
+#:         radians.
+#:     fit (str): the spline fit, either ``'hermite_cubic'`` or
+#:         ``'hermite_quintic'``.
+#:     samples (int): the number of spline samples, such as
+#:         ``pathfinder.SAMPLES_HIGH``.
+#:     dt (float): the time between segments, in seconds.
+#:     max_velocity, max_acceleration, max_jerk (float): trajectory limits,
+#:         in meters and seconds.
+Route = collections.namedtuple('Route', [
+    'waypoints', 'fit', 'samples', 'dt',
+    'max_velocity', 'max_acceleration', 'max_jerk'
+])
+
+
+def route_key(route, **params):
+    """
+    Get a hash of the inputs to a route's trajectory.
+
+    Args:
+        route (Route): the route.
+        **params: any other numeric parameters the stored data depends on.
+
+    Returns:
+        A hex digest string. Equal routes always get equal keys.
+    """
+    data = {
+        'version': format_version,
+        'waypoints': [
+            [float(x), float(y), float(angle)]
+            for x, y, angle in route.waypoints
+        ],
+        'fit': route.fit,
+        'samples': int(route.samples),
+        'dt': float(route.dt),
+        'max_velocity': float(route.max_velocity),
+        'max_acceleration': float(route.max_acceleration),
+        'max_jerk': float(route.max_jerk),
+        'params': {k: float(v) for k, v in params.items()},
+    }
+
+    encoded = json.dumps(data, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def generate(route):
+    """
+    Generate the trajectory for a route with pathfinder.
+
+    Returns:
+        A structured array of :data:`segment_dtype`.
+    """
+    _, segments = pf.generate(
+        [pf.Waypoint(x, y, angle) for x, y, angle in route.waypoints],
+        getattr(pf, 'FIT_' + route.fit.upper()),
+        route.samples, route.dt,
+        route.max_velocity, route.max_acceleration, route.max_jerk
+    )
+
+    return segments_to_array(segments)
+
+
+def swerve_modify(array, wheelbase_width, wheelbase_depth):
+    """
+    Compute the trajectory each swerve module follows along a path.
+
+    Args:
+        array: a structured array of :data:`segment_dtype`.
+        wheelbase_width, wheelbase_depth (float): the distance between the
+            left and right wheels and the front and back wheels, in meters.
+
+    Returns:
+        A ``(4, len(array))`` structured array, with one row per module in
+        :data:`module_order`.
+    """
+    modifier = pf.modifiers.SwerveModifier(array_to_segments(array))
+    modifier.modify(wheelbase_width, wheelbase_depth)
+
+    return np.stack([
+        segments_to_array(getattr(modifier, 'get{}Trajectory'.format(name))())
+        for name in module_order
+    ])
+
+
+def segments_to_array(segments):
+    """
+    Convert a list of ``pathfinder.Segment`` to a structured array.
+    """
+    return np.array(
+        [tuple(getattr(s, f) for f in segment_dtype.names) for s in segments],
+        dtype=segment_dtype
+    )
+
+
+def array_to_segments(array):
+    """
+    Convert a structured array back to a list of ``pathfinder.Segment``, as
+    taken by pathfinder's modifiers and followers.
+    """
+    return [
+        pf.Segment(*row)
+        for row in array[list(segment_dtype.names)].tolist()
+    ]
+
+
+class TrajectoryStore(object):
+    """
+    A directory of stored trajectories, one file per route.
+
+    Args:
+        directory (str): where trajectory files are kept. Created when the
+            first trajectory is saved.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._loaded = {}
+
+    def path(self, name, route, **params):
+        """Get the file path a route's trajectory is stored at."""
+        return os.path.join(self.directory, '{}-{}.npy'.format(
+            name, route_key(route, **params)[:16]
+        ))
+
+    def load(self, name, route, **params):
+        """
+        Load a stored trajectory, without regenerating it.
+
+        Args:
+            name (str): the name the trajectory is stored under.
+            route (Route): the route the trajectory was generated from.
+            **params: any other parameters the trajectory depends on.
+
+        Returns:
+            A read-only, memory-mapped structured array of
+            :data:`segment_dtype`, or None if the route has not been stored
+            with these inputs.
+        """
+        path = self.path(name, route, **params)
+        if path in self._loaded:
+            return self._loaded[path]
+
+        if not os.path.exists(path):
+            return None
+
+        array = np.load(path, mmap_mode='r', allow_pickle=False)
+        if array.dtype != segment_dtype:
+            return None
+
+        self._loaded[path] = array
+        return array
+
+    def save(self, name, route, array, **params):
+        """
+        Store a route's trajectory, replacing any stale versions of it.
+
+        Returns:
+            The path the trajectory was saved to.
+        """
+        path = self.path(name, route, **params)
+        prefix = name + '-'
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # Write to a temporary file first, so that a crash midway can't leave
+        # a truncated file under the real name.
+        fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=self.directory)
+        with os.fdopen(fd, 'wb') as fp:
+            np.save(fp, np.asarray(array, dtype=segment_dtype))
+        os.replace(tmp_path, path)
+
+        for filename in os.listdir(self.directory):
+            other = os.path.join(self.directory, filename)
+            if (
+                filename.startswith(prefix) and filename.endswith('.npy')
+                and other != path
+                and len(filename) == len(prefix) + 16 + len('.npy')
+            ):
+                os.remove(other)
+                self._loaded.pop(other, None)
+
+        self._loaded.pop(path, None)
+        return path
+
+    def get(self, name, route):
+        """
+        Load a route's trajectory, generating and storing it first if it is
+        missing or out of date.
+
+        Returns:
+            A read-only structured array of :data:`segment_dtype`.
+        """
+        array = self.load(name, route)
+        if array is None:
+            self.save(name, route, generate(route))
+            array = self.load(name, route)
+
+        return array
+
+    def segments(self, name, route):
+        """
+        Like :meth:`get`, but returns a list of ``pathfinder.Segment``.
+        """
+        return array_to_segments(self.get(name, route))
+
+    def get_modules(self, name, route, wheelbase_width, wheelbase_depth):
+        """
+        Load the swerve-modified trajectories of a route, generating and
+        storing them first if they are missing or out of date.
+
+        Args:
+            name (str): the name of the route.
+            route (Route): the route.
+            wheelbase_width, wheelbase_depth (float): see
+                :func:`swerve_modify`.
+
+        Returns:
+            A read-only ``(4, n)`` structured array, with one row per module
+            in :data:`module_order`.
+        """
+        modules_name = name + '-modules'
+        params = {
+            'wheelbase_width': wheelbase_width,
+            'wheelbase_depth': wheelbase_depth,
+        }
+
+        array = self.load(modules_name, route, **params)
+        if array is None:
+            modules = swerve_modify(
+                self.get(name, route), wheelbase_width, wheelbase_depth
+            )
+            self.save(modules_name, route, modules, **params)
+            array = self.load(modules_name, route, **params)
+
+        return array
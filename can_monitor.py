@@ -0,0 +1,405 @@
+"""
+CAN bus traffic accounting for Talon SRX motor controllers.
+
+:class:`CANMonitor` wraps every public :class:`ctre.talonsrx.TalonSRX` method
+(at the class level, so every call site is covered) and counts how many times
+each device's methods are called in each robot loop. Calls are sorted into
+four categories:
+
+- **set**: control requests (``set``, ``follow``, ``setInverted``...). These
+  only update the payload of the Talon's periodic control frame.
+- **get**: reads (``get*``, ``is*``, ``has*``). These are served from cached
+  status frames, which the Talon sends periodically.
+- **config**: ``config*`` calls, each of which sends a parameter frame and
+  waits for a response.
+- **param**: other calls that also send a parameter frame and response, such
+  as ``selectProfileSlot`` or ``setQuadraturePosition``.
+
+Bus utilization is estimated from the periodic control and status frames of
+every Talon seen (taking ``setStatusFramePeriod`` and
+``setControlFramePeriod`` calls into account), plus the one-shot parameter
+frames sent each loop, using the worst-case size of an 8-byte extended CAN
+frame.
+
+This works the same way in simulation, so CAN traffic regressions can be
+caught by tests.
+"""
+import collections
+import functools
+import inspect
+
+import numpy as np
+import wpilib
+from ctre.talonsrx import TalonSRX
+
+import constants
+
+StatusFrame = TalonSRX.StatusFrameEnhanced
+
+#: CAN bus bitrate, in bits per second.
+bus_bitrate = 1000000
+
+#: Worst-case size of an extended CAN frame with 8 data bytes, in bits,
+#: including bit stuffing and interframe space.
+frame_bits = 8 * 8 + 64 + 3 + (54 + 8 * 8 - 1) // 4
+
+#: Frames sent by a call that changes (or reads) a Talon parameter: the
+#: request and the response.
+param_frames = 2
+
+#: Default Talon status frame periods, in milliseconds.
+default_status_periods = {
+    StatusFrame.Status_1_General: 10,
+    StatusFrame.Status_2_Feedback0: 20,
+    StatusFrame.Status_3_Quadrature: 160,
+    StatusFrame.Status_4_AinTempVbat: 160,
+    StatusFrame.Status_8_PulseWidth: 160,
+    StatusFrame.Status_10_MotionMagic: 160,
+    StatusFrame.Status_13_Base_PIDF0: 160,
+}
+
+#: Default Talon control frame period, in milliseconds.
+default_control_period = 10
+
+#: Methods that send a parameter frame without being named ``config*``.
+param_methods = frozenset([
+    'changeMotionControlFramePeriod', 'clearStickyFaults',
+    'enableCurrentLimit', 'enableVoltageCompensation',
+    'overrideLimitSwitchesEnable', 'overrideSoftLimitsEnable',
+    'selectProfileSlot', 'setAnalogPosition', 'setControlFramePeriod',
+    'setIntegralAccumulator', 'setNeutralMode', 'setPulseWidthPosition',
+    'setQuadraturePosition', 'setSelectedSensorPosition',
+    'setStatusFramePeriod',
+])
+
+# Methods that change how often a Talon sends periodic frames.
+_frame_period_methods = frozenset([
+    'setStatusFramePeriod', 'setControlFramePeriod'
+])
+
+#: Methods that are not counted at all.
+ignored_methods = frozenset(['getDeviceID', 'getBaseID', 'getDeviceNumber'])
+
+# The monitor that receives calls from the instrumented TalonSRX methods.
+_active_monitor = None
+_original_methods = {}
+
+
+def classify(method_name):
+    """
+    Get the traffic category of a TalonSRX method.
+
+    Returns:
+        One of ``'set'``, ``'get'``, ``'config'`` or ``'param'``.
+    """
+    if method_name.startswith('config'):
+        return 'config'
+    elif method_name in param_methods:
+        return 'param'
+    elif method_name.startswith(('get', 'is', 'has')):
+        return 'get'
+
+    return 'set'
+
+
+def device_names():
+    """
+    Get readable names for the robot's Talons, keyed by CAN ID.
+    """
+    names = {}
+    for name, steer_id, drive_id in constants.swerve_config:
+        names[steer_id] = name + ' Steer'
+        names[drive_id] = name + ' Drive'
+
+    names[constants.lift_ids['left']] = 'Lift Main'
+    names[constants.lift_ids['right']] = 'Lift Follower'
+    names[constants.claw_id] = 'Claw'
+    names[constants.claw_follower_id] = 'Claw Follower'
+    names[constants.winch_id] = 'Winch'
+
+    return names
+
+
+def _instrument(name, method):
+    get_id = TalonSRX.getDeviceID
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        monitor = _active_monitor
+        if monitor is None or monitor._depth > 0:
+            return method(self, *args, **kwargs)
+
+        # Cache the device ID; looking it up goes through the HAL.
+        try:
+            device_id = self._can_monitor_id
+        except AttributeError:
+            device_id = self._can_monitor_id = get_id(self)
+
+        monitor._loop_counts[(device_id, name)] += 1
+        if name in _frame_period_methods:
+            monitor.record_frame_period(device_id, name, args)
+
+        monitor._depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            monitor._depth -= 1
+
+    return wrapper
+
+
+class CANMonitor(object):
+    """
+    Counts Talon SRX calls and estimates CAN bus utilization.
+
+    Call :meth:`install` before creating any Talons, and :meth:`end_loop`
+    once at the end of every robot loop.
+
+    Parameters:
+        names: an optional dict mapping CAN IDs to readable device names.
+        loop_period: the robot loop period, in seconds.
+        window: the number of recent loops to compute statistics over.
+
+    Attributes:
+        loops: the number of loops recorded.
+    """
+
+    def __init__(self, names=None, loop_period=0.02, window=250):
+        self.names = names or {}
+        self.loop_period = loop_period
+
+        self.loops = 0
+        self._depth = 0
+
+        self._loop_counts = collections.Counter()
+        self._total_counts = collections.Counter()
+        self._status_periods = {}
+        self._control_periods = {}
+
+        self._param_frames = np.zeros(window)
+        self._utilization = np.zeros(window)
+
+    def install(self):
+        """
+        Instrument the TalonSRX class and route its calls to this monitor.
+        """
+        global _active_monitor
+
+        if not _original_methods:
+            for name in dir(TalonSRX):
+                method = getattr(TalonSRX, name)
+                if (
+                    name.startswith('_')
+                    or name in ignored_methods
+                    or not inspect.isfunction(
+                        inspect.getattr_static(TalonSRX, name)
+                    )
+                ):
+                    continue
+
+                _original_methods[name] = vars(TalonSRX).get(name)
+                setattr(TalonSRX, name, _instrument(name, method))
+
+        _active_monitor = self
+
+    def uninstall(self):
+        """
+        Restore the original TalonSRX methods.
+        """
+        global _active_monitor
+
+        # Methods inherited from base classes are removed again, rather than
+        # copied onto TalonSRX.
+        for name, method in _original_methods.items():
+            if method is None:
+                delattr(TalonSRX, name)
+            else:
+                setattr(TalonSRX, name, method)
+
+        _original_methods.clear()
+        _active_monitor = None
+
+    def device_name(self, device_id):
+        return self.names.get(device_id, 'Talon {}'.format(device_id))
+
+    def record(self, device_id, method_name):
+        """
+        Record one call to a TalonSRX method.
+
+        Args:
+            device_id (int): the CAN ID of the Talon.
+            method_name (str): the name of the method called.
+        """
+        self._loop_counts[(device_id, method_name)] += 1
+
+    def record_frame_period(self, device_id, method_name, args):
+        """
+        Record a call to ``setStatusFramePeriod`` or
+        ``setControlFramePeriod``.
+        """
+        self._add_device(device_id)
+
+        if len(args) < 2:
+            return
+
+        if method_name == 'setStatusFramePeriod':
+            self._status_periods[device_id][args[0]] = args[1]
+        elif method_name == 'setControlFramePeriod':
+            self._control_periods[device_id] = args[1]
+
+    def _add_device(self, device_id):
+        if device_id not in self._status_periods:
+            self._status_periods[device_id] = dict(default_status_periods)
+            self._control_periods[device_id] = default_control_period
+
+    def periodic_frame_rate(self):
+        """
+        Get the rate of periodic control and status frames sent by all of the
+        Talons seen so far, in frames per second.
+        """
+        rate = 0
+        for device_id, periods in self._status_periods.items():
+            control_period = self._control_periods[device_id]
+            if control_period > 0:
+                rate += 1000 / control_period
+
+            rate += sum(1000 / p for p in periods.values() if p > 0)
+
+        return rate
+
+    def end_loop(self):
+        """
+        Finish accounting for the current robot loop.
+
+        Returns:
+            The estimated bus utilization over this loop, from 0 to 1.
+        """
+        frames = 0
+        for (device_id, method_name), count in self._loop_counts.items():
+            self._add_device(device_id)
+            if classify(method_name) in ('config', 'param'):
+                frames += count * param_frames
+
+        frame_rate = self.periodic_frame_rate() + (frames / self.loop_period)
+        utilization = frame_rate * frame_bits / bus_bitrate
+
+        idx = self.loops % self._param_frames.size
+        self._param_frames[idx] = frames
+        self._utilization[idx] = utilization
+
+        self._total_counts.update(self._loop_counts)
+        self._loop_counts.clear()
+        self.loops += 1
+
+        return utilization
+
+    def _window(self, data):
+        return data[:min(self.loops, data.size)]
+
+    @property
+    def average_utilization(self):
+        """Average estimated bus utilization over recent loops."""
+        if self.loops == 0:
+            return 0
+        return float(np.mean(self._window(self._utilization)))
+
+    @property
+    def peak_utilization(self):
+        """Peak estimated bus utilization over recent loops."""
+        if self.loops == 0:
+            return 0
+        return float(np.max(self._window(self._utilization)))
+
+    @property
+    def average_param_frames(self):
+        """Average one-shot parameter frames per loop over recent loops."""
+        if self.loops == 0:
+            return 0
+        return float(np.mean(self._window(self._param_frames)))
+
+    def worst_offenders(self, n=5):
+        """
+        Get the call sites generating the most CAN traffic.
+
+        Args:
+            n (int): the maximum number of offenders to return.
+
+        Returns:
+            A list of ``(device name, method name, category, frames per loop,
+            calls per loop)`` tuples, averaged over every recorded loop and
+            sorted by frames and then calls.
+        """
+        loops = max(self.loops, 1)
+        offenders = []
+
+        for (device_id, method_name), count in self._total_counts.items():
+            category = classify(method_name)
+            frames = count * param_frames if category in (
+                'config', 'param'
+            ) else 0
+
+            offenders.append((
+                self.device_name(device_id), method_name, category,
+                frames / loops, count / loops
+            ))
+
+        offenders.sort(key=lambda o: (o[3], o[4]), reverse=True)
+        return offenders[:n]
+
+    def calls_per_loop(self):
+        """
+        Get the average number of calls per loop for each device and
+        category.
+
+        Returns:
+            A dict mapping device names to dicts of ``{category: calls}``.
+        """
+        loops = max(self.loops, 1)
+        calls = collections.defaultdict(collections.Counter)
+
+        for (device_id, method_name), count in self._total_counts.items():
+            calls[self.device_name(device_id)][classify(method_name)] += (
+                count / loops
+            )
+
+        return {name: dict(counter) for name, counter in calls.items()}
+
+    def report(self, n=5):
+        """
+        Format a short plain-text report of CAN bus usage.
+        """
+        lines = [
+            'CAN utilization: {:.1%} average, {:.1%} peak, '
+            '{:.1f} param frames / loop'.format(
+                self.average_utilization, self.peak_utilization,
+                self.average_param_frames
+            )
+        ]
+
+        for name, method_name, category, frames, calls in (
+            self.worst_offenders(n)
+        ):
+            lines.append(
+                '  {}.{} ({}): {:.1f} frames, {:.1f} calls / loop'.format(
+                    name, method_name, category, frames, calls
+                )
+            )
+
+        return '\n'.join(lines)
+
+    def update_smart_dashboard(self):
+        wpilib.SmartDashboard.putNumber(
+            'CAN Utilization', self.average_utilization
+        )
+        wpilib.SmartDashboard.putNumber(
+            'CAN Peak Utilization', self.peak_utilization
+        )
+        wpilib.SmartDashboard.putNumber(
+            'CAN Param Frames Per Loop', self.average_param_frames
+        )
+        wpilib.SmartDashboard.putString(
+            'CAN Worst Offenders', '; '.join(
+                '{}.{}: {:.1f}'.format(name, method_name, frames)
+                for name, method_name, _, frames, _ in self.worst_offenders(3)
+            )
+        )
@@ -8,15 +8,28 @@ Autonomous mode will attempt to drive the lift to a height of 3 feet.
 
 Everything can be configured either from Preferences or from the Robot class
 member variables.
+
+The lift kinematics are shared with the main robot code, and imported from
+``lift/kinematics.py``. Only this folder is deployed, so copy that file in
+first::
+
+    cp ../lift/kinematics.py . && python3 robot.py deploy
 """
 
 import math
+import os
+import sys
 from ctre.talonsrx import TalonSRX
 import wpilib
 from robotpy_ext.control.button_debouncer import ButtonDebouncer
 
+# (when deployed, the copy next to this file is used instead.)
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'lift'
+))
+import kinematics  # noqa: E402
+
 FeedbackDevice = TalonSRX.FeedbackDevice
-angle_conv_factor = math.pi / (512 * 3)
 
 
 class Robot(wpilib.IterativeRobot):
@@ -27,6 +40,9 @@ class Robot(wpilib.IterativeRobot):
     # Lift of one stage of the RD4B, in inches
     ARM_LENGTH = 28
 
+    # Encoder units per radian of arm rotation
+    UNITS_PER_RADIAN = 512 * 3 / math.pi
+
     controller_index = 1
     control_axis_index = 2
 
@@ -40,16 +56,15 @@ class Robot(wpilib.IterativeRobot):
         # get the encoder value when the RD4B is in the fully down position.
         self.initial_angle = self.__prefs.getFloat("Lift Pot Lower Limit", 0)  # noqa: E501
 
-        # pre-convert the initial angle to radians and take the sin of the
-        # angle.
-        self.INITIAL_ANGLE_RADIANS_SIN = math.sin(
-            (self.initial_angle - self.HORIZONTAL_ANGLE) * angle_conv_factor
-        )
-
         # get the upper limit of the encoder, or the encoder value when the
         # RD4B is fully extended upward.
         self.LIMIT_UP = self.__prefs.getFloat("Lift Pot Upper Limit", 0)
 
+        self.kinematics = kinematics.from_limits(
+            self.ARM_LENGTH, self.UNITS_PER_RADIAN, self.HORIZONTAL_ANGLE,
+            self.initial_angle, self.LIMIT_UP
+        )
+
         # set the soft limits to LIMIT_UP and the initial angle. the motors
         # should not go outside of this range.
         self.lift_main.configForwardSoftLimitThreshold(int(self.LIMIT_UP), 0)
@@ -62,37 +77,19 @@ class Robot(wpilib.IterativeRobot):
         )
 
     def __update_smart_dashboard(self):
-        final_angle_radians = (
-            (self.lift_main.getSelectedSensorPosition(0) - self.HORIZONTAL_ANGLE)  # noqa: E501
-            * angle_conv_factor
-        )
-
-        # calculate the height of the RD4B using the final angle and based on
-        # the given equation.
-        height = 2 * self.ARM_LENGTH * (
-            math.sin(final_angle_radians) - self.INITIAL_ANGLE_RADIANS_SIN
-        )
+        position = self.lift_main.getSelectedSensorPosition(0)
+        height = float(self.kinematics.height(position))
+        angle = float(self.kinematics.angle(height))
 
         wpilib.SmartDashboard.putNumber("Lift Height", height)
-        wpilib.SmartDashboard.putNumber("Lift Angle", math.degrees(final_angle_radians))  # noqa: E501
-        wpilib.SmartDashboard.putNumber(
-            "Lift Position", self.lift_main.getSelectedSensorPosition(0)
-        )
+        wpilib.SmartDashboard.putNumber("Lift Angle", math.degrees(angle))
+        wpilib.SmartDashboard.putNumber("Lift Position", position)
         wpilib.SmartDashboard.putNumber(
             "Lift Error", self.lift_main.getClosedLoopError(0)
         )
 
     def __set_lift_height(self, tgt_height):
-        final_angle_radians = math.asin(
-            (tgt_height / (2 * self.ARM_LENGTH))
-            + self.INITIAL_ANGLE_RADIANS_SIN
-        )
-
-        # convert this final angle from radians to native units.
-        native_units = (
-            (final_angle_radians / angle_conv_factor)
-            + self.HORIZONTAL_ANGLE
-        )
+        native_units = float(self.kinematics.position(tgt_height))
 
         # set the left motor to run to this position (the right motor will
         # follow it)
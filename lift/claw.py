@@ -15,6 +15,21 @@ automaton with these states:
   driver wants full control over the claw without assistance
   from the state automaton.
 
+The claw has no position sensor, so it watches its motor current instead.
+While the jaws are moving freely, the motor spins near its free speed and
+draws little current; when they close on a cube (or open all the way), the
+motor stalls and the current jumps. So "closing" becomes "closed", and
+"opening" becomes "neutral", as soon as the current has stayed above
+``detect_current`` for ``detect_time`` (ignoring the inrush as the motor
+starts up), with ``claw_movement_time`` as a fallback.
+
+Once closed, the grip is held by a current loop: the stalled motor's current
+is proportional to its output, so the output is adjusted to hold the current
+at ``grip_current``, which squeezes the cube just as hard whatever the
+battery voltage, with much less current than a fixed holding output.
+
+Positive output closes the claw (as in teleop), negative output opens it.
+
 :Authors: Brandon Gong, Sebastian Mobo
 :Version: 0.0.1
 :Date: January 19, 2018
@@ -23,6 +38,8 @@ automaton with these states:
 import wpilib
 from ctre.talonsrx import TalonSRX
 
+import protection
+
 
 class Claw:
     """
@@ -33,9 +50,31 @@ class Claw:
         contact_sensor_channel: the channel that the contact sensor is
             connected to.
     """
-    claw_movement_time = 0.5  #: time to allow for the claw to open, in seconds
+    #: time to allow for the claw to open or close, in seconds, if the jaws
+    #: aren't seen to stall first
+    claw_movement_time = 1.0
     claw_adjust_time = 0.25
 
+    closing_power = 1.0  #: output to close the claw with
+    opening_power = -1.0  #: output to open the claw with
+
+    #: current above which the jaws have stalled against a cube (or the
+    #: open stop), in amps
+    detect_current = 25
+    #: how long the current has to stay above detect_current, in seconds
+    detect_time = 0.04
+    #: how long to ignore the current for after the motor starts, while it
+    #: speeds up, in seconds
+    inrush_time = 0.08
+
+    #: current to hold the cube with, in amps (about what the old fixed
+    #: 0.05 hold output drew)
+    grip_current = 2.5
+    grip_kF = 0.02  #: grip output per amp of grip current
+    grip_kP = 0.004  #: grip output per amp of current error
+    grip_kI = 0.1  #: grip output per amp-second of current error
+    grip_max_output = 0.5  #: largest output the grip loop can use
+
     def __init__(self, talon_id, follower_id):
         """
         Create a new instance of the claw subsystem.
@@ -62,12 +101,74 @@ class Claw:
 
         self.state = 'neutral'
 
+        # stall and overheating protection. The claw has no velocity sensor,
+        # and stalls against the cube when gripping it, so stalls only limit
+        # its output rather than cutting it.
+        self.protection = protection.MotorProtection(
+            stall_current=40, stall_time=1, cooldown=1, stall_output=0.3,
+            continuous_current=20, thermal_time_constant=20
+        )
+        self.requested_power = 0
+        self.applied_power = 0
+
+        self.grip_integral = 0
+        self.last_update = None
+        self.detected_since = None
+
         self.closeAdjustTimer = wpilib.Timer()
         self.movementTimer = wpilib.Timer()
 
+    def load_config_values(self):
+        """
+        Load the claw's cube detection and grip settings, and its protection
+        thresholds, from Preferences.
+        """
+        prefs = wpilib.Preferences.getInstance()
+
+        self.detect_current = prefs.getFloat(
+            "Claw: Detect Current", self.detect_current
+        )
+        self.detect_time = prefs.getFloat(
+            "Claw: Detect Time", self.detect_time
+        )
+        self.grip_current = prefs.getFloat(
+            "Claw: Grip Current", self.grip_current
+        )
+        self.grip_kF = prefs.getFloat("Claw: Grip kF", self.grip_kF)
+        self.grip_kP = prefs.getFloat("Claw: Grip kP", self.grip_kP)
+        self.grip_kI = prefs.getFloat("Claw: Grip kI", self.grip_kI)
+
+        self.protection.load_config_values("Claw")
+
+    def update_smart_dashboard(self):
+        wpilib.SmartDashboard.putString("Claw State", self.state)
+        wpilib.SmartDashboard.putNumber(
+            "Claw Current", self.talon.getOutputCurrent()
+        )
+
     def set_power(self, power):
         self.state = 'manual_ctrl'
-        self.talon.set(TalonSRX.ControlMode.PercentOutput, power)
+        self._set_output(power)
+
+    def _set_output(self, power):
+        self.requested_power = power
+        self.applied_power = self.protection.limit(power)
+        self.talon.set(TalonSRX.ControlMode.PercentOutput, self.applied_power)
+
+    def protect(self):
+        """
+        Sample the claw motor current, and limit the output if the claw has
+        stalled or the motors are overheating (see :mod:`protection`). Call
+        this once every robot loop.
+        """
+        self.protection.update(
+            self.talon.getOutputCurrent(), output=self.requested_power
+        )
+
+        # re-apply the last output if the limit on it has changed.
+        limited = self.protection.limit(self.requested_power)
+        if limited != self.applied_power:
+            self._set_output(self.requested_power)
 
     def close(self):
         """
@@ -80,6 +181,7 @@ class Claw:
         """
         if self.state != 'closed' and self.state != 'closing':
             self.state = 'closing'
+            self.detected_since = None
             self.movementTimer.reset()
             self.movementTimer.start()
 
@@ -92,9 +194,79 @@ class Claw:
         """
         if self.state != 'neutral' and self.state != 'opening':
             self.state = 'opening'
+            self.detected_since = None
             self.movementTimer.reset()
             self.movementTimer.start()
 
+    def grip(self):
+        """
+        Hold the claw closed on a cube with the grip current loop, without
+        closing it first (e.g. after the driver has closed it by hand).
+        """
+        if self.state != 'closed':
+            self._start_grip()
+
+    def _start_grip(self):
+        self.state = 'closed'
+        self.grip_integral = 0
+        self.last_update = None
+        self.closeAdjustTimer.reset()
+        self.closeAdjustTimer.start()
+
+    def stalled(self, now=None):
+        """
+        Check whether the jaws have stopped against something, from the
+        motor current. Call this once every robot loop while they're moving.
+
+        Returns:
+            True once the current has stayed above ``detect_current`` for
+            ``detect_time``, not counting the inrush as the motor starts.
+        """
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+
+        current = self.talon.getOutputCurrent()
+        if (
+            self.movementTimer.get() < self.inrush_time
+            or current < self.detect_current
+        ):
+            self.detected_since = None
+            return False
+
+        if self.detected_since is None:
+            self.detected_since = now
+
+        return now - self.detected_since >= self.detect_time
+
+    def grip_output(self, now=None):
+        """
+        Run the grip current loop one step.
+
+        Returns:
+            The output that holds the grip current.
+        """
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+
+        dt = now - self.last_update if self.last_update is not None else 0
+        self.last_update = now
+
+        error = self.grip_current - self.talon.getOutputCurrent()
+        feedforward = self.grip_kF * self.grip_current
+
+        # don't integrate while the output is saturated, so the integral
+        # doesn't wind up while the jaws are still closing.
+        output = feedforward + self.grip_kP * error + self.grip_integral
+        saturated = (
+            (output >= self.grip_max_output and error > 0)
+            or (output <= 0 and error < 0)
+        )
+        if not saturated:
+            self.grip_integral += self.grip_kI * error * dt
+
+        output = feedforward + self.grip_kP * error + self.grip_integral
+        return max(0, min(self.grip_max_output, output))
+
     def toggle(self):
         """
         Toggle the claw state.
@@ -122,36 +294,36 @@ class Claw:
         elif self.state == 'neutral':
             self.movementTimer.reset()
             self.movementTimer.stop()
-            self.talon.set(TalonSRX.ControlMode.PercentVbus, 0)
+            self._set_output(0)
 
-        # if the state is "closing", set the talon speed to -100%, and if the
-        # touch sensor is depressed, transition to the "closed" state.
+        # if the state is "closing", close at full power until the jaws stall
+        # on the cube, then transition to the "closed" state.
         elif self.state == 'closing':
-            self.talon.set(TalonSRX.ControlMode.PercentVbus, -1.0)
-            # fwdLim, revLim = self.talon.getLimitSwitchState()
-            #
-            # if revLim:  # contact sensor pressed?
-            #     self.state = 'closed'
-            #     self.closeAdjustTimer.reset()
-            #     self.closeAdjustTimer.start()
-            if self.movementTimer.get() > self.claw_movement_time:
-                self.state = 'closed'
-                self.closeAdjustTimer.reset()
-                self.closeAdjustTimer.start()
+            self._set_output(self.closing_power)
+            if (
+                self.stalled()
+                or self.movementTimer.get() > self.claw_movement_time
+            ):
+                self._start_grip()
 
         # if the state is "closed", use less power to the motors--
-        # Maintain grip, but don't squeeze too hard
+        # Maintain grip, but don't squeeze too hard. Let the jaws relax for a
+        # moment first, so the current loop doesn't start from a stall at
+        # full power.
         elif self.state == 'closed':
             if self.closeAdjustTimer.get() > self.claw_adjust_time:
-                self.talon.set(TalonSRX.ControlMode.PercentVbus, -0.5)
+                self._set_output(self.grip_output())
             else:
-                self.talon.set(TalonSRX.ControlMode.PercentVbus, 0)
+                self.last_update = None
+                self._set_output(self.grip_kF * self.grip_current)
 
-        # if the state is "opening", save the current time if the start time
-        # is currently empty and set the motor speed to +100%.
-        # Run until reaching claw_movement_time, then transition to
-        # the "neutral" state.
+        # if the state is "opening", open at full power until the jaws stall
+        # against the open stop (or claw_movement_time passes), then
+        # transition to the "neutral" state.
         elif self.state == 'opening':
-            self.talon.set(TalonSRX.ControlMode.PercentVbus, 1.0)
-            if self.movementTimer.get() > self.claw_movement_time:
+            self._set_output(self.opening_power)
+            if (
+                self.stalled()
+                or self.movementTimer.get() > self.claw_movement_time
+            ):
                 self.state = 'neutral'
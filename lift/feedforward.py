@@ -0,0 +1,243 @@
+"""
+Height-scheduled gravity feedforward for the lift.
+
+How hard the lift motors have to push to hold the lift up depends on the arm
+angle: gravity's torque on the RD4B arms is largest with them horizontal and
+falls off towards either end of the lift's travel. A
+:class:`GravityFeedforward` is a table of the motor output that holds the
+lift still at a few heights, interpolated in between; it is added to every
+lift command, manual or closed-loop, so the rest of the command only has to
+move the lift, not hold it up.
+
+The table is stored as a Preferences string of ``height: output`` pairs::
+
+    6: -0.072, 18: -0.085, 30: -0.09, 42: -0.088, 54: -0.08, 66: -0.066
+
+and is measured by a :class:`GravityCalibration`, run in test mode. At each
+height, the calibration runs the lift there, then slowly ramps the output up
+until the lift starts to rise, runs it back, and ramps the output down until
+the lift starts to sink. Static friction holds the lift still anywhere
+between those two outputs, so the output that balances gravity is halfway
+between them (and half the difference is the static friction, give or take
+how long the lift takes to move far enough to notice).
+"""
+import sys
+
+import numpy as np
+import wpilib
+
+
+class GravityFeedforward(object):
+    """
+    A table of lift hold outputs by height.
+
+    Args:
+        heights: the heights in the table, in inches above the lift's lowest
+            position, in increasing order.
+        outputs: the motor output (negative is up) that holds the lift still
+            at each height.
+
+    Raises:
+        ValueError: if the table is empty, the heights aren't increasing, or
+            there isn't one output for each height.
+    """
+
+    def __init__(self, heights, outputs):
+        self.heights = np.array(heights, dtype=float)
+        self.outputs = np.array(outputs, dtype=float)
+
+        if len(self.heights) == 0 or self.heights.shape != self.outputs.shape:
+            raise ValueError('a feedforward table needs an output per height')
+        if np.any(np.diff(self.heights) <= 0):
+            raise ValueError('feedforward table heights must be increasing')
+
+    def __call__(self, height):
+        """
+        Get the hold output at a height (or array of heights). Past either
+        end of the table, the output at that end is used.
+        """
+        return np.interp(height, self.heights, self.outputs)
+
+    def to_text(self):
+        """Write the table in the form :func:`parse_text` reads."""
+        return ', '.join(
+            '{:g}: {:.4g}'.format(height, output)
+            for height, output in zip(self.heights, self.outputs)
+        )
+
+
+def parse_text(text):
+    """
+    Parse a table written as ``height: output, ...``.
+
+    Raises:
+        ValueError: if the text doesn't describe a table.
+    """
+    heights = []
+    outputs = []
+    for entry in text.split(','):
+        if not entry.strip():
+            continue
+
+        height, sep, output = entry.partition(':')
+        if not sep:
+            raise ValueError('malformed table entry: {!r}'.format(entry))
+
+        heights.append(float(height))
+        outputs.append(float(output))
+
+    return GravityFeedforward(heights, outputs)
+
+
+def from_preferences(key, default):
+    """
+    Load a table from a Preferences string (see :func:`parse_text`).
+
+    If the preference isn't set, or isn't a valid table, ``default`` is used
+    instead.
+    """
+    prefs = wpilib.Preferences.getInstance()
+    text = prefs.getString(key, '')
+
+    if not text:
+        return default
+
+    try:
+        return parse_text(text)
+    except ValueError:
+        print(
+            "[lift] Invalid feedforward table in preference '{}': {}".format(
+                key, sys.exc_info()[1]
+            ),
+            file=sys.stderr
+        )
+        return default
+
+
+class GravityCalibration(object):
+    """
+    Measures the lift's hold output at several heights.
+
+    Call :meth:`update` once every robot loop until it returns True; the
+    measured table is then in :attr:`table` (and the static friction at each
+    height in :attr:`friction`).
+
+    Args:
+        lift (lift.ManualControlLift): the lift, which must have found its
+            zero.
+        heights: the heights to measure at, in inches.
+        ramp_rate (float): how fast to ramp the output, per second.
+        margin (float): how far from the current hold estimate to start each
+            ramp, so it starts with the lift still (or moving the other way).
+        threshold (float): how far the lift has to move, in encoder units,
+            to count as moving.
+        settle_time (float): how long to wait at the start of each ramp for
+            the lift to stop moving from the move before it, in seconds.
+        timeout (float): how long to give each move or ramp, in seconds.
+
+    Attributes:
+        table (GravityFeedforward): the measured table, once finished.
+        friction (list): the static friction measured at each height, as a
+            motor output.
+    """
+
+    def __init__(
+        self, lift, heights=(6, 18, 30, 42, 54, 66), ramp_rate=0.05,
+        margin=0.05, threshold=5, settle_time=0.25, timeout=5
+    ):
+        self.lift = lift
+        self.heights = list(heights)
+        self.ramp_rate = ramp_rate
+        self.margin = margin
+        self.threshold = threshold
+        self.settle_time = settle_time
+        self.timeout = timeout
+
+        self.table = None
+        self.friction = []
+        self.outputs = []
+
+        self._index = 0
+        self._step = None
+        self._breakaway = {}
+        self._start_step('move', 'up')
+
+    @property
+    def finished(self):
+        """Whether every height has been measured."""
+        return self.table is not None
+
+    def _start_step(self, step, direction):
+        self._step = step
+        self._direction = direction
+        self._step_start = None
+
+    def update(self, now=None):
+        """
+        Run the calibration. Call this once every robot loop.
+
+        Returns:
+            True once every height has been measured.
+        """
+        if self.finished:
+            return True
+
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+
+        height = self.heights[self._index]
+        if self._step_start is None:
+            self._step_start = now
+            self._extreme = None
+        elapsed = now - self._step_start
+
+        if self._step == 'move':
+            self.lift.set_height(height)
+            self.lift.update()
+            if self.lift.at_target() or elapsed > self.timeout:
+                self._start_step('ramp', self._direction)
+            return False
+
+        # Ramping: up (more negative output) or down (more positive).
+        sign = -1 if self._direction == 'up' else 1
+        estimate = float(self.lift.hold_power(height))
+        output = estimate + sign * (self.ramp_rate * elapsed - self.margin)
+        self.lift.setLiftPower(output)
+
+        # Track how far the lift has moved against the ramp (it may sag a
+        # little before the output gets big enough), and wait for it to move
+        # ``threshold`` units with the ramp from there. The lift broke away
+        # at the output when it was last there, not once it has moved far
+        # enough to be sure. Encoder positions count down as the lift rises.
+        position = sign * self.lift.lift_main.getSelectedSensorPosition(0)
+        if (
+            elapsed < self.settle_time
+            or self._extreme is None
+            or position <= self._extreme
+        ):
+            self._extreme = position
+            self._extreme_output = output
+
+        if position - self._extreme < self.threshold and (
+            elapsed < self.timeout
+        ):
+            return False
+
+        self._breakaway[self._direction] = self._extreme_output
+        if self._direction == 'up':
+            self._start_step('move', 'down')
+            return False
+
+        up = self._breakaway['up']
+        down = self._breakaway['down']
+        self.outputs.append((up + down) / 2)
+        self.friction.append((down - up) / 2)
+
+        self._index += 1
+        if self._index < len(self.heights):
+            self._start_step('move', 'up')
+            return False
+
+        self.lift.setLiftPower(float(self.lift.hold_power()))
+        self.table = GravityFeedforward(self.heights, self.outputs)
+        return True
@@ -0,0 +1,149 @@
+"""
+Kinematics of the RD4B lift.
+
+The lift's height above its lowest position depends on the arm angle
+``theta`` (from horizontal) as::
+
+    height = 2 * arm_length * (sin(theta) - sin(bottom_angle))
+
+and the arm angle is read from an encoder (or potentiometer) as::
+
+    position = horizontal_position + theta * units_per_radian
+
+Rather than calling ``asin`` and ``sin`` for every conversion, a
+:class:`LiftKinematics` tabulates the height at a thousand or so arm angles
+between the bottom and top of the lift's travel once, when it is created, and
+converts between heights and encoder positions by linear interpolation in
+that table. The height is monotonic in the arm angle over the lift's travel,
+so the same table answers both directions, and every conversion accepts
+either a single number or a numpy array (of thousands of points, say, for a
+planner).
+
+The height-dependent mechanical advantage -- how many inches the lift rises
+per radian the arms turn, ``2 * arm_length * cos(theta)`` -- is tabulated
+the same way. It is largest with the arms horizontal and falls off towards
+either end of the lift's travel, where the same motor torque holds up more
+weight but moves the lift more slowly.
+"""
+import math
+
+import numpy as np
+
+
+class LiftKinematics(object):
+    """
+    Converts between lift heights and encoder positions.
+
+    Args:
+        arm_length (float): the length of one arm segment, in inches.
+        units_per_radian (float): encoder units per radian of arm rotation.
+            Negative if the encoder counts down as the lift rises.
+        horizontal_position (float): the encoder position with the arms
+            horizontal.
+        bottom_angle (float): the arm angle from horizontal with the lift all
+            the way down, in radians.
+        top_angle (float): the arm angle from horizontal with the lift all
+            the way up, in radians.
+        samples (int): the number of points in the lookup table.
+
+    Attributes:
+        angles, heights, positions, advantages: the lookup table, as numpy
+            arrays ordered from the bottom of the lift's travel to the top.
+        max_height (float): the height of the top of the lift's travel.
+
+    Raises:
+        ValueError: if the top angle isn't above the bottom angle, or they
+            aren't between straight down and straight up.
+    """
+
+    def __init__(
+        self, arm_length, units_per_radian, horizontal_position=0,
+        bottom_angle=math.radians(-40), top_angle=math.radians(40),
+        samples=1024
+    ):
+        if not -math.pi / 2 <= bottom_angle < top_angle <= math.pi / 2:
+            raise ValueError('invalid lift angles: {}, {}'.format(
+                bottom_angle, top_angle
+            ))
+
+        self.arm_length = arm_length
+        self.units_per_radian = units_per_radian
+        self.horizontal_position = horizontal_position
+        self.bottom_angle = bottom_angle
+        self.top_angle = top_angle
+
+        self.angles = np.linspace(bottom_angle, top_angle, samples)
+        self.heights = 2 * arm_length * (
+            np.sin(self.angles) - math.sin(bottom_angle)
+        )
+        self.positions = horizontal_position + self.angles * units_per_radian
+        self.advantages = 2 * arm_length * np.cos(self.angles)
+
+        self.max_height = float(self.heights[-1])
+
+        # np.interp needs increasing sample points.
+        if units_per_radian < 0:
+            self._ordered_positions = self.positions[::-1]
+            self._ordered_heights = self.heights[::-1]
+        else:
+            self._ordered_positions = self.positions
+            self._ordered_heights = self.heights
+
+    def height(self, position):
+        """
+        Get the lift height, in inches above its lowest position, at an
+        encoder position (or array of positions). Positions past either end
+        of the lift's travel are treated as being at that end.
+        """
+        return np.interp(
+            position, self._ordered_positions, self._ordered_heights
+        )
+
+    def position(self, height):
+        """
+        Get the encoder position for a lift height (or array of heights), in
+        inches above its lowest position. Heights out of the lift's reach are
+        treated as the nearest height it can reach.
+        """
+        return np.interp(height, self.heights, self.positions)
+
+    def angle(self, height):
+        """Get the arm angle from horizontal, in radians, at a height."""
+        return np.interp(height, self.heights, self.angles)
+
+    def mechanical_advantage(self, height):
+        """
+        Get how far the lift rises per radian the arms turn, in inches per
+        radian, at a height (or array of heights).
+        """
+        return np.interp(height, self.heights, self.advantages)
+
+
+def from_limits(
+    arm_length, units_per_radian, horizontal_position, bottom_position,
+    top_position=None
+):
+    """
+    Create a :class:`LiftKinematics` from the encoder positions at the ends
+    of the lift's travel (as stored in Preferences, say).
+
+    Args:
+        arm_length, units_per_radian, horizontal_position: as for
+            :class:`LiftKinematics`.
+        bottom_position (float): the encoder position with the lift all the
+            way down.
+        top_position (float): the encoder position with the lift all the way
+            up. If this isn't set (or isn't above the bottom), the arms can go
+            as far as straight up.
+    """
+    bottom_angle = (bottom_position - horizontal_position) / units_per_radian
+    top_angle = math.pi / 2
+    if top_position is not None:
+        angle = (top_position - horizontal_position) / units_per_radian
+        if angle > bottom_angle:
+            top_angle = angle
+
+    return LiftKinematics(
+        arm_length, units_per_radian, horizontal_position,
+        max(bottom_angle, -math.pi / 2), min(top_angle, math.pi / 2)
+    )
@@ -1,8 +1,45 @@
+import math
+
 import wpilib
 from ctre.talonsrx import TalonSRX
 
+import protection
+import settle
+from . import feedforward
+from . import kinematics
+from .motion_profile import TrapezoidalProfile
+from .rd4b_lift import RD4BLift
+
 
 class ManualControlLift:
+    """
+    The lift, driven either by percent output (see :meth:`setLiftPower`) or
+    to a height (see :meth:`set_height`).
+
+    Height control plans a trapezoidal motion profile from where the lift is
+    to the target height, and tracks it with feedforward (the output that
+    holds the lift up against gravity at that height -- see
+    :meth:`hold_power` -- plus static friction, velocity and acceleration
+    terms) and PID on the pulse width encoder. :meth:`update`
+    has to be called once every robot loop for height control to run. The
+    lift has to have found its zero (at the bottom limit switch) first.
+
+    Encoder positions count down as the lift rises, the same direction as
+    motor output, so profiles, feedforward and PID all work in native units.
+    """
+
+    #: Length of one arm segment, in inches.
+    arm_length = RD4BLift.ARM_LENGTH
+
+    # Defaults for the lift geometry Preferences (see load_kinematics), used
+    # until they have been measured on the robot: encoder units per radian of
+    # arm rotation (negative, since the encoder counts down as the lift
+    # rises), and the encoder positions with the arms horizontal and with
+    # the lift all the way up.
+    default_units_per_radian = -(512 * 3) / math.pi
+    default_horizontal_position = -512 * 3 * 40 / 180
+    default_upper_limit = -512 * 3 * 80 / 180
+
     def __init__(
         self,
         main_lift_id, follower_id,
@@ -43,6 +80,33 @@ class ManualControlLift:
         self.start_limit_switch = wpilib.DigitalInput(start_lim_channel)
 
         self.sustain =  -0.08
+        self.gravity_feedforward = feedforward.GravityFeedforward(
+            [0], [self.sustain]
+        )
+
+        self.kinematics = self.load_kinematics()
+
+        self.upper_limit = None
+        self.limits_enabled = False
+
+        # the motion profile being followed, if running to a height.
+        self.profile = None
+        self.profile_start = 0
+        self.last_update = None
+        self.integral = 0
+
+        # stall and overheating protection; the output last asked for, and
+        # the output actually applied.
+        self.protection = protection.MotorProtection(
+            stall_current=60, stall_velocity=2, stall_time=0.2, cooldown=1,
+            continuous_current=40, thermal_time_constant=30
+        )
+        self.requested_power = 0
+        self.applied_power = 0
+
+        # used to decide when the lift has reached its target height.
+        self.target_settle = settle.SettleDetector(10, window=3)
+        self.load_height_control_config()
 
     def load_config_values(self):
         prefs = wpilib.Preferences.getInstance()
@@ -51,7 +115,15 @@ class ManualControlLift:
 
         self.sustain = prefs.getFloat("Lift: Idle Sustain", -0.08)
 
+        # the hold output by height; if there isn't a calibrated table, hold
+        # with the sustain output everywhere.
+        self.gravity_feedforward = feedforward.from_preferences(
+            "Lift: Gravity Feedforward",
+            feedforward.GravityFeedforward([0], [self.sustain])
+        )
+
         self.upper_limit = prefs.getInt("Lift: Upper Limit", None)
+        self.kinematics = self.load_kinematics()
         self.limits_enabled = prefs.getBoolean("Lift: Limits Enabled", False)
 
         if self.limits_enabled:
@@ -68,6 +140,108 @@ class ManualControlLift:
         self.lift_main.setSensorPhase(phase)
         self.lift_follower.setSensorPhase(phase)
 
+        self.protection.load_config_values("Lift")
+        self.load_height_control_config()
+
+    @classmethod
+    def load_kinematics(cls):
+        """
+        Make the lift's height <-> encoder lookup tables (see
+        :func:`lift.kinematics.from_limits`) from the lift geometry measured
+        on the robot, as saved in Preferences:
+
+        - "Lift: Units Per Radian": encoder units per radian of arm rotation.
+        - "Lift: Horizontal Position": the encoder position with the arms
+          horizontal.
+        - "Lift: Upper Limit": the encoder position with the lift all the way
+          up (also its soft limit).
+
+        The encoder is zeroed at the bottom limit switch, so it reads 0 with
+        the lift all the way down. The simulated lift
+        (:class:`simulation.LiftModel`) is built from the same tables.
+        """
+        prefs = wpilib.Preferences.getInstance()
+
+        upper_limit = prefs.getInt("Lift: Upper Limit", None)
+        if upper_limit is None:
+            upper_limit = cls.default_upper_limit
+
+        return kinematics.from_limits(
+            cls.arm_length,
+            prefs.getFloat(
+                "Lift: Units Per Radian", cls.default_units_per_radian
+            ),
+            prefs.getFloat(
+                "Lift: Horizontal Position", cls.default_horizontal_position
+            ),
+            0, upper_limit
+        )
+
+    def load_height_control_config(self):
+        """
+        Load the height control settings from Preferences:
+
+        - "Lift: Max Velocity" and "Lift: Max Acceleration": limits for
+          motion profiles, in native units per second (squared).
+        - "Lift: kP", "Lift: kI", "Lift: kD": PID gains, per native unit of
+          position error.
+        - "Lift: kS", "Lift: kV", "Lift: kA": feedforward gains for static
+          friction (output), velocity (output per native unit per second)
+          and acceleration (output per native unit per second squared).
+        - "Lift: Target Tolerance" and "Lift: Target Settle Time": how close
+          to its target the lift has to stay (in native units), and for how
+          long (in seconds), to be at its target.
+        """
+        prefs = wpilib.Preferences.getInstance()
+
+        self.max_velocity = prefs.getFloat("Lift: Max Velocity", 400)
+        self.max_acceleration = prefs.getFloat("Lift: Max Acceleration", 1500)
+
+        self.kP = prefs.getFloat("Lift: kP", 0.004)
+        self.kI = prefs.getFloat("Lift: kI", 0)
+        self.kD = prefs.getFloat("Lift: kD", 0.0004)
+
+        self.kS = prefs.getFloat("Lift: kS", 0.03)
+        self.kV = prefs.getFloat("Lift: kV", 0.0017)
+        self.kA = prefs.getFloat("Lift: kA", 0.0002)
+
+        # (this is reloaded while the lift may be moving, so update the
+        # settle detector rather than replacing it.)
+        self.target_settle.tolerance = prefs.getFloat(
+            "Lift: Target Tolerance", 10
+        )
+        self.target_settle.dwell_time = prefs.getFloat(
+            "Lift: Target Settle Time", 0.1
+        )
+
+    def save_gravity_feedforward(self, table):
+        """
+        Start using a (newly calibrated) gravity feedforward table, and save
+        it to Preferences.
+        """
+        self.gravity_feedforward = table
+        wpilib.Preferences.getInstance().putString(
+            "Lift: Gravity Feedforward", table.to_text()
+        )
+
+    def hold_power(self, height=None):
+        """
+        Get the output that holds the lift still against gravity, from the
+        gravity feedforward table (see :mod:`lift.feedforward`).
+
+        Args:
+            height (float): the lift height, in inches; by default, the
+                current height.
+        """
+        if not self.lift_zero_found:
+            # the height isn't known yet.
+            return self.sustain
+
+        if height is None:
+            height = self.get_height()
+
+        return self.gravity_feedforward(height)
+
     def set_soft_limit_status(self, status):
         if self.upper_limit is not None:
             self.lift_main.configReverseSoftLimitEnable(status, 0)
@@ -100,21 +274,175 @@ class ManualControlLift:
             not self.start_limit_switch.get()
         )
 
+        wpilib.SmartDashboard.putBoolean(
+            "Lift Stalled", self.protection.stalled
+        )
+
+        wpilib.SmartDashboard.putNumber(
+            "Lift Thermal Load", self.protection.thermal_load
+        )
+
     def moveTimed(self, time, power):
         if not self.timer_started:
             self.timer_started = True
             self.lift_timer.reset()
             self.lift_timer.start()
         elif self.lift_timer.get() < time:
-            self.lift_main.set(TalonSRX.ControlMode.PercentOutput, power)
+            self._apply_power(power)
         else:
-            self.lift_main.set(TalonSRX.ControlMode.PercentOutput, 0)
+            self._apply_power(0)
 
     def setLiftPower(self, power):
-        if power > 0 and not self.bottom_limit_switch.get():
-            self.lift_main.set(TalonSRX.ControlMode.PercentOutput, 0)
+        """
+        Drive the lift at a percent output (negative is up). This stops any
+        height control.
+        """
+        self.profile = None
+        self._apply_power(power)
+
+    def _apply_power(self, power):
+        self.requested_power = power
+        self.applied_power = self._limit_power(power)
+        self.lift_main.set(
+            TalonSRX.ControlMode.PercentOutput, self.applied_power
+        )
+
+    def _limit_power(self, power):
+        limited = self.protection.limit(power)
+
+        # stalled going up (usually against the top hard stop): keep holding
+        # the lift up against gravity, rather than letting it drop.
+        protection = self.protection
+        if power < 0 and protection.stalled and protection.stall_direction < 0:
+            limited = max(power, min(limited, self.hold_power()))
+
+        if limited > 0 and not self.bottom_limit_switch.get():
+            return 0
+
+        return limited
+
+    def protect(self):
+        """
+        Sample the lift motor current and velocity, and limit the output if
+        the lift has stalled or the motors are overheating (see
+        :mod:`protection`). Call this once every robot loop.
+        """
+        self.protection.update(
+            self.lift_main.getOutputCurrent(),
+            self.lift_main.getSelectedSensorVelocity(0),
+            self.requested_power
+        )
+
+        # re-apply the last output if the limit on it has changed.
+        if self._limit_power(self.requested_power) != self.applied_power:
+            self._apply_power(self.requested_power)
+
+    def height_to_position(self, inches):
+        """Convert a lift height, in inches, to an encoder position."""
+        return self.kinematics.position(inches)
+
+    def position_to_height(self, position):
+        """Convert an encoder position to a lift height, in inches."""
+        return self.kinematics.height(position)
+
+    def get_height(self):
+        """Get the height of the lift above its lowest position, in inches."""
+        return self.position_to_height(
+            self.lift_main.getSelectedSensorPosition(0)
+        )
+
+    def set_height(self, inches):
+        """
+        Run the lift to a height, in inches above its lowest position.
+
+        Calling this again with the same height doesn't restart the move, so
+        it can be called every robot loop.
+        """
+        self.set_position(self.height_to_position(inches))
+
+    def set_position(self, position):
+        """
+        Run the lift to an encoder position, planning a motion profile from
+        where it is now (or from where it should be, if it's already
+        following a profile).
+        """
+        # Don't go past the bottom or the upper soft limit.
+        position = min(position, 0)
+        if self.limits_enabled and self.upper_limit is not None:
+            position = max(position, self.upper_limit)
+
+        if self.profile is not None and position == self.profile.goal:
+            return
+
+        now = wpilib.Timer.getFPGATimestamp()
+        if self.profile is not None:
+            start, velocity, _ = self.profile.sample(now - self.profile_start)
         else:
-            self.lift_main.set(TalonSRX.ControlMode.PercentOutput, power)
+            start = self.lift_main.getSelectedSensorPosition(0)
+            velocity = self.lift_main.getSelectedSensorVelocity(0) * 10
+            self.integral = 0
+            self.last_update = None
+
+        self.profile = TrapezoidalProfile(
+            start, position, self.max_velocity, self.max_acceleration,
+            velocity
+        )
+        self.profile_start = now
+        self.target_settle.reset()
+
+    def at_target(self):
+        """
+        Check whether the lift has finished running to its target height:
+        the motion profile is over, and the lift has settled at the end of
+        it.
+        """
+        if self.profile is None or self.last_update is None:
+            return False
+
+        return (
+            self.profile.finished(self.last_update - self.profile_start)
+            and self.target_settle.settled
+        )
+
+    def update(self):
+        """
+        Run height control, if the lift is running to a height. Call this
+        once every robot loop.
+        """
+        if self.profile is None:
+            return
+
+        if not self.lift_zero_found:
+            # the height isn't known yet, so just hold still.
+            self._apply_power(self.sustain)
+            return
+
+        now = wpilib.Timer.getFPGATimestamp()
+        dt = now - self.last_update if self.last_update is not None else 0
+        self.last_update = now
+
+        target, velocity, acceleration = self.profile.sample(
+            now - self.profile_start
+        )
+
+        position = self.lift_main.getSelectedSensorPosition(0)
+        measured_velocity = self.lift_main.getSelectedSensorVelocity(0) * 10
+
+        error = target - position
+        self.integral += error * dt
+
+        power = (
+            self.hold_power(self.position_to_height(target))
+            + math.copysign(self.kS, velocity) * (velocity != 0)
+            + self.kV * velocity
+            + self.kA * acceleration
+            + self.kP * error
+            + self.kI * self.integral
+            + self.kD * (velocity - measured_velocity)
+        )
+
+        self._apply_power(max(-1, min(1, power)))
+        self.target_settle.update(self.profile.goal - position, now)
 
     def checkLimitSwitch(self):
         self.set_soft_limit_status(self.lift_zero_found)
@@ -130,6 +458,6 @@ class ManualControlLift:
 
     def driveToStartingPosition(self):
         if self.start_limit_switch.get():
-            self.lift_main.set(TalonSRX.ControlMode.PercentOutput, -0.25)
+            self._apply_power(-0.25)
         else:
-            self.lift_main.set(TalonSRX.ControlMode.PercentOutput, 0)
+            self._apply_power(0)
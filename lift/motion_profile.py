@@ -0,0 +1,140 @@
+"""
+Trapezoidal motion profiles.
+
+A :class:`TrapezoidalProfile` plans a move from one position to another in
+the least time possible without going over a maximum velocity or
+acceleration: it accelerates as hard as allowed, cruises at the maximum
+velocity (if the move is long enough to reach it), and decelerates as hard as
+allowed to stop exactly at the goal. A closed-loop controller tracks the
+profile's position, and uses its velocity and acceleration as feedforward,
+instead of being handed the goal as a step and overshooting it.
+
+Profiles can start with the mechanism already moving (when the goal changes
+mid-move, say); the velocity carries over smoothly. If the mechanism is
+moving too fast towards the goal to stop in time at the maximum
+acceleration, the profile decelerates harder instead of overshooting.
+
+Positions, velocities and accelerations can be in any units, as long as they
+are consistent (native units, native units per second and native units per
+second squared, for example).
+"""
+import math
+
+
+class TrapezoidalProfile(object):
+    """
+    A minimum-time move from ``start`` to ``goal``.
+
+    Args:
+        start (float): the starting position.
+        goal (float): the position to stop at.
+        max_velocity (float): the largest allowed speed.
+        max_acceleration (float): the largest allowed acceleration.
+        start_velocity (float): the velocity at the start of the profile;
+            speeds over ``max_velocity`` are limited to it.
+
+    Attributes:
+        start, goal, start_velocity (float): as given.
+        duration (float): how long the move takes, in seconds.
+
+    Raises:
+        ValueError: if ``max_velocity`` or ``max_acceleration`` isn't
+            positive.
+    """
+
+    def __init__(
+        self, start, goal, max_velocity, max_acceleration, start_velocity=0
+    ):
+        if max_velocity <= 0 or max_acceleration <= 0:
+            raise ValueError(
+                'the maximum velocity and acceleration must be positive'
+            )
+
+        self.start = start
+        self.goal = goal
+
+        # Plan in a frame where the move is in the positive direction.
+        if goal != start:
+            self._direction = math.copysign(1, goal - start)
+        else:
+            self._direction = -math.copysign(1, start_velocity or 1)
+
+        distance = abs(goal - start)
+        v0 = max(-max_velocity, min(
+            max_velocity, start_velocity * self._direction
+        ))
+        self.start_velocity = v0 * self._direction
+
+        stopping_distance = v0 * abs(v0) / (2 * max_acceleration)
+        if stopping_distance > distance:
+            # Moving too fast to stop in time: decelerate as hard as needed,
+            # starting now.
+            accel = 0
+            decel = v0 * v0 / (2 * distance) if distance > 0 else 0
+            cruise = v0
+            t1 = 0
+            t2 = 0
+            t3 = v0 / decel if decel > 0 else 0
+        else:
+            accel = decel = max_acceleration
+
+            # Peak velocity if the move never cruises (a triangle profile).
+            cruise = min(max_velocity, math.sqrt(
+                max_acceleration * distance + v0 * v0 / 2
+            ))
+
+            t1 = (cruise - v0) / accel
+            t3 = cruise / decel
+
+            d1 = (cruise * cruise - v0 * v0) / (2 * accel)
+            d3 = cruise * cruise / (2 * decel)
+            t2 = max(distance - d1 - d3, 0) / cruise if cruise > 0 else 0
+
+        self._v0 = v0
+        self._accel = accel
+        self._decel = decel
+        self._cruise = cruise
+        self._t1 = t1
+        self._t2 = t1 + t2
+        self._d1 = v0 * t1 + accel * t1 * t1 / 2
+        self._d2 = self._d1 + cruise * t2
+
+        self.duration = t1 + t2 + t3
+
+    def finished(self, t):
+        """Whether the move is over ``t`` seconds after it started."""
+        return t >= self.duration
+
+    def sample(self, t):
+        """
+        Get the planned state of the mechanism partway through the move.
+
+        Args:
+            t (float): the time since the start of the profile, in seconds.
+
+        Returns:
+            A tuple ``(position, velocity, acceleration)``. Before the start
+            the profile is at its starting position, and after the end it is
+            stopped at the goal.
+        """
+        if t <= 0:
+            return self.start, self.start_velocity, 0
+        elif t >= self.duration:
+            return self.goal, 0, 0
+
+        if t < self._t1:
+            distance = self._v0 * t + self._accel * t * t / 2
+            velocity = self._v0 + self._accel * t
+            acceleration = self._accel
+        elif t < self._t2:
+            distance = self._d1 + self._cruise * (t - self._t1)
+            velocity = self._cruise
+            acceleration = 0
+        else:
+            dt = t - self._t2
+            distance = self._d2 + self._cruise * dt - self._decel * dt * dt / 2
+            velocity = self._cruise - self._decel * dt
+            acceleration = -self._decel
+
+        d = self._direction
+        return self.start + distance * d, velocity * d, acceleration * d
@@ -15,6 +15,9 @@ from ctre.talonsrx import TalonSRX
 import wpilib
 import math
 
+import settle
+from . import kinematics
+
 
 class RD4BLift:
     """
@@ -30,6 +33,9 @@ class RD4BLift:
     #: was written a segment is 30 inches long.
     ARM_LENGTH = 30
 
+    #: Potentiometer units per radian of arm rotation.
+    UNITS_PER_RADIAN = 512 / math.pi
+
     def __init__(self, left_id, right_id):
         """
         Create a new instance of the RD4B lift.
@@ -53,6 +59,9 @@ class RD4BLift:
 
         self.right_motor.set(TalonSRX.ControlMode.Follower, left_id)
 
+        # the position the lift is running to, if any.
+        self.setpoint = None
+
         # finally, load the configuration values.
         self.load_config_values()
 
@@ -67,6 +76,15 @@ class RD4BLift:
         - "lift potentiometer base angle"
         - "lift limit up"
 
+        and these are optional:
+
+        - "lift settle tolerance": how close to its setpoint the lift has to
+          be to be done moving, in native units.
+        - "lift settle time": how long the lift has to stay there, in
+          seconds.
+        - "lift settle timeout": how long to wait for the lift to get there,
+          in seconds.
+
         This function also precalculates values that are used throughout the
         code and sets soft limits for the motor based on encoder values.
         """
@@ -81,41 +99,53 @@ class RD4BLift:
         # get the encoder value when the RD4B is in the fully down position.
         self.initial_angle = preferences.getFloat("lift potentiometer base angle", 0)  # noqa: E501
 
-        # pre-convert the initial angle to radians and take the sin of the
-        # angle.
-        self.INITIAL_ANGLE_RADIANS_SIN = math.sin(
-            (self.initial_angle - self.HORIZONTAL_ANGLE) / 512 * math.pi)
-
         # get the upper limit of the encoder, or the encoder value when the
         # RD4B is fully extended upward.
         self.LIMIT_UP = preferences.getFloat("lift limit up", 0)
 
+        # precompute the height <-> encoder lookup tables for this range of
+        # travel.
+        self.kinematics = kinematics.from_limits(
+            self.ARM_LENGTH, self.UNITS_PER_RADIAN, self.HORIZONTAL_ANGLE,
+            self.initial_angle, self.LIMIT_UP
+        )
+
         # set the soft limits to LIMIT_UP and the initial angle. the motors
         # should not go outside of this range.
-        self.left_motor.configForwardSoftLimitThreshold(self.LIMIT_UP, 0)
-        self.left_motor.configReverseSoftLimitThreshold(self.initial_angle, 0)
+        self.left_motor.configForwardSoftLimitThreshold(int(self.LIMIT_UP), 0)
+        self.left_motor.configReverseSoftLimitThreshold(
+            int(self.initial_angle), 0
+        )
+
+        # used to decide when the lift is done moving.
+        self.settle = settle.SettleDetector(
+            preferences.getFloat("lift settle tolerance", 10),
+            dwell_time=preferences.getFloat("lift settle time", 0.1),
+            timeout=preferences.getFloat("lift settle timeout", 3),
+            window=3
+        )
 
     def fully_extend(self):
         """
         Fully extend the RD4B upward.
         This function runs the motor to the LIMIT_UP position.
         """
-        self.left_motor.set(TalonSRX.ControlMode.Position, self.LIMIT_UP)
+        self._run_to(self.LIMIT_UP)
 
     def fully_retract(self):
         """
         Fully retract the RD4B to the lowest position.
         This function runs the motor to the initial_angle position.
         """
-        self.left_motor.set(TalonSRX.ControlMode.Position, self.initial_angle)
+        self._run_to(self.initial_angle)
 
     def set_height(self, inches):
         """
         Set the height for the RD4B lift.
 
-        Given a height to move to in inches, this function will calculate the
-        angle the motor needs to run to and apply it. The angle is calculated
-        by this equation:
+        Given a height to move to in inches, this function will look up the
+        angle the motor needs to run to (see :mod:`lift.kinematics`) and apply
+        it. The angle is given by this equation:
 
         .. math::
 
@@ -125,26 +155,27 @@ class RD4BLift:
         Args:
             inches: the height in inches to move the RD4B to.
         """
-        # calculate the final angle as per the equation given above.
-        final_angle_radians = math.asin(
-            inches / (2 * self.ARM_LENGTH) + self.INITIAL_ANGLE_RADIANS_SIN)
-
-        # convert this final angle from radians to native units.
-        native_units = (
-            (final_angle_radians * 512 / math.pi)
-            + self.HORIZONTAL_ANGLE
-        )
+        native_units = float(self.kinematics.position(inches))
 
         # set the left motor to run to this position (the right motor will
         # follow it)
-        self.left_motor.set(TalonSRX.ControlMode.Position, native_units)
+        self._run_to(native_units)
+
+    def _run_to(self, position):
+        # run the motor to a position, and start waiting for it to settle
+        # there if that's a new setpoint.
+        self.left_motor.set(TalonSRX.ControlMode.Position, position)
+        if position != self.setpoint:
+            self.setpoint = position
+            self.settle.reset()
 
     def getHeight(self):
         """
         Get the height of the RD4B.
 
         This function will get the angle of the RD4B from the encoder and
-        convert this to a height given this equation:
+        look up the height (see :mod:`lift.kinematics`) given by this
+        equation:
 
         .. math::
 
@@ -154,32 +185,25 @@ class RD4BLift:
             The height of the RD4B at the time this function is called.
         """
 
-        # get the final angle from the encoder, and convert to radians.
-        final_angle_radians = (
-            (self.left_motor.getSelectedSensorPosition(0) - self.HORIZONTAL_ANGLE)  # noqa: E501
-            * 512 * math.pi
-        )
-
-        # calculate the height of the RD4B using the final angle and based on
-        # the given equation.
-        height = 2 * self.ARM_LENGTH * (
-            math.sin(final_angle_radians) - self.INITIAL_ANGLE_RADIANS_SIN
-        )
-
-        return height
+        return float(self.kinematics.height(
+            self.left_motor.getSelectedSensorPosition(0)
+        ))
 
     def isMovementFinished(self):
         """
         Check if the RD4B is in motion.
 
         This function gets the closed loop error, which will be very small if
-        the motor is not currently in motion.
+        the motor is not currently in motion, and checks that it has stayed
+        small for a little while (see :class:`settle.SettleDetector`). It
+        should be called once every robot loop while waiting for the lift.
 
         Returns:
-            True if the RD4B is not in motion
+            True if the RD4B is not in motion (or has taken too long to reach
+            its setpoint)
             False if the RD4B is currently still in motion.
         """
-        return self.left_motor.getClosedLoopError(0) < 10
+        return self.settle.update(self.left_motor.getClosedLoopError(0))
 
     def stop(self):
         """
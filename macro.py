@@ -0,0 +1,135 @@
+"""
+Records and plays back driver control macros.
+
+A macro is a time-stamped stream of the shaped control outputs that
+:class:`teleop.Teleop` sends to the drivetrain, lift and claw. Samples are
+kept in a compact ``float32`` NumPy array with one row per loop iteration:
+
+    ``[t, forward, strafe, rotate_cw, max_wheel_speed, lift, claw]``
+
+where ``t`` is the time in seconds since recording started.
+
+Playback looks up the outputs for the *elapsed time* since playback started
+and linearly interpolates between the two neighbouring samples, so jitter in
+the loop period (during either recording or playback) does not change how the
+sequence plays out.
+"""
+import numpy as np
+
+#: Names of the output channels stored in a macro (after the time column).
+CHANNELS = (
+    'forward', 'strafe', 'rotate_cw', 'max_wheel_speed', 'lift', 'claw'
+)
+
+
+class MacroRecorder:
+    """
+    Accumulates control output samples into a preallocated array.
+
+    Parameters:
+        capacity: initial number of samples to allocate room for. The buffer
+            is doubled in size if a recording runs past it.
+    """
+
+    def __init__(self, capacity=1500):
+        self._buffer = np.zeros((capacity, len(CHANNELS) + 1), np.float32)
+        self._n_samples = 0
+        self._start_time = 0
+        self.recording = False
+
+    def start(self, now):
+        """
+        Discard any samples in the buffer and start a new recording.
+
+        Args:
+            now (number): the current timestamp, in seconds.
+        """
+        self._n_samples = 0
+        self._start_time = now
+        self.recording = True
+
+    def record(self, now, outputs):
+        """
+        Append one sample to the current recording.
+
+        Args:
+            now (number): the current timestamp, in seconds.
+            outputs: a sequence of values, one for each of :data:`CHANNELS`.
+        """
+        if not self.recording:
+            return
+
+        if self._n_samples >= self._buffer.shape[0]:
+            self._buffer = np.concatenate(
+                (self._buffer, np.zeros_like(self._buffer))
+            )
+
+        row = self._buffer[self._n_samples]
+        row[0] = now - self._start_time
+        row[1:] = outputs
+
+        self._n_samples += 1
+
+    def stop(self):
+        """
+        Stop recording.
+
+        Returns:
+            A copy of the recorded samples as an ``(n, 7)`` ``float32`` array,
+            or ``None`` if too few samples were recorded to be played back.
+        """
+        self.recording = False
+
+        if self._n_samples < 2:
+            return None
+
+        return self._buffer[:self._n_samples].copy()
+
+
+class MacroPlayer:
+    """
+    Plays back samples recorded by a :class:`MacroRecorder`.
+
+    Parameters:
+        samples: an array of samples, as returned by
+            :meth:`MacroRecorder.stop`.
+        now (number): the timestamp at which playback starts, in seconds.
+    """
+
+    def __init__(self, samples, now):
+        self.samples = samples
+        self._times = samples[:, 0].astype(np.float64)
+        self._start_time = now
+
+    @property
+    def duration(self):
+        """The length of the macro, in seconds."""
+        return self._times[-1]
+
+    def sample(self, now):
+        """
+        Get the control outputs for the current point in the macro.
+
+        Args:
+            now (number): the current timestamp, in seconds.
+
+        Returns:
+            An array of values, one for each of :data:`CHANNELS`, or ``None``
+            if playback has finished.
+        """
+        t = now - self._start_time
+        if t >= self._times[-1]:
+            return None
+
+        idx = int(np.searchsorted(self._times, t, side='right'))
+        if idx <= 0:
+            return self.samples[0, 1:].astype(np.float64)
+
+        t0 = self._times[idx-1]
+        t1 = self._times[idx]
+        frac = (t - t0) / (t1 - t0) if t1 > t0 else 0
+
+        prev_outputs = self.samples[idx-1, 1:].astype(np.float64)
+        next_outputs = self.samples[idx, 1:].astype(np.float64)
+
+        return prev_outputs + (frac * (next_outputs - prev_outputs))
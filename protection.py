@@ -0,0 +1,201 @@
+"""
+Stall and overheating protection for motors.
+
+A :class:`MotorProtection` watches one motor's output current (and velocity,
+if it has a sensor), sampled once every robot loop, and limits the output the
+motor is allowed to run at:
+
+- **Stalls**: if the motor draws more than ``stall_current`` while barely
+  moving for ``stall_time`` seconds (a jammed mechanism, or one pinned
+  against a hard stop), output in the direction it stalled in is limited to
+  ``stall_output`` for ``cooldown`` seconds. Output in the other direction is
+  still allowed, so the mechanism can be backed off whatever it's stuck on.
+  If it's still stalled after the cooldown, it trips again.
+- **Overheating**: the motor's heating is estimated by filtering the square
+  of its current (an I²t model) with the motor's thermal time constant; this
+  takes the same constant time per sample however long the history. The
+  thermal load is the ratio of that estimate to the square of the current
+  the motor can carry continuously, so it settles at 1 for a motor running
+  at its continuous current rating. Above ``derate_start``, the output is
+  limited linearly, down to nothing at a thermal load of 1.
+
+Outputs are limited by magnitude, not scaled, so small outputs (a sustain
+output holding up the lift, say) are unaffected until the limit gets down to
+them.
+
+Thresholds are loaded from Preferences, under the mechanism's name (see
+:meth:`MotorProtection.load_config_values`).
+"""
+import math
+
+import wpilib
+
+
+class MotorProtection(object):
+    """
+    Limits a motor's output when it stalls or overheats.
+
+    Args:
+        stall_current (float): the current above which the motor may be
+            stalled, in amps.
+        stall_velocity (float): the speed below which the motor may be
+            stalled, in native units per 100ms, or None if the motor has no
+            velocity sensor (then only the current is checked).
+        stall_time (float): how long the motor has to look stalled before the
+            output is limited, in seconds.
+        cooldown (float): how long to limit the output after a stall, in
+            seconds.
+        stall_output (float): the largest output allowed in the stalled
+            direction while cooling down (0 cuts the output).
+        continuous_current (float): the current the motor can carry
+            indefinitely, in amps.
+        thermal_time_constant (float): how quickly the motor heats up and
+            cools down, in seconds.
+        derate_start (float): the thermal load above which the output is
+            limited.
+
+    Attributes:
+        stalled (bool): whether the output is being limited after a stall.
+        stall_direction (int): the sign of the output the motor stalled
+            with.
+        heat (float): the filtered squared current, in amps squared.
+        max_output (float): the largest output currently allowed in the
+            stalled direction (or either direction, if not stalled).
+    """
+
+    def __init__(
+        self, stall_current=60, stall_velocity=None, stall_time=0.2,
+        cooldown=1, stall_output=0, continuous_current=40,
+        thermal_time_constant=30, derate_start=0.8
+    ):
+        self.stall_current = stall_current
+        self.stall_velocity = stall_velocity
+        self.stall_time = stall_time
+        self.cooldown = cooldown
+        self.stall_output = stall_output
+        self.continuous_current = continuous_current
+        self.thermal_time_constant = thermal_time_constant
+        self.derate_start = derate_start
+
+        self.heat = 0
+        self.stalled = False
+        self.stall_direction = 0
+        self.max_output = 1
+
+        self._thermal_limit = 1
+        self._stalled_since = None
+        self._stalled_until = None
+        self._last_time = None
+
+    def load_config_values(self, name):
+        """
+        Load thresholds from Preferences, keeping the values given to the
+        constructor as defaults:
+
+        - "<name>: Stall Current", "<name>: Stall Velocity" (if the motor
+          has a velocity sensor), "<name>: Stall Time", "<name>: Stall
+          Cooldown" and "<name>: Stall Output"
+        - "<name>: Continuous Current", "<name>: Thermal Time Constant" and
+          "<name>: Derate Start"
+
+        This can be called while the motor is running; it keeps the thermal
+        estimate and any stall in progress.
+        """
+        prefs = wpilib.Preferences.getInstance()
+
+        def load(key, value):
+            return prefs.getFloat('{}: {}'.format(name, key), value)
+
+        self.stall_current = load('Stall Current', self.stall_current)
+        if self.stall_velocity is not None:
+            self.stall_velocity = load('Stall Velocity', self.stall_velocity)
+        self.stall_time = load('Stall Time', self.stall_time)
+        self.cooldown = load('Stall Cooldown', self.cooldown)
+        self.stall_output = load('Stall Output', self.stall_output)
+
+        self.continuous_current = load(
+            'Continuous Current', self.continuous_current
+        )
+        self.thermal_time_constant = load(
+            'Thermal Time Constant', self.thermal_time_constant
+        )
+        self.derate_start = load('Derate Start', self.derate_start)
+
+    @property
+    def thermal_load(self):
+        """
+        The estimated heating, as a fraction of what the motor can take
+        continuously.
+        """
+        return self.heat / (self.continuous_current ** 2)
+
+    def update(self, current, velocity=None, output=0, now=None):
+        """
+        Add a sample. Call this once every robot loop.
+
+        Args:
+            current (float): the motor's output current, in amps.
+            velocity (float): the motor's velocity, in native units per
+                100ms, if it has a sensor.
+            output (float): the output the motor was asked for.
+            now (float): the current time, in seconds. Defaults to the FPGA
+                timestamp.
+
+        Returns:
+            True if the output is being limited.
+        """
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+
+        dt = now - self._last_time if self._last_time is not None else 0
+        self._last_time = now
+
+        # I²t estimate: a first-order filter of the squared current.
+        if dt > 0:
+            alpha = 1 - math.exp(-dt / self.thermal_time_constant)
+            self.heat += (current * current - self.heat) * alpha
+
+        load = self.thermal_load
+        if load <= self.derate_start:
+            self._thermal_limit = 1
+        elif load >= 1:
+            self._thermal_limit = 0
+        else:
+            self._thermal_limit = (1 - load) / (1 - self.derate_start)
+
+        # Stall detection.
+        looks_stalled = (
+            output != 0
+            and abs(current) >= self.stall_current
+            and (
+                self.stall_velocity is None or velocity is None
+                or abs(velocity) <= self.stall_velocity
+            )
+        )
+
+        if self.stalled and now >= self._stalled_until:
+            self.stalled = False
+            self._stalled_since = None
+
+        if not looks_stalled:
+            self._stalled_since = None
+        elif self._stalled_since is None:
+            self._stalled_since = now
+        elif not self.stalled and now - self._stalled_since >= self.stall_time:
+            self.stalled = True
+            self.stall_direction = int(math.copysign(1, output))
+            self._stalled_until = now + self.cooldown
+
+        self.max_output = self._thermal_limit
+        if self.stalled:
+            self.max_output = min(self.max_output, self.stall_output)
+
+        return self.stalled or self._thermal_limit < 1
+
+    def limit(self, output):
+        """Limit an output to what the motor is currently allowed."""
+        limit = self._thermal_limit
+        if self.stalled and output * self.stall_direction > 0:
+            limit = min(limit, self.stall_output)
+
+        return max(-limit, min(limit, output))
@@ -2,10 +2,13 @@ import wpilib
 import constants
 import swerve
 import lift
+from lift import feedforward
 import winch
 import sys
+import can_monitor
 from teleop import Teleop
 from autonomous.baseline_simple import Autonomous
+from autonomous.game_data import GameData
 from sensors.imu import IMU
 
 
@@ -37,6 +40,16 @@ class Robot(wpilib.IterativeRobot):
     def robotInit(self):
         constants.load_control_config()
 
+        # Wrapping every Talon call slows down the whole robot loop, so the
+        # monitor is only installed on request. This needs to be done before
+        # any Talons are created.
+        self.can_monitor = None
+        if wpilib.Preferences.getInstance().getBoolean('CAN Monitor', False):
+            self.can_monitor = can_monitor.CANMonitor(
+                can_monitor.device_names()
+            )
+            self.can_monitor.install()
+
         wpilib.CameraServer.launch('driver_vision.py:main')
 
         self.autoPositionSelect = wpilib.SendableChooser()
@@ -66,6 +79,7 @@ class Robot(wpilib.IterativeRobot):
         self.winch = winch.Winch(
             constants.winch_id
         )
+        self.climb = winch.ClimbController(self.winch, self.lift)
 
         self.throttle = wpilib.Joystick(1)
 
@@ -76,16 +90,40 @@ class Robot(wpilib.IterativeRobot):
 
         self.imu = IMU(wpilib.SPI.Port.kMXP)
 
+        self.game_data = GameData()
+
         self.sd_update_timer = wpilib.Timer()
         self.sd_update_timer.reset()
         self.sd_update_timer.start()
 
+        self.prepared_auto_position = None
+
+    def robotPeriodic(self):
+        try:
+            self.lift.protect()
+            self.claw.protect()
+            self.winch.protect()
+        except:  # noqa: E772
+            log_exception('robot', 'when checking motor protection')
+
+        if self.can_monitor is not None:
+            try:
+                self.can_monitor.end_loop()
+
+                if self.can_monitor.loops % 50 == 0:
+                    self.can_monitor.update_smart_dashboard()
+            except:  # noqa: E772
+                log_exception('robot', 'when updating CAN monitor')
+
     def disabledInit(self):
         pass
 
     def disabledPeriodic(self):
         try:
             self.lift.load_config_values()
+            self.claw.load_config_values()
+            self.winch.load_config_values()
+            self.climb.load_config_values()
             self.drivetrain.load_config_values()
         except:  # noqa: E772
             log_exception('disabled', 'when loading config')
@@ -94,7 +132,9 @@ class Robot(wpilib.IterativeRobot):
             self.drivetrain.update_smart_dashboard()
             self.imu.update_smart_dashboard()
             self.lift.update_smart_dashboard()
+            self.claw.update_smart_dashboard()
             self.winch.update_smart_dashboard()
+            self.climb.update_smart_dashboard()
 
             wpilib.SmartDashboard.putNumber(
                 "Throttle Pos", self.throttle.getRawAxis(constants.liftAxis)
@@ -108,12 +148,38 @@ class Robot(wpilib.IterativeRobot):
         except:  # noqa: E772
             log_exception('disabled', 'when checking lift limit switch')
 
+        try:
+            self.game_data.poll()
+        except:  # noqa: E772
+            log_exception('disabled', 'when polling game data')
+
+        try:
+            self.prepare_autonomous()
+        except:  # noqa: E772
+            log_exception('disabled', 'when preparing autonomous')
+
         self.drivetrain.update_smart_dashboard()
 
+    def prepare_autonomous(self):
+        # Do any slow autonomous setup (such as loading trajectories) while
+        # disabled, once we know where we're starting, so that
+        # autonomousInit doesn't eat into the match.
+        position = self.autoPositionSelect.getSelected()
+        if position == self.prepared_auto_position:
+            return
+
+        if hasattr(Autonomous, 'prepare'):
+            Autonomous.prepare(position)
+
+        self.prepared_auto_position = position
+
     def autonomousInit(self):
         try:
             self.drivetrain.load_config_values()
             self.lift.load_config_values()
+            self.claw.load_config_values()
+            self.winch.load_config_values()
+            self.climb.load_config_values()
         except:  # noqa: E772
             log_exception('auto-init', 'when loading config')
 
@@ -124,6 +190,13 @@ class Robot(wpilib.IterativeRobot):
             self.autoPos = None
             log_exception('auto-init', 'when getting robot start position')
 
+        # Autonomous doesn't wait for the game data; if it isn't here yet,
+        # it's handed over from autonomousPeriodic when it arrives.
+        try:
+            self.game_data.poll()
+        except:  # noqa: E772
+            log_exception('auto-init', 'when polling game data')
+
         try:
             if self.autoPos is not None and self.autoPos != 'None':
                 self.auto = Autonomous(self, self.autoPos)
@@ -139,13 +212,21 @@ class Robot(wpilib.IterativeRobot):
             log_exception('auto-init', 'when checking lift limit switch')
 
     def autonomousPeriodic(self):
+        try:
+            if not self.game_data.available:
+                self.game_data.poll()
+        except:  # noqa: E772
+            log_exception('auto', 'when polling game data')
+
         try:
             if self.sd_update_timer.hasPeriodPassed(0.5):
                 self.auto.update_smart_dashboard()
                 self.imu.update_smart_dashboard()
                 self.drivetrain.update_smart_dashboard()
                 self.lift.update_smart_dashboard()
+                self.claw.update_smart_dashboard()
                 self.winch.update_smart_dashboard()
+                self.climb.update_smart_dashboard()
         except:  # noqa: E772
             log_exception('auto', 'when updating SmartDashboard')
 
@@ -160,12 +241,63 @@ class Robot(wpilib.IterativeRobot):
             self.winch.stop()
             log_exception('auto', 'in auto :periodic()')
 
+        try:
+            self.lift.update()
+        except:  # noqa: E772
+            self.lift.setLiftPower(0)
+            log_exception('auto', 'in lift height control')
+
+        try:
+            self.claw.update()
+        except:  # noqa: E772
+            self.claw.set_power(0)
+            log_exception('auto', 'in claw control')
+
         try:
             self.lift.checkLimitSwitch()
             pass
         except:  # noqa: E772
             log_exception('auto', 'when checking lift limit switch')
 
+    def testInit(self):
+        # Test mode calibrates the lift's gravity feedforward.
+        self.lift_calibration = None
+        try:
+            self.lift.load_config_values()
+            self.claw.load_config_values()
+            self.winch.load_config_values()
+            self.climb.load_config_values()
+        except:  # noqa: E772
+            log_exception('test-init', 'when loading config')
+
+    def testPeriodic(self):
+        try:
+            self.lift.checkLimitSwitch()
+        except:  # noqa: E772
+            log_exception('test', 'when checking lift limit switch')
+
+        try:
+            if not self.lift.lift_zero_found:
+                # lower the lift onto the limit switch to find its zero.
+                self.lift.setLiftPower(0.2)
+                return
+
+            if self.lift_calibration is None:
+                log('test', 'Calibrating lift gravity feedforward...')
+                self.lift_calibration = feedforward.GravityCalibration(
+                    self.lift
+                )
+
+            calibration = self.lift_calibration
+            if not calibration.finished and calibration.update():
+                self.lift.save_gravity_feedforward(calibration.table)
+                log('test', 'Lift gravity feedforward: {}'.format(
+                    calibration.table.to_text()
+                ))
+        except:  # noqa: E772
+            log_exception('test', 'when calibrating lift')
+            self.lift.setLiftPower(0)
+
     def teleopInit(self):
         try:
             self.teleop = Teleop(self)
@@ -175,6 +307,9 @@ class Robot(wpilib.IterativeRobot):
         try:
             self.drivetrain.load_config_values()
             self.lift.load_config_values()
+            self.claw.load_config_values()
+            self.winch.load_config_values()
+            self.climb.load_config_values()
             constants.load_control_config()
         except:  # noqa: E772
             log_exception('teleop-init', 'when loading config')
@@ -186,6 +321,12 @@ class Robot(wpilib.IterativeRobot):
             log_exception('teleop-init', 'when checking lift limit switch')
 
     def teleopPeriodic(self):
+        try:
+            self.teleop.play_macro()
+        except:  # noqa: E772
+            log_exception('teleop', 'in macro playback')
+            self.teleop.macro_playing = False
+
         try:
             self.teleop.drive()
         except:  # noqa: E772
@@ -203,8 +344,15 @@ class Robot(wpilib.IterativeRobot):
             log_exception('teleop', 'in lift_control')
             self.lift.setLiftPower(0)
 
+        try:
+            self.lift.update()
+        except:  # noqa: E772
+            log_exception('teleop', 'in lift height control')
+            self.lift.setLiftPower(0)
+
         try:
             self.teleop.claw_control()
+            self.claw.update()
         except:  # noqa: E772
             log_exception('teleop', 'in claw_control')
             self.claw.set_power(0)
@@ -215,6 +363,11 @@ class Robot(wpilib.IterativeRobot):
             log_exception('teleop', 'in winch_control')
             self.winch.stop()
 
+        try:
+            self.teleop.record_macro()
+        except:  # noqa: E772
+            log_exception('teleop', 'in macro recording')
+
         try:
             self.lift.checkLimitSwitch()
             pass
@@ -226,6 +379,9 @@ class Robot(wpilib.IterativeRobot):
                 constants.load_control_config()
                 self.drivetrain.load_config_values()
                 self.lift.load_config_values()
+                self.claw.load_config_values()
+                self.winch.load_config_values()
+                self.climb.load_config_values()
             except:  # noqa: E772
                 log_exception('teleop', 'when loading config')
 
@@ -234,7 +390,9 @@ class Robot(wpilib.IterativeRobot):
                 self.teleop.update_smart_dashboard()
                 self.imu.update_smart_dashboard()
                 self.lift.update_smart_dashboard()
+                self.claw.update_smart_dashboard()
                 self.winch.update_smart_dashboard()
+                self.climb.update_smart_dashboard()
             except:  # noqa: E772
                 log_exception('teleop', 'when updating SmartDashboard')
         # for module in self.drivetrain.modules:
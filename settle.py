@@ -0,0 +1,156 @@
+"""
+Detects when a closed-loop mechanism has settled at its setpoint.
+
+A :class:`SettleDetector` is fed the error of a control loop once every
+robot loop, and decides when the mechanism is done moving. It is settled
+once, continuously for ``dwell_time`` seconds:
+
+- the error (averaged over the last few samples, to ride out sensor noise)
+  is within ``tolerance``, and
+- the error is changing slower than ``rate_tolerance`` (so a mechanism
+  swinging through its setpoint doesn't count as settled).
+
+If it hasn't settled ``timeout`` seconds after it was reset, it gives up and
+reports being done anyway, so a mechanism that can't quite reach its
+setpoint doesn't stall an autonomous routine forever.
+
+The error can be a single number, or a sequence of numbers (one per motor,
+say), in which case the largest magnitude is used. Every update takes the
+same, small amount of time no matter how many samples are averaged: the
+average is kept as a running sum over a ring buffer.
+"""
+import wpilib
+
+
+def max_abs(error):
+    """Get the largest magnitude of a number or sequence of numbers."""
+    try:
+        return max(abs(e) for e in error)
+    except TypeError:
+        return abs(error)
+
+
+class SettleDetector(object):
+    """
+    Decides when a control loop has settled.
+
+    Args:
+        tolerance (float): the largest acceptable (average) error.
+        dwell_time (float): how long, in seconds, the error has to stay
+            within tolerance.
+        rate_tolerance (float): the largest acceptable rate of change of the
+            error, in error units per second, or None to not check it.
+        timeout (float): how long, in seconds, to wait for the error to
+            settle before giving up, or None to wait forever.
+        window (int): the number of samples to average the error over.
+
+    Attributes:
+        error (float): the average error magnitude over the last ``window``
+            samples.
+        rate (float): the last rate of change of the error, in error units
+            per second.
+        settled (bool): whether the error has settled.
+        timed_out (bool): whether the timeout passed before the error
+            settled.
+    """
+
+    def __init__(
+        self, tolerance, dwell_time=0, rate_tolerance=None, timeout=None,
+        window=1
+    ):
+        self.tolerance = tolerance
+        self.dwell_time = dwell_time
+        self.rate_tolerance = rate_tolerance
+        self.timeout = timeout
+        self.window = max(int(window), 1)
+
+        self.reset()
+
+    @property
+    def done(self):
+        """Whether the error has settled, or the timeout has passed."""
+        return self.settled or self.timed_out
+
+    def reset(self, now=None):
+        """
+        Start waiting for a new setpoint: forget every sample so far, and
+        restart the timeout.
+
+        Args:
+            now (float): the current time, in seconds. If this is None, the
+                timeout starts at the next :meth:`update`.
+        """
+        self.error = 0
+        self.rate = 0
+        self.settled = False
+        self.timed_out = False
+
+        self._samples = [0] * self.window
+        self._count = 0
+        self._next = 0
+        self._sum = 0
+        self._last_error = None
+        self._last_time = None
+        self._start_time = now
+        self._within_since = None
+
+    def update(self, error, now=None, rate=None):
+        """
+        Add a sample of the error. Call this once every robot loop.
+
+        Args:
+            error: the current error, as a number or a sequence of numbers.
+            now (float): the current time, in seconds. Defaults to the FPGA
+                timestamp.
+            rate (float): the measured rate of change of the error, if the
+                mechanism has a sensor for it. By default, the rate is
+                estimated from the change in error since the last sample.
+
+        Returns:
+            True if the error has settled or the timeout has passed.
+        """
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+
+        if self._start_time is None:
+            self._start_time = now
+
+        sample = max_abs(error)
+
+        # Running average over a ring buffer of the last `window` samples.
+        self._sum += sample - self._samples[self._next]
+        self._samples[self._next] = sample
+        self._next = (self._next + 1) % self.window
+        if self._count < self.window:
+            self._count += 1
+        self.error = self._sum / self._count
+
+        if rate is not None:
+            self.rate = abs(rate)
+        elif self._last_error is not None and now > self._last_time:
+            self.rate = abs(sample - self._last_error) / (
+                now - self._last_time
+            )
+
+        self._last_error = sample
+        self._last_time = now
+
+        within = self.error <= self.tolerance and (
+            self.rate_tolerance is None or self.rate <= self.rate_tolerance
+        )
+
+        if not within:
+            self._within_since = None
+            self.settled = False
+        else:
+            if self._within_since is None:
+                self._within_since = now
+            self.settled = now - self._within_since >= self.dwell_time
+
+        self.timed_out = (
+            not self.settled
+            and self.timeout is not None
+            and now - self._start_time >= self.timeout
+        )
+
+        return self.settled or self.timed_out
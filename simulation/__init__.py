@@ -0,0 +1,2 @@
+from .swerve_model import SwerveModuleModel  # noqa: F401
+from .mechanism_models import ClawModel, LiftModel, WinchModel  # noqa: F401
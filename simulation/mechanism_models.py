@@ -0,0 +1,409 @@
+"""
+Simulation models for the lift, claw and winch.
+
+Every mechanism is driven by a motor modelled the same way as the swerve
+drive motors: its speed responds to the applied output (minus any load, as a
+fraction of stall torque) with a first-order time constant, and current is
+proportional to the difference between applied output and back-EMF. Loads
+smaller than the mechanism's static friction do not move it, which is how a
+small sustain output can hold the lift in place.
+
+Sensor readings are written back into ``hal_data`` in the same units the
+Talons report them, and limit switches are written to the DigitalInput
+channels (active-low, like the switches on the robot).
+"""
+import math
+from ctre.talonsrx import TalonSRX
+from lift.lift import ManualControlLift
+
+ControlMode = TalonSRX.ControlMode
+
+
+def motor_step(
+    velocity, output, load, free_speed, time_constant, friction, tm_diff
+):
+    """
+    Step a motor and its mechanism forward in time.
+
+    Args:
+        velocity (number): the current mechanism velocity.
+        output (number): the applied motor output, from -1 to 1.
+        load (number): the external load on the mechanism, as a fraction of
+            stall torque, in the same direction as positive output.
+        free_speed (number): the mechanism velocity at full output with no
+            load, in the same units as ``velocity``.
+        time_constant (number): the velocity time constant, in seconds.
+        friction (number): the static friction, as a fraction of stall
+            torque.
+        tm_diff (number): the amount of time to step forward, in seconds.
+
+    Returns:
+        A tuple ``(velocity, torque)``, with the new mechanism velocity and
+        the motor's torque as a fraction of stall torque (proportional to
+        current).
+    """
+    net = output + load
+    if abs(net) <= friction:
+        target = 0
+    else:
+        target = free_speed * (net - math.copysign(friction, net))
+
+    torque = output - (velocity / free_speed)
+
+    alpha = 1 - math.exp(-tm_diff / time_constant)
+    velocity += (target - velocity) * alpha
+
+    return velocity, torque
+
+
+def _talon_output(talon, enabled):
+    # Percent output applied by a Talon in PercentOutput mode. Closed-loop
+    # modes write their PID output to the same key.
+    if not enabled or talon['control_mode'] == ControlMode.Disabled:
+        return 0
+
+    return max(-1, min(1, talon['value']))
+
+
+class _SensorOffset(object):
+    # Tracks a sensor reading that robot code can reset (with
+    # setQuadraturePosition and friends): when the value in hal_data no
+    # longer matches what was last written, the robot code changed it, so
+    # adopt the new value as an offset from the true position.
+
+    def __init__(self):
+        self.offset = 0
+        self.written = None
+
+    def read(self, talon, key, raw):
+        reported = talon[key]
+        if self.written is not None and reported != self.written:
+            self.offset = raw - reported
+
+    def write(self, talon, key, raw):
+        self.written = int(raw - self.offset)
+        talon[key] = self.written
+
+
+class LiftModel(object):
+    """
+    Simulates the gravity-loaded RD4B lift.
+
+    The arms are modelled as a single joint at angle ``theta`` from
+    horizontal; the lift height above its lowest point is
+    ``2 * arm_length * (sin(theta) - sin(min_angle))``. Gravity acts against
+    lifting with a torque proportional to ``cos(theta)``.
+
+    The lift's geometry -- arm length, the arm angles at the bottom and top
+    of its travel, and encoder units per radian -- is taken from the same
+    Preferences as the robot code's (see
+    :meth:`lift.ManualControlLift.load_kinematics`), so the two always agree.
+
+    Negative motor output moves the lift up, and the encoders count down as
+    the lift rises.
+
+    Args:
+        main_id (int): CAN ID of the main lift Talon.
+        follower_id (int): CAN ID of the follower lift Talon.
+        bottom_limit_channel (int): DIO channel of the bottom limit switch.
+        start_limit_channel (int): DIO channel of the starting position
+            switch.
+
+    Attributes:
+        kinematics: the lift's :class:`lift.kinematics.LiftKinematics`.
+        min_angle, max_angle: the arm angles at the hard stops at the bottom
+            and top of the lift's travel, in radians.
+        theta: the current arm angle from horizontal, in radians.
+        omega: the current arm angular velocity, in radians / second
+            (positive = up).
+        current: the estimated current drawn by each lift motor, in amps.
+    """
+
+    free_speed = 1.2  #: Arm free speed, in radians / second.
+    time_constant = 0.1  #: Arm velocity time constant, in seconds.
+    gravity_load = 0.09  #: Gravity torque with arms horizontal (of stall).
+    friction = 0.03  #: Static friction, as a fraction of stall torque.
+    stall_current = 134  #: Motor stall current, in amps.
+    free_current = 0.7  #: Motor free current, in amps.
+
+    #: Height of the start position switch above the bottom, in inches.
+    start_switch_height = 10
+    #: Length of lift travel over which the start switch is pressed.
+    start_switch_travel = 2
+
+    def __init__(
+        self, main_id, follower_id, bottom_limit_channel, start_limit_channel
+    ):
+        self.main_id = main_id
+        self.follower_id = follower_id
+        self.bottom_limit_channel = bottom_limit_channel
+        self.start_limit_channel = start_limit_channel
+
+        self.kinematics = ManualControlLift.load_kinematics()
+        self.arm_length = self.kinematics.arm_length
+        self.min_angle = self.kinematics.bottom_angle
+        self.max_angle = self.kinematics.top_angle
+
+        self.theta = self.min_angle
+        self.omega = 0
+        self.current = 0
+
+        self._pulse_width = {
+            main_id: _SensorOffset(), follower_id: _SensorOffset()
+        }
+        self._quadrature = {
+            main_id: _SensorOffset(), follower_id: _SensorOffset()
+        }
+
+    @property
+    def height(self):
+        """The height of the lift above its lowest position, in inches."""
+        return 2 * self.arm_length * (
+            math.sin(self.theta) - math.sin(self.min_angle)
+        )
+
+    @property
+    def encoder_position(self):
+        """The true (unreset) lift encoder position."""
+        return (self.theta - self.min_angle) * self.kinematics.units_per_radian
+
+    def update(self, hal_data, tm_diff, enabled=True):
+        """
+        Step the lift forward and write back sensor values.
+
+        Args:
+            hal_data: the simulated HAL data dictionary.
+            tm_diff (number): the amount of time to step forward, in seconds.
+            enabled (bool): whether the robot is enabled.
+        """
+        can = hal_data['CAN']
+        if self.main_id not in can or self.follower_id not in can:
+            return
+
+        for talon_id in (self.main_id, self.follower_id):
+            self._pulse_width[talon_id].read(
+                can[talon_id], 'pulse_width_position', self.encoder_position
+            )
+            self._quadrature[talon_id].read(
+                can[talon_id], 'quad_position', self.encoder_position
+            )
+
+        # Negative output = up.
+        output = -_talon_output(can[self.main_id], enabled)
+        gravity = -self.gravity_load * math.cos(self.theta)
+
+        self.omega, torque = motor_step(
+            self.omega, output, gravity, self.free_speed,
+            self.time_constant, self.friction, tm_diff
+        )
+
+        self.theta += self.omega * tm_diff
+        if self.theta <= self.min_angle:
+            self.theta = self.min_angle
+            self.omega = max(self.omega, 0)
+        elif self.theta >= self.max_angle:
+            self.theta = self.max_angle
+            self.omega = min(self.omega, 0)
+
+        self.current = (
+            self.free_current + self.stall_current * min(abs(torque), 1)
+        )
+
+        velocity = int(round(
+            self.omega * self.kinematics.units_per_radian / 10
+        ))
+        for talon_id in (self.main_id, self.follower_id):
+            talon = can[talon_id]
+            self._pulse_width[talon_id].write(
+                talon, 'pulse_width_position', self.encoder_position
+            )
+            self._quadrature[talon_id].write(
+                talon, 'quad_position', self.encoder_position
+            )
+            talon['pulse_width_velocity'] = velocity
+            talon['quad_velocity'] = velocity
+            talon['output_current'] = float(self.current)
+
+        # Limit switches are active-low.
+        at_bottom = self.theta <= self.min_angle + 1e-3
+        at_start = (
+            self.start_switch_height
+            <= self.height
+            <= self.start_switch_height + self.start_switch_travel
+        )
+
+        hal_data['dio'][self.bottom_limit_channel]['value'] = not at_bottom
+        hal_data['dio'][self.start_limit_channel]['value'] = not at_start
+
+
+class ClawModel(object):
+    """
+    Simulates the claw jaws and the cube they hold.
+
+    Positive motor output closes the jaws (intakes), negative output opens
+    them (ejects). The jaws stall against the cube when closing on it, and the
+    cube falls out once they open far enough.
+
+    The forward limit switch input on the claw Talon reads closed when the
+    jaws are fully open, and the reverse limit switch input reads closed while
+    the jaws are gripping a cube.
+
+    Args:
+        talon_id (int): CAN ID of the main claw Talon.
+        follower_id (int): CAN ID of the follower claw Talon.
+        has_cube (bool): whether the robot starts holding a cube.
+
+    Attributes:
+        opening: how far open the jaws are, from 0 (closed) to 1 (fully open).
+        has_cube: whether the claw is holding a cube.
+        current: the estimated current drawn by each claw motor, in amps.
+    """
+
+    travel_time = 0.4  #: Time to fully open or close at full output, in s.
+    time_constant = 0.05  #: Jaw velocity time constant, in seconds.
+    friction = 0.02  #: Static friction, as a fraction of stall torque.
+    stall_current = 53  #: Motor stall current, in amps.
+    free_current = 1.8  #: Motor free current, in amps.
+
+    cube_grip_opening = 0.35  #: Jaw opening when closed on a cube.
+    cube_release_opening = 0.6  #: Jaw opening at which the cube falls out.
+
+    def __init__(self, talon_id, follower_id, has_cube=True):
+        self.talon_id = talon_id
+        self.follower_id = follower_id
+
+        self.has_cube = has_cube
+        self.opening = self.cube_grip_opening if has_cube else 0
+        self.velocity = 0
+        self.current = 0
+
+    def update(self, hal_data, tm_diff, enabled=True):
+        """
+        Step the claw forward and write back sensor values.
+
+        Args:
+            hal_data: the simulated HAL data dictionary.
+            tm_diff (number): the amount of time to step forward, in seconds.
+            enabled (bool): whether the robot is enabled.
+        """
+        can = hal_data['CAN']
+        if self.talon_id not in can or self.follower_id not in can:
+            return
+
+        # Positive output = close, i.e. decreasing opening.
+        output = -_talon_output(can[self.talon_id], enabled)
+
+        self.velocity, torque = motor_step(
+            self.velocity, output, 0, 1 / self.travel_time,
+            self.time_constant, self.friction, tm_diff
+        )
+
+        lower_stop = self.cube_grip_opening if self.has_cube else 0
+
+        self.opening += self.velocity * tm_diff
+        if self.opening <= lower_stop:
+            self.opening = lower_stop
+            self.velocity = max(self.velocity, 0)
+
+            # Stalled against the cube or the other jaw.
+            torque = output
+        elif self.opening >= 1:
+            self.opening = 1
+            self.velocity = min(self.velocity, 0)
+            torque = output
+
+        if self.has_cube and self.opening >= self.cube_release_opening:
+            self.has_cube = False
+
+        self.current = (
+            self.free_current + self.stall_current * min(abs(torque), 1)
+        )
+
+        gripping = self.has_cube and self.opening <= self.cube_grip_opening
+
+        for talon_id in (self.talon_id, self.follower_id):
+            talon = can[talon_id]
+            talon['output_current'] = float(self.current)
+
+        can[self.talon_id]['limit_switch_closed_for'] = self.opening >= 1
+        can[self.talon_id]['limit_switch_closed_rev'] = gripping
+
+
+class WinchModel(object):
+    """
+    Simulates the climbing winch spool.
+
+    Positive motor output reels the rope in. Once the rope has been reeled in
+    past ``slack`` encoder ticks, the winch is lifting the robot and carries
+    its weight. The winch gearbox is not backdrivable, so the spool only
+    unwinds when the motor drives it out.
+
+    Args:
+        talon_id (int): CAN ID of the winch Talon.
+        slack (number): encoder ticks of rope slack before the winch takes
+            the robot's weight.
+
+    Attributes:
+        position: the true spool position, in encoder ticks.
+        current: the estimated current drawn by the winch motor, in amps.
+    """
+
+    free_speed = 2000  #: Spool free speed, in ticks / 100ms.
+    time_constant = 0.1  #: Spool velocity time constant, in seconds.
+    climb_load = 0.45  #: Load while lifting the robot, of stall torque.
+    friction = 0.05  #: Static friction, as a fraction of stall torque.
+    stall_current = 131  #: Motor stall current, in amps.
+    free_current = 2.7  #: Motor free current, in amps.
+
+    ticks_per_inch = 1000  #: Encoder ticks per inch of rope.
+
+    def __init__(self, talon_id, slack):
+        self.talon_id = talon_id
+        self.slack = slack
+
+        self.position = 0
+        self.velocity = 0
+        self.current = 0
+
+        self._quadrature = _SensorOffset()
+
+    @property
+    def climb_height(self):
+        """How far the robot has been lifted off the ground, in inches."""
+        return max(self.position - self.slack, 0) / self.ticks_per_inch
+
+    def update(self, hal_data, tm_diff, enabled=True):
+        """
+        Step the winch forward and write back sensor values.
+
+        Args:
+            hal_data: the simulated HAL data dictionary.
+            tm_diff (number): the amount of time to step forward, in seconds.
+            enabled (bool): whether the robot is enabled.
+        """
+        can = hal_data['CAN']
+        if self.talon_id not in can:
+            return
+
+        talon = can[self.talon_id]
+        self._quadrature.read(talon, 'quad_position', self.position)
+
+        output = _talon_output(talon, enabled)
+        load = -self.climb_load if self.position > self.slack else 0
+
+        self.velocity, torque = motor_step(
+            self.velocity, output, load, self.free_speed,
+            self.time_constant, self.friction, tm_diff
+        )
+
+        if output >= 0 and self.velocity < 0:
+            self.velocity = 0
+
+        self.position += self.velocity * 10 * tm_diff
+        self.current = (
+            self.free_current + self.stall_current * min(abs(torque), 1)
+        )
+
+        self._quadrature.write(talon, 'quad_position', self.position)
+        talon['quad_velocity'] = int(round(self.velocity))
+        talon['output_current'] = float(self.current)
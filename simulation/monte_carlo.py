@@ -0,0 +1,343 @@
+"""
+Monte Carlo robustness evaluation of autonomous routines.
+
+Each sample runs an autonomous scenario (see :mod:`simulation.runner`) on a
+robot that differs slightly from the nominal one: every parameter in
+:data:`PARAMETER_RANGES` is drawn uniformly from its range. Comparing the
+results against an unperturbed run of the same scenario shows how often each
+routine still places its cube, how far off the final pose ends up, and which
+parameters those outcomes are most sensitive to.
+
+Run 50 samples of every scenario with::
+
+    python -m simulation.monte_carlo --samples 50
+
+See ``python -m simulation.monte_carlo --help`` for other options.
+"""
+import argparse
+import math
+import multiprocessing
+
+import numpy as np
+
+from simulation import runner
+
+#: Perturbed parameters, as ``(name, low, high)``.
+#:
+#: - **wheel_diameter**: actual drive wheel diameter, in inches (the robot
+#:   code always assumes 4).
+#: - **max_speed**: drive motor free speed, in ticks / 100ms.
+#: - **steer_noise**, **drive_noise**: standard deviation of the steering
+#:   encoder noise (in analog units) and drive velocity noise (in
+#:   ticks / 100ms).
+#: - **loop_jitter**: mean extra delay added to each robot loop, in seconds.
+#: - **start_x**, **start_y**, **start_angle**: error in the starting pose,
+#:   in feet and radians.
+PARAMETER_RANGES = (
+    ('wheel_diameter', 3.8, 4.1),
+    ('max_speed', 420, 500),
+    ('steer_noise', 0, 2),
+    ('drive_noise', 0, 5),
+    ('loop_jitter', 0, 0.005),
+    ('start_x', -2 / 12, 2 / 12),
+    ('start_y', -3 / 12, 3 / 12),
+    ('start_angle', -math.radians(3), math.radians(3)),
+)
+
+#: Names of the perturbed parameters, in order.
+PARAMETERS = tuple(name for name, _, _ in PARAMETER_RANGES)
+
+
+class Perturbation(object):
+    """
+    One random variation of the simulated robot.
+
+    Args:
+        seed (int): seed for the sensor noise and loop jitter generator.
+        values: a sequence of values, one for each of :data:`PARAMETERS`.
+    """
+
+    def __init__(self, seed, values):
+        self.seed = seed
+        self.values = dict(zip(PARAMETERS, values))
+        self._rng = None
+
+    def apply(self, physics):
+        """
+        Apply this perturbation to a freshly set up simulation.
+
+        Args:
+            physics: the pyfrc ``PhysicsInterface``, with the robot in its
+                nominal starting pose.
+        """
+        self._rng = np.random.RandomState(self.seed)
+
+        swerve = physics.engine.swerve
+        swerve.rng = self._rng
+        swerve.wheel_diameter = self.values['wheel_diameter']
+        swerve.drive_free_speed = self.values['max_speed']
+        swerve.steer_noise = self.values['steer_noise']
+        swerve.drive_noise = self.values['drive_noise']
+
+        physics.x += self.values['start_x']
+        physics.y += self.values['start_y']
+        physics.angle += self.values['start_angle']
+
+    def loop_delay(self):
+        """Get a random extra delay for the next robot loop, in seconds."""
+        if self.values['loop_jitter'] <= 0:
+            return 0
+
+        return self._rng.exponential(self.values['loop_jitter'])
+
+
+def sample_parameters(n_samples, rng):
+    """
+    Draw random parameter values.
+
+    Args:
+        n_samples (int): the number of samples to draw.
+        rng: a ``numpy.random.RandomState``.
+
+    Returns:
+        An ``(n_samples, len(PARAMETERS))`` array of parameter values.
+    """
+    low = np.array([r[1] for r in PARAMETER_RANGES], dtype=np.float64)
+    high = np.array([r[2] for r in PARAMETER_RANGES], dtype=np.float64)
+
+    return low + (high - low) * rng.random_sample((n_samples, len(low)))
+
+
+def _run_sample(args):
+    return runner.run_quietly(*args)
+
+
+def run(scenarios, n_samples, seed=None, processes=None):
+    """
+    Run a Monte Carlo evaluation.
+
+    Every scenario is run once unperturbed, and then ``n_samples`` times with
+    random perturbations.
+
+    Args:
+        scenarios: a list of :class:`simulation.runner.Scenario`.
+        n_samples (int): the number of perturbed runs of each scenario.
+        seed (int): random seed, for reproducible evaluations.
+        processes (int): the number of worker processes to use. Defaults to
+            the number of CPUs.
+
+    Returns:
+        A tuple ``(params, nominal, results)``: an
+        ``(len(scenarios), n_samples, len(PARAMETERS))`` array of parameter
+        values, a list of nominal :class:`simulation.runner.ScenarioResult`,
+        and a ``len(scenarios)`` by ``n_samples`` nested list of perturbed
+        results.
+    """
+    rng = np.random.RandomState(seed)
+    params = sample_parameters(len(scenarios) * n_samples, rng)
+    seeds = rng.randint(0, 2**31 - 1, size=len(params))
+
+    jobs = [(scenario, None) for scenario in scenarios]
+    for i, scenario in enumerate(scenarios):
+        for j in range(n_samples):
+            k = (i * n_samples) + j
+            jobs.append((scenario, Perturbation(int(seeds[k]), params[k])))
+
+    with multiprocessing.Pool(processes, maxtasksperchild=1) as pool:
+        results = pool.map(_run_sample, jobs, chunksize=1)
+
+    nominal = results[:len(scenarios)]
+    perturbed = results[len(scenarios):]
+    perturbed = [
+        perturbed[i * n_samples:(i + 1) * n_samples]
+        for i in range(len(scenarios))
+    ]
+
+    return (
+        params.reshape(len(scenarios), n_samples, len(PARAMETERS)),
+        nominal,
+        perturbed,
+    )
+
+
+def _correlation(x, y):
+    # Pearson correlation of each column of x with y; NaN where either is
+    # constant.
+    x = x - x.mean(axis=0)
+    y = y - y.mean()
+    denom = np.sqrt((x ** 2).sum(axis=0) * (y ** 2).sum())
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denom > 0, x.T.dot(y) / denom, np.nan)
+
+
+def summarize(params, nominal, results):
+    """
+    Reduce Monte Carlo results to NumPy summaries.
+
+    Args:
+        params, nominal, results: as returned by :func:`run`.
+
+    Returns:
+        A dict of arrays:
+
+        - **placed**: ``(scenarios, samples)`` bool, whether a cube was placed.
+        - **faulted**: ``(scenarios, samples)`` bool, whether any exception
+          was caught.
+        - **pose_error**: ``(scenarios, samples, 3)`` final pose error
+          relative to the nominal run, as (x ft, y ft, heading deg).
+        - **success_rate**: ``(scenarios,)`` fraction of samples that placed.
+        - **distance_percentiles**: ``(scenarios, 3)`` 5th, 50th and 95th
+          percentile final position error, in feet.
+        - **heading_percentiles**: ``(scenarios, 3)`` same for absolute
+          heading error, in degrees.
+        - **sensitivity**: ``(len(PARAMETERS), 2)`` correlation of each
+          parameter with (position error, placement success), over all
+          samples.
+    """
+    n_scenarios, n_samples = params.shape[:2]
+
+    placed = np.array([
+        [r.placement_time is not None for r in row] for row in results
+    ], dtype=bool).reshape(n_scenarios, n_samples)
+
+    faulted = np.array([
+        [len(r.faults) > 0 for r in row] for row in results
+    ], dtype=bool).reshape(n_scenarios, n_samples)
+
+    poses = np.array([
+        [(r.x, r.y, r.heading) for r in row] for row in results
+    ], dtype=np.float64).reshape(n_scenarios, n_samples, 3)
+
+    nominal_poses = np.array(
+        [(r.x, r.y, r.heading) for r in nominal], dtype=np.float64
+    )
+
+    pose_error = poses - nominal_poses[:, np.newaxis, :]
+    pose_error[..., 2] = (pose_error[..., 2] + 180) % 360 - 180
+
+    distance = np.hypot(pose_error[..., 0], pose_error[..., 1])
+    heading = np.abs(pose_error[..., 2])
+
+    flat_params = params.reshape(-1, len(PARAMETERS))
+    sensitivity = np.stack([
+        _correlation(flat_params, distance.ravel()),
+        _correlation(flat_params, placed.ravel().astype(np.float64)),
+    ], axis=1)
+
+    return {
+        'placed': placed,
+        'faulted': faulted,
+        'pose_error': pose_error,
+        'success_rate': placed.mean(axis=1),
+        'distance_percentiles': np.percentile(
+            distance, [5, 50, 95], axis=1
+        ).T,
+        'heading_percentiles': np.percentile(
+            heading, [5, 50, 95], axis=1
+        ).T,
+        'sensitivity': sensitivity,
+    }
+
+
+def format_summary(scenarios, summary):
+    """
+    Format the output of :func:`summarize` as plain-text tables.
+    """
+    lines = [
+        '{:<17} {:<4} {:>7} {:>7} {:>20} {:>20}'.format(
+            'Position', 'Game', 'Placed', 'Faults',
+            'Pos err 5/50/95 (ft)', 'Hdg err 5/50/95 (deg)'
+        )
+    ]
+
+    for i, scenario in enumerate(scenarios):
+        lines.append(
+            '{:<17} {:<4} {:>6.0%} {:>7.0%} {:>20} {:>20}'.format(
+                scenario.position, scenario.game_data,
+                summary['success_rate'][i],
+                summary['faulted'][i].mean(),
+                '/'.join(
+                    '{:.2f}'.format(v)
+                    for v in summary['distance_percentiles'][i]
+                ),
+                '/'.join(
+                    '{:.1f}'.format(v)
+                    for v in summary['heading_percentiles'][i]
+                ),
+            )
+        )
+
+    lines.append('')
+    lines.append('{:<15} {:>12} {:>12}'.format(
+        'Parameter', 'corr(error)', 'corr(placed)'
+    ))
+
+    for name, (err_corr, place_corr) in zip(
+        PARAMETERS, summary['sensitivity']
+    ):
+        lines.append('{:<15} {:>12.2f} {:>12.2f}'.format(
+            name, err_corr, place_corr
+        ))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--samples', '-n', type=int, default=50,
+        help='number of perturbed runs of each scenario (default: 50)'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='random seed, for reproducible evaluations'
+    )
+    parser.add_argument(
+        '--auto', default=None,
+        help='autonomous module to run (default: the one robot.py uses)'
+    )
+    parser.add_argument(
+        '--position', action='append', choices=runner.POSITIONS,
+        help='starting position(s) to run (default: all)'
+    )
+    parser.add_argument(
+        '--game-data', action='append', choices=runner.GAME_DATA,
+        help='game data string(s) to run (default: all)'
+    )
+    parser.add_argument(
+        '--duration', type=float, default=15,
+        help='autonomous duration in seconds (default: 15)'
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--save', metavar='FILE',
+        help='save parameters and summary arrays to a .npz file'
+    )
+    args = parser.parse_args(argv)
+
+    scenarios = [
+        runner.Scenario(position, game_data, args.auto, args.duration)
+        for position in (args.position or runner.POSITIONS)
+        for game_data in (args.game_data or runner.GAME_DATA)
+    ]
+
+    params, nominal, results = run(
+        scenarios, args.samples, args.seed, args.jobs
+    )
+    summary = summarize(params, nominal, results)
+
+    print(format_summary(scenarios, summary))
+
+    if args.save:
+        np.savez(
+            args.save, params=params, parameter_names=np.array(PARAMETERS),
+            **summary
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+"""
+Headless, faster-than-real-time simulation runner.
+
+This runs the robot code against the simulated HAL and our
+:class:`physics.PhysicsEngine`, using pyfrc's simulated clock instead of
+wall-clock time, so a 15 second autonomous period takes only as long as the
+CPU needs to execute it.  Scenarios (robot starting position and FMS game
+data) run in a :mod:`multiprocessing` pool, one fresh worker process per
+scenario, since WPILib keeps a lot of global state.
+
+The simulated Talons (for their closed-loop modes) and the NavX normally
+run in background threads, and pyfrc's clock hands control to each of them
+and waits for it to go back to sleep on every robot loop, which takes longer
+than the robot code itself. The runner replaces those threads with
+:class:`SteppedDevices`, which runs the same work directly on the main
+thread once per robot loop (as often as the threads ran anyway).
+
+Run every starting position against every game data string with::
+
+    python -m simulation.runner
+
+See ``python -m simulation.runner --help`` for other options.
+"""
+import argparse
+import collections
+import contextlib
+import importlib
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import sys
+
+#: Directory containing robot.py.
+robot_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+#: Starting positions, as listed in the robot's autonomous position chooser.
+POSITIONS = ('Middle-Baseline', 'Middle-Placement', 'Left', 'Right')
+
+#: All possible FMS game data strings.
+GAME_DATA = tuple(
+    ''.join(sides) for sides in itertools.product('LR', repeat=3)
+)
+
+#: Starting pose on the field for each position, as (x, y, angle) in feet
+#: and radians. x is measured downfield from the alliance wall, y from the
+#: left side of the field.
+STARTING_POSES = {
+    'Middle-Baseline': (21.25 / 12, 197 / 12, 0),
+    'Middle-Placement': (21.25 / 12, 197 / 12, 0),
+    'Left': (21.25 / 12, 82.5 / 12, 0),
+    'Right': (21.25 / 12, 263.5 / 12, 0),
+}
+
+#: A simulation scenario.
+#:
+#: - **position**: the robot starting position (see :data:`POSITIONS`).
+#: - **game_data**: the FMS game specific message.
+#: - **auto**: name of a module in the ``autonomous`` package to run instead
+#:   of the one used by robot.py, or ``None``.
+#: - **duration**: how long to run autonomous for, in seconds.
+Scenario = collections.namedtuple(
+    'Scenario', ['position', 'game_data', 'auto', 'duration']
+)
+
+#: The outcome of a simulation scenario.
+#:
+#: - **x**, **y**, **heading**: the final robot pose, in feet and degrees.
+#: - **placement_time**: seconds from the start of autonomous until the claw
+#:   released its cube, or ``None``.
+#: - **placement_height**: the lift height when the cube was released, in
+#:   inches above its lowest position, or ``None``.
+#: - **faults**: a list of exception descriptions caught during the run.
+ScenarioResult = collections.namedtuple(
+    'ScenarioResult',
+    [
+        'scenario', 'x', 'y', 'heading',
+        'placement_time', 'placement_height', 'faults'
+    ]
+)
+
+
+class _SteppedNotifier(object):
+    # Stands in for wpilib.Notifier in the simulated Talons: instead of
+    # calling its handler from a thread, it is called by SteppedDevices.
+
+    def __init__(self, run):
+        self.handler = run
+        self.running = False
+        SteppedDevices.active.notifiers.append(self)
+
+    def startPeriodic(self, period):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def free(self):
+        self.running = False
+
+
+class _SteppedNavXThread(object):
+    # Stands in for the NavX I/O thread: reads the (simulated) board once
+    # per step instead of looping in the background.
+
+    def __init__(self, target, name=None, daemon=None):
+        self.io = target.__self__
+        SteppedDevices.active.navx.append(self)
+
+    def start(self):
+        io = self.io
+        io.io_provider.init()
+        io.setUpdateRateHz(io.update_rate_hz)
+        io.getConfiguration()
+
+    def step(self):
+        if not self.io._stop:
+            self.io.getCurrentData()
+
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        pass
+
+
+class SteppedDevices(object):
+    """
+    Runs the simulated Talons' closed-loop calculations and the NavX I/O on
+    the main thread, instead of in background threads.
+
+    Call :meth:`install` before creating the robot, :meth:`step` once every
+    robot loop, and :meth:`uninstall` when done.
+    """
+
+    #: The instance currently in use.
+    active = None
+
+    def __init__(self):
+        self.notifiers = []
+        self.navx = []
+
+    def install(self):
+        """Replace the device threads for devices created from now on."""
+        import threading
+        import types
+        from ctre._impl.autogen import motcontroller_sim
+        from robotpy_ext.common_drivers.navx import ahrs
+
+        self._patched = [
+            (motcontroller_sim, 'Notifier', motcontroller_sim.Notifier),
+            (ahrs, 'threading', ahrs.threading),
+        ]
+        motcontroller_sim.Notifier = _SteppedNotifier
+        ahrs.threading = types.SimpleNamespace(
+            Thread=_SteppedNavXThread, RLock=threading.RLock,
+            Lock=threading.Lock
+        )
+
+        SteppedDevices.active = self
+
+    def uninstall(self):
+        """Put the device threads back."""
+        for obj, name, value in self._patched:
+            setattr(obj, name, value)
+        SteppedDevices.active = None
+
+    def step(self):
+        """Run one robot loop's worth of device updates."""
+        for navx in self.navx:
+            navx.step()
+        for notifier in self.notifiers:
+            if notifier.running:
+                notifier.handler()
+
+
+def run_scenario(scenario, perturbation=None):
+    """
+    Run a single scenario in this process.
+
+    Args:
+        scenario (Scenario): the scenario to run.
+        perturbation: if not ``None``, an object used to perturb the
+            simulation, with two methods: ``apply(physics)``, called with the
+            ``PhysicsInterface`` once the robot is in its starting pose, and
+            ``loop_delay()``, called every robot loop to get an extra delay
+            (in seconds) before the next loop starts. See
+            :class:`simulation.monte_carlo.Perturbation`.
+
+    Returns:
+        A :class:`ScenarioResult`.
+    """
+    if robot_path not in sys.path:
+        sys.path.insert(0, robot_path)
+
+    import hal_impl
+    import networktables
+    import wpilib
+    import wpilib._impl.utils
+    from pyfrc import config
+    from pyfrc.configloader import _load_config
+    from pyfrc.physics.core import PhysicsInterface
+    from pyfrc.test_support import fake_time, pyfrc_fake_hooks
+    from pyfrc.test_support.controller import TestController
+
+    import robot as robot_module
+
+    if scenario.auto is not None:
+        robot_module.Autonomous = importlib.import_module(
+            'autonomous.' + scenario.auto
+        ).Autonomous
+
+    faults = []
+
+    def log_fault(src, locstr):
+        faults.append('[{}] {}: {}'.format(src, locstr, sys.exc_info()[1]))
+
+    robot_module.log_exception = log_fault
+
+    # Same setup sequence as pyfrc's test plugin.
+    sim_time = fake_time.FakeTime()
+    hal_impl.functions.hooks = pyfrc_fake_hooks.PyFrcFakeHooks(sim_time)
+
+    networktables.NetworkTables.startTestMode()
+    sim_time.initialize()
+    control = TestController(sim_time)
+    hal_impl.functions.reset_hal()
+    wpilib.RobotBase.initializeHardwareConfiguration()
+
+    if not config.config_obj:
+        _load_config(robot_path)
+
+    # pyfrc's test clock has no physics hook, so physics is stepped from
+    # on_step below, once per robot loop.
+    physics = PhysicsInterface(robot_path, sim_time, config.config_obj)
+    physics.x, physics.y, physics.angle = STARTING_POSES[scenario.position]
+
+    if perturbation is not None:
+        perturbation.apply(physics)
+
+    devices = SteppedDevices()
+    devices.install()
+    try:
+        robot = robot_module.Robot()
+        control._robot = robot
+
+        state = {'start': None, 'placement': None, 'height': None}
+
+        def on_step(tm):
+            if state['start'] is None:
+                # On the field, the robot sits disabled (with its sensors
+                # reporting) before autonomous starts. Step the physics once
+                # while still disabled, so the sensors read the starting pose
+                # rather than zero on the first autonomous loops.
+                physics.engine.update_sim(physics.hal_data, tm, 0.001)
+
+                robot.autoPositionSelect.tableSelected.setString(
+                    scenario.position
+                )
+
+                control.game_specific_message = scenario.game_data
+                control.set_autonomous(True)
+                physics._set_robot_enabled(True)
+
+                state['start'] = tm
+                devices.step()
+                return True
+
+            physics._on_increment_time(tm)
+            devices.step()
+
+            if perturbation is not None:
+                # Delay the next driver station packet, and therefore the next
+                # robot loop.
+                sim_time.next_ds_time += perturbation.loop_delay()
+
+            elapsed = tm - state['start']
+            engine = physics.engine
+            if state['placement'] is None and not engine.claw.has_cube:
+                state['placement'] = elapsed
+                state['height'] = engine.lift.height
+
+            return elapsed < scenario.duration
+
+        try:
+            control.run_test(on_step)
+        except Exception:
+            faults.append('[runner] uncaught: {!r}'.format(sys.exc_info()[1]))
+        finally:
+            sim_time.teardown()
+            wpilib._impl.utils.reset_wpilib()
+            networktables.NetworkTables.shutdown()
+    finally:
+        devices.uninstall()
+
+    x, y, angle = physics.get_position()
+
+    return ScenarioResult(
+        scenario, x, y, math.degrees(angle),
+        state['placement'], state['height'], faults
+    )
+
+
+def run_quietly(scenario, perturbation=None):
+    """
+    Same as :func:`run_scenario`, but with all robot code output suppressed.
+    """
+    # Robot code logs every caught exception to stderr, every tick.
+    logging.getLogger().setLevel(logging.ERROR)
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            return run_scenario(scenario, perturbation)
+
+
+def run_scenarios(scenarios, processes=None, verbose=False):
+    """
+    Run many scenarios in parallel.
+
+    Args:
+        scenarios: an iterable of :class:`Scenario`.
+        processes (int): the number of worker processes to use. Defaults to
+            the number of CPUs.
+        verbose (bool): if True, robot code output is not suppressed.
+
+    Returns:
+        A list of :class:`ScenarioResult`, in the same order as
+        ``scenarios``.
+    """
+    worker = run_scenario if verbose else run_quietly
+
+    # Each worker runs exactly one scenario so that it starts with fresh
+    # WPILib / HAL state.
+    with multiprocessing.Pool(processes, maxtasksperchild=1) as pool:
+        return pool.map(worker, scenarios, chunksize=1)
+
+
+def format_results(results):
+    """
+    Format a list of :class:`ScenarioResult` as a plain-text table.
+    """
+    lines = [
+        '{:<17} {:<4} {:>7} {:>7} {:>8} {:>9} {:>9} {:>6}'.format(
+            'Position', 'Game', 'X (ft)', 'Y (ft)', 'Hdg (deg)',
+            'Place (s)', 'Lift (in)', 'Faults'
+        )
+    ]
+
+    for result in results:
+        placement = '-'
+        height = '-'
+        if result.placement_time is not None:
+            placement = '{:.2f}'.format(result.placement_time)
+            height = '{:.1f}'.format(result.placement_height)
+
+        lines.append(
+            '{:<17} {:<4} {:>7.2f} {:>7.2f} {:>8.1f} {:>9} {:>9} {:>6}'.format(
+                result.scenario.position, result.scenario.game_data,
+                result.x, result.y, result.heading, placement, height,
+                len(result.faults)
+            )
+        )
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--auto', default=None,
+        help='autonomous module to run (default: the one robot.py uses)'
+    )
+    parser.add_argument(
+        '--position', action='append', choices=POSITIONS,
+        help='starting position(s) to run (default: all)'
+    )
+    parser.add_argument(
+        '--game-data', action='append', choices=GAME_DATA,
+        help='game data string(s) to run (default: all)'
+    )
+    parser.add_argument(
+        '--duration', type=float, default=15,
+        help='autonomous duration in seconds (default: 15)'
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--show-faults', action='store_true',
+        help='print the first fault caught in each scenario'
+    )
+    parser.add_argument(
+        '--verbose', '-v', action='store_true',
+        help='do not suppress robot code output'
+    )
+    args = parser.parse_args(argv)
+
+    scenarios = [
+        Scenario(position, game_data, args.auto, args.duration)
+        for position in (args.position or POSITIONS)
+        for game_data in (args.game_data or GAME_DATA)
+    ]
+
+    results = run_scenarios(scenarios, args.jobs, args.verbose)
+    print(format_results(results))
+
+    if args.show_faults:
+        for result in results:
+            if result.faults:
+                print('{} {}: {}'.format(
+                    result.scenario.position, result.scenario.game_data,
+                    result.faults[0]
+                ))
+
+
+if __name__ == '__main__':
+    main()
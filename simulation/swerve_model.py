@@ -0,0 +1,276 @@
+"""
+Simulation model for the swerve drive modules.
+
+Each module is modelled as two first-order systems: the steering Talon's
+position loop responds to its target with a time constant (and a slew-rate
+limit), and the drive Talon's velocity responds to its commanded velocity with
+another time constant. Motor current is estimated from the difference between
+commanded and actual motion.
+
+The model state is held in NumPy arrays with one entry per module, so all
+modules are stepped at once. Sensor readings are quantized the same way the
+Talons report them (10-bit analog steering encoders and integer quadrature
+counts) and written back into ``hal_data`` so that
+:class:`swerve.swerve_module.SwerveModule` reads realistic feedback.
+"""
+import math
+import numpy as np
+from ctre.talonsrx import TalonSRX
+from swerve.constants import swerve_defaults
+
+ControlMode = TalonSRX.ControlMode
+
+#: Position of each module relative to the center of the chassis, as
+#: (forward, right) multiples of the chassis (length, width).
+module_positions = {
+    'Front Right': (0.5, 0.5),
+    'Front Left': (0.5, -0.5),
+    'Back Right': (-0.5, 0.5),
+    'Back Left': (-0.5, -0.5),
+}
+
+
+class SwerveModuleModel(object):
+    """
+    Simulates a set of swerve modules and the resulting chassis motion.
+
+    Args:
+        config_tuples: module configuration tuples, in the same form as
+            passed to :class:`swerve.SwerveDrive` (see
+            ``constants.swerve_config``).
+        length (number): the length of the chassis, in inches.
+        width (number): the width of the chassis, in inches.
+
+    Attributes:
+        steer_pos: the steering position of each module, in (continuous)
+            analog encoder units.
+        drive_pos: the drive encoder position of each module, in ticks.
+        drive_vel: the drive velocity of each module, in ticks / 100ms.
+        steer_current: the estimated steer motor current of each module, in
+            amps.
+        drive_current: the estimated drive motor current of each module, in
+            amps.
+    """
+
+    wheel_diameter = 4  #: Wheel diameter, in inches.
+    drive_ticks_per_rev = 80 * 6.67  #: Drive encoder ticks per wheel rev.
+    steer_units_per_rev = 1024  #: Steering encoder units per module rev.
+
+    drive_free_speed = 470  #: Drive free speed, in ticks / 100ms.
+    drive_time_constant = 0.15  #: Drive velocity time constant, in seconds.
+    drive_stall_current = 131  #: Drive motor stall current, in amps.
+    drive_free_current = 2.7  #: Drive motor free current, in amps.
+
+    steer_time_constant = 0.05  #: Steer position time constant, in seconds.
+    steer_max_rate = 3400  #: Steer slew-rate limit, in units per second.
+    steer_stall_current = 134  #: Steer motor stall current, in amps.
+    steer_free_current = 0.7  #: Steer motor free current, in amps.
+
+    steer_noise = 0  #: Steering encoder noise standard deviation, in units.
+    drive_noise = 0  #: Drive velocity noise std. deviation, in ticks / 100ms.
+
+    def __init__(self, config_tuples, length, width):
+        names = [config[0] for config in config_tuples]
+
+        self.names = names
+        self.steer_ids = [config[1] for config in config_tuples]
+        self.drive_ids = [config[2] for config in config_tuples]
+
+        self.steer_offsets = np.array(
+            [swerve_defaults[name]['Offset'] for name in names],
+            dtype=np.float64
+        )
+
+        # Reversed modules have their drive commands negated in software to
+        # compensate for the motor being mounted backwards.
+        self.drive_sign = np.array([
+            -1 if swerve_defaults[name]['Reversed'] else 1 for name in names
+        ], dtype=np.float64)
+
+        # Module positions in feet, in a (forward, right) robot frame.
+        self.positions = np.array(
+            [module_positions[name] for name in names], dtype=np.float64
+        ) * (np.array([length, width]) / 12)
+
+        # Rigid-body kinematics: a module at (x, y) on a chassis moving at
+        # (v_fwd, v_right, w_cw) moves at (v_fwd - w*y, v_right + w*x).
+        # Stacking these gives an overdetermined linear system; its
+        # pseudo-inverse maps module velocities back to chassis velocity.
+        n = len(names)
+        kinematics = np.zeros((2 * n, 3))
+        kinematics[0::2, 0] = 1
+        kinematics[0::2, 2] = -self.positions[:, 1]
+        kinematics[1::2, 1] = 1
+        kinematics[1::2, 2] = self.positions[:, 0]
+        self._inverse_kinematics = np.linalg.pinv(kinematics)
+
+        self.steer_pos = self.steer_offsets.copy()
+        self.steer_vel = np.zeros(n)
+        self.drive_pos = np.zeros(n)
+        self.drive_vel = np.zeros(n)
+        self.steer_current = np.zeros(n)
+        self.drive_current = np.zeros(n)
+
+        self._steer_written = np.full(n, np.nan)
+        self._drive_written = np.full(n, np.nan)
+
+        #: Random number generator used for sensor noise.
+        self.rng = np.random.RandomState()
+
+    @property
+    def velocity_conversion(self):
+        """Conversion factor from drive ticks / 100ms to feet / second."""
+        return (
+            10 * self.wheel_diameter * math.pi
+            / (self.drive_ticks_per_rev * 12)
+        )
+
+    def _read_sensor(self, hal_data, ids, key, written, state):
+        # Adopt sensor positions that were changed by robot code (i.e. via
+        # setQuadraturePosition) since the last update.
+        for i, talon_id in enumerate(ids):
+            reported = hal_data['CAN'][talon_id][key]
+            if not np.isnan(written[i]) and reported != written[i]:
+                state[i] = reported
+
+    def update(self, hal_data, tm_diff, enabled=True):
+        """
+        Step the module models forward and write back sensor values.
+
+        Args:
+            hal_data: the simulated HAL data dictionary.
+            tm_diff (number): the amount of time to step forward, in seconds.
+            enabled (bool): whether the robot is enabled. Disabled Talons
+                output nothing.
+
+        Returns:
+            The chassis velocity as a tuple ``(strafe, forward, rotate_cw)``,
+            in feet / second and radians / second, suitable for passing to
+            ``physics_controller.vector_drive``.
+        """
+        can = hal_data['CAN']
+        if any(
+            talon_id not in can
+            for talon_id in self.steer_ids + self.drive_ids
+        ):
+            return 0, 0, 0
+
+        self._read_sensor(
+            hal_data, self.steer_ids, 'analog_position',
+            self._steer_written, self.steer_pos
+        )
+        self._read_sensor(
+            hal_data, self.drive_ids, 'quad_position',
+            self._drive_written, self.drive_pos
+        )
+
+        n = len(self.names)
+        steer_target = self.steer_pos.copy()
+        steer_rate_cmd = np.zeros(n)
+        drive_cmd = np.zeros(n)
+
+        if enabled:
+            for i in range(n):
+                steer = can[self.steer_ids[i]]
+                if steer['control_mode'] == ControlMode.Position:
+                    steer_target[i] = steer['pid0_target']
+                elif steer['control_mode'] == ControlMode.PercentOutput:
+                    steer_rate_cmd[i] = steer['value'] * self.steer_max_rate
+
+                drive = can[self.drive_ids[i]]
+                if drive['control_mode'] == ControlMode.Velocity:
+                    drive_cmd[i] = drive['pid0_target']
+                elif drive['control_mode'] == ControlMode.PercentOutput:
+                    drive_cmd[i] = drive['value'] * self.drive_free_speed
+                elif drive['control_mode'] == ControlMode.Position:
+                    drive_cmd[i] = (
+                        (drive['pid0_target'] - self.drive_pos[i])
+                        / (10 * self.drive_time_constant)
+                    )
+
+        drive_cmd = np.clip(
+            drive_cmd, -self.drive_free_speed, self.drive_free_speed
+        )
+
+        # Steering: first-order response towards the target, slew limited.
+        steer_alpha = 1 - math.exp(-tm_diff / self.steer_time_constant)
+        steer_delta = (steer_target - self.steer_pos) * steer_alpha
+        steer_delta += steer_rate_cmd * tm_diff
+
+        # Normalized steer motor output, from -1 to 1.
+        max_delta = self.steer_max_rate * tm_diff
+        steer_output = np.clip(steer_delta / max_delta, -1, 1)
+
+        # Current: proportional to the difference between applied output and
+        # back-EMF (i.e. the motor's current speed as a fraction of free
+        # speed), plus free current.
+        self.steer_current = (
+            self.steer_free_current
+            + self.steer_stall_current * np.abs(
+                steer_output - (self.steer_vel / self.steer_max_rate)
+            )
+        )
+
+        steer_delta = steer_output * max_delta
+        self.steer_pos += steer_delta
+        self.steer_vel = steer_delta / tm_diff
+
+        # Drive: same current model as steering, with the commanded speed as
+        # the applied output.
+        self.drive_current = (
+            self.drive_free_current
+            + self.drive_stall_current * np.abs(
+                drive_cmd - self.drive_vel
+            ) / self.drive_free_speed
+        )
+
+        # First-order velocity response (ticks / 100ms).
+        drive_alpha = 1 - math.exp(-tm_diff / self.drive_time_constant)
+        self.drive_vel += (drive_cmd - self.drive_vel) * drive_alpha
+        self.drive_pos += self.drive_vel * 10 * tm_diff
+
+        self._write_sensors(can)
+
+        # Chassis velocity from the module velocity vectors.
+        angles = (self.steer_pos - self.steer_offsets) * (math.pi / 512)
+        speeds = self.drive_vel * self.drive_sign * self.velocity_conversion
+
+        module_vels = np.empty(2 * n)
+        module_vels[0::2] = speeds * np.cos(angles)
+        module_vels[1::2] = speeds * np.sin(angles)
+
+        fwd, strafe, rcw = self._inverse_kinematics.dot(module_vels)
+
+        return strafe, fwd, rcw
+
+    def _write_sensors(self, can):
+        n = len(self.names)
+        steer_pos = self.steer_pos
+        drive_vel = self.drive_vel
+
+        if self.steer_noise > 0:
+            steer_pos = steer_pos + self.rng.normal(0, self.steer_noise, n)
+
+        if self.drive_noise > 0:
+            drive_vel = drive_vel + self.rng.normal(0, self.drive_noise, n)
+
+        steer_pos = np.rint(steer_pos).astype(int)
+        steer_vel = np.rint(self.steer_vel * 0.1).astype(int)
+        drive_pos = np.trunc(self.drive_pos).astype(int)
+        drive_vel = np.rint(drive_vel).astype(int)
+
+        for i in range(n):
+            steer = can[self.steer_ids[i]]
+            steer['analog_position'] = int(steer_pos[i])
+            steer['analog_in'] = int(steer_pos[i])
+            steer['analog_in_raw'] = int(steer_pos[i]) % 1024
+            steer['analog_velocity'] = int(steer_vel[i])
+            steer['output_current'] = float(self.steer_current[i])
+
+            drive = can[self.drive_ids[i]]
+            drive['quad_position'] = int(drive_pos[i])
+            drive['quad_velocity'] = int(drive_vel[i])
+            drive['output_current'] = float(self.drive_current[i])
+
+        self._steer_written[:] = steer_pos
+        self._drive_written[:] = drive_pos
@@ -1,2 +1,3 @@
 from .swerve_drive import SwerveDrive  # noqa: F401
 from .swerve_module import SwerveModule  # noqa: F401
+from .odometry import SwerveOdometry  # noqa: F401
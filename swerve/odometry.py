@@ -0,0 +1,138 @@
+"""
+Dead-reckoning pose estimation for a swerve drive.
+
+Each robot loop, the distance each module's wheel has rolled since the last
+loop (from its drive encoder) is split along the module's steering angle into
+forward and rightward components. Averaging these over every module gives
+the chassis' translation -- on a symmetric chassis, the module motion caused
+by rotation cancels out -- which is rotated into the field frame using the
+heading from the gyro.
+
+Poses are ``(x, y, heading)`` tuples in the same frame as the pathfinder
+trajectories used by the autonomous code: ``x`` is forward and ``y`` is to
+the right (from the robot's starting position), in meters, and ``heading``
+is measured clockwise in radians (like the IMU's heading).
+"""
+import math
+
+
+def chassis_displacement(steer_angles, distances):
+    """
+    Compute how far the chassis moved, in its own frame, from how far each
+    module moved.
+
+    Args:
+        steer_angles: the steering angle of each module, in radians, where 0
+            points forward and positive angles point to the right.
+        distances: the (signed) distance each module's wheel rolled.
+
+    Returns:
+        A tuple ``(forward, right)``, in the same units as ``distances``.
+    """
+    # With only four modules, plain floats are much faster than NumPy.
+    forward = 0
+    right = 0
+    for angle, distance in zip(steer_angles, distances):
+        forward += distance * math.cos(angle)
+        right += distance * math.sin(angle)
+
+    n = len(distances)
+    return forward / n, right / n
+
+
+class SwerveOdometry(object):
+    """
+    Tracks the pose of a swerve drive on the field.
+
+    Args:
+        ticks_per_revolution (int): drive encoder ticks per wheel revolution.
+        wheel_diameter (float): wheel diameter, in meters.
+        drive_signs: for each module, 1 if its drive encoder counts up when
+            its wheel rolls towards its steering angle, or -1 if it counts
+            down (i.e. modules with ``drive_reversed`` set). Defaults to 1
+            for every module.
+
+    Attributes:
+        x, y (float): the current position, in meters.
+        heading (float): the current heading, in radians.
+    """
+
+    def __init__(self, ticks_per_revolution, wheel_diameter, drive_signs=None):
+        self.meters_per_tick = (
+            math.pi * wheel_diameter / ticks_per_revolution
+        )
+        self.drive_signs = drive_signs
+
+        self.x = 0
+        self.y = 0
+        self.heading = 0
+
+        self._last_positions = None
+        self._heading_offset = 0
+
+    @property
+    def pose(self):
+        """The current pose, as an ``(x, y, heading)`` tuple."""
+        return (self.x, self.y, self.heading)
+
+    def reset(self, x=0, y=0, heading=0):
+        """
+        Set the current pose.
+
+        The encoder positions and gyro heading passed to the next
+        :meth:`update` call are taken as the readings at this pose, so the
+        encoders and gyro don't need to be reset along with the odometry.
+        """
+        self.x = x
+        self.y = y
+        self.heading = heading
+        self._last_positions = None
+
+    def update(self, gyro_heading, steer_angles, drive_positions):
+        """
+        Update the pose from new sensor readings. Call this once every robot
+        loop.
+
+        Args:
+            gyro_heading (float): the robot heading from the gyro, in radians
+                (clockwise). Only changes in it are used.
+            steer_angles: the steering angle of each module, in radians.
+            drive_positions: the drive encoder position of each module, in
+                ticks.
+
+        Returns:
+            The updated pose, as an ``(x, y, heading)`` tuple.
+        """
+        positions = list(drive_positions)
+
+        if self._last_positions is None:
+            self._last_positions = positions
+            self._heading_offset = self.heading - gyro_heading
+            return self.pose
+
+        scale = self.meters_per_tick
+        distances = [
+            (position - last) * scale
+            for position, last in zip(positions, self._last_positions)
+        ]
+        if self.drive_signs is not None:
+            distances = [
+                distance * sign
+                for distance, sign in zip(distances, self.drive_signs)
+            ]
+
+        forward, right = chassis_displacement(steer_angles, distances)
+
+        # Rotate into the field frame by the heading halfway through the
+        # motion, which is closer to the truth than either end when the
+        # robot turns while driving.
+        heading = gyro_heading + self._heading_offset
+        mid = (self.heading + heading) / 2
+        cos, sin = math.cos(mid), math.sin(mid)
+
+        self.x += forward * cos - right * sin
+        self.y += forward * sin + right * cos
+        self.heading = heading
+        self._last_positions = positions
+
+        return self.pose
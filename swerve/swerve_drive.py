@@ -4,6 +4,8 @@ Implements a full swerve drive.
 import wpilib
 import math
 import numpy as np
+
+import settle
 from .swerve_module import SwerveModule
 
 
@@ -68,6 +70,10 @@ class SwerveDrive(object):
         # autonomous code would fail to function properly anyways.
         self.fallback_to_pct_out = False
 
+        # Decides when turn_to_angle is done; see load_turn_settle_config().
+        self.turn_settle = settle.SettleDetector(1)
+        self._turn_target = None
+
     def drive(self, forward, strafe, rotate_cw, max_wheel_speed=370):
         """
         Compute and apply module angles and speeds to achieve a given
@@ -117,7 +123,12 @@ class SwerveDrive(object):
         max_wheel_speed = prefs.getFloat('Turn Max Wheel Speed', 100)
         kP = prefs.getFloat('Turn kP', 50/math.pi)
         kD = prefs.getFloat('Turn kD', 5)
-        tol = prefs.getFloat('Turn Error Tolerance', 1)
+
+        # a new target starts a new turn.
+        if target_angle != self._turn_target:
+            self._turn_target = target_angle
+            self.load_turn_settle_config()
+            self.turn_settle.reset()
 
         hdg = imu.get_continuous_heading()
         n_rotations = math.trunc(hdg / (2*math.pi))
@@ -131,6 +142,10 @@ class SwerveDrive(object):
 
         err = target_angle - hdg
 
+        settled = self.turn_settle.update(
+            math.degrees(err), rate=math.degrees(rate)
+        )
+
         if err < 0:
             rate *= -1
 
@@ -147,10 +162,11 @@ class SwerveDrive(object):
             else:
                 spd = max_wheel_speed
 
-        if math.degrees(abs(err)) < tol:
+        # once within tolerance, stop and wait for the robot to settle.
+        if settled or self.turn_settle.error <= self.turn_settle.tolerance:
             for module in self.modules:
                 module.set_drive_speed(0, True)
-            return True
+            return settled
 
         a = -1 * (self.length / self.radius)
         b = (self.length / self.radius)
@@ -168,6 +184,29 @@ class SwerveDrive(object):
 
         return False
 
+    def load_turn_settle_config(self):
+        """
+        Load the settings that decide when :meth:`turn_to_angle` is done
+        from Preferences:
+
+        - 'Turn Error Tolerance': the largest acceptable heading error, in
+          degrees.
+        - 'Turn Rate Tolerance': the fastest the robot can still be turning,
+          in degrees per second.
+        - 'Turn Settle Time': how long both have to stay within tolerance, in
+          seconds.
+        - 'Turn Timeout': how long to try turning before giving up, in
+          seconds.
+        """
+        prefs = wpilib.Preferences.getInstance()
+
+        self.turn_settle.tolerance = prefs.getFloat('Turn Error Tolerance', 1)
+        self.turn_settle.rate_tolerance = prefs.getFloat(
+            'Turn Rate Tolerance', 15
+        )
+        self.turn_settle.dwell_time = prefs.getFloat('Turn Settle Time', 0.1)
+        self.turn_settle.timeout = prefs.getFloat('Turn Timeout', 3)
+
     def set_all_module_angles(self, angle_rad):
         for module in self.modules:
             module.set_steer_angle(angle_rad)
@@ -189,6 +228,50 @@ class SwerveDrive(object):
             module.set_steer_angle(angle_rad)
             module.set_drive_distance(dist_ticks)
 
+    def set_module_outputs(self, angles, percent_outputs):
+        """
+        Steer each module to its own angle and drive it at its own percent
+        output.
+
+        Args:
+            angles: the angle to steer each module to, in radians.
+            percent_outputs: the percent output to drive each module at.
+        """
+        for module, angle, output in zip(
+            self.modules, angles, percent_outputs
+        ):
+            module.set_drive_percent_out(float(output))
+            module.set_steer_angle(float(angle))
+
+    def get_drive_positions(self):
+        """
+        Get the drive encoder position of each module, in native units.
+
+        These count in the direction the drive motor turns, so modules with
+        reversed drive motors count down as they roll forwards (see
+        :meth:`get_drive_signs`).
+        """
+        # (the selected sensor is sent every 20ms; the raw quadrature
+        # position only every 160ms.)
+        return [
+            module.drive_talon.getSelectedSensorPosition(0)
+            for module in self.modules
+        ]
+
+    def get_steer_angles(self):
+        """
+        Get the current steering angle of each module, in radians.
+        """
+        return [module.get_steer_angle() for module in self.modules]
+
+    def get_drive_signs(self):
+        """
+        Get the direction each module's drive encoder counts in when its
+        wheel rolls towards its steering angle: -1 for modules with reversed
+        drive motors, and 1 for the rest.
+        """
+        return [-1 if module.drive_reversed else 1 for module in self.modules]
+
     def get_module_distances(self):
         return [
             abs(module.drive_talon.getQuadraturePosition())
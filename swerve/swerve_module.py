@@ -145,7 +145,7 @@ class SwerveModule(object):
         Get the current angular position of the swerve module in
         radians.
         """
-        native_units = self.steer_talon.getSelectedSensorPosition()
+        native_units = self.steer_talon.getSelectedSensorPosition(0)
         native_units -= self.steer_offset
 
         # Position in rotations
@@ -4,6 +4,7 @@ Contains functions for teleop logic.
 import wpilib
 import numpy as np
 import constants
+from macro import MacroRecorder, MacroPlayer
 from robotpy_ext.control.button_debouncer import ButtonDebouncer
 
 
@@ -26,11 +27,28 @@ class Teleop:
         self.low_speed_button = ButtonDebouncer(self.stick, 9)
         self.high_speed_button = ButtonDebouncer(self.stick, 10)
 
+        # Latest shaped outputs sent to the drivetrain, lift and claw, in the
+        # channel order used by macro.CHANNELS.
+        self.control_outputs = np.zeros(6)
+
+        self.macro = None
+        self.macro_recorder = MacroRecorder()
+        self.macro_player = None
+        self.macro_playing = False
+
     def update_smart_dashboard(self):
         wpilib.SmartDashboard.putBoolean(
             'FOC Enabled', self.foc_enabled
         )
 
+        wpilib.SmartDashboard.putBoolean(
+            'Macro Recording', self.macro_recorder.recording
+        )
+
+        wpilib.SmartDashboard.putBoolean(
+            'Macro Playing', self.macro_playing
+        )
+
     def buttons(self):
         if self.robot.imu.is_present():
             if self.zero_yaw_button.get():
@@ -43,7 +61,63 @@ class Teleop:
             current_camera = (self.prefs.getInt('Selected Camera', 0) + 1) % 2
             self.prefs.putInt('Selected Camera', current_camera)
 
+    def play_macro(self):
+        """
+        Play back the last recorded macro while button 8 is held.
+
+        Once the macro finishes (or the button is released), control is
+        returned to the driver.
+        """
+        if self.macro is None or not self.stick.getRawButton(8):
+            self.macro_player = None
+            self.macro_playing = False
+            return
+
+        now = wpilib.Timer.getFPGATimestamp()
+        if self.macro_player is None:
+            self.macro_player = MacroPlayer(self.macro, now)
+
+        outputs = self.macro_player.sample(now)
+        if outputs is None:
+            self.macro_playing = False
+            return
+
+        self.macro_playing = True
+
+        self.robot.drivetrain.drive(
+            float(outputs[0]),
+            float(outputs[1]),
+            float(outputs[2]),
+            max_wheel_speed=float(outputs[3])
+        )
+        self.robot.lift.setLiftPower(float(outputs[4]))
+        self.robot.claw.set_power(float(outputs[5]))
+
+    def record_macro(self):
+        """
+        Record the control outputs applied this loop while button 7 is held.
+        The recording replaces the stored macro when the button is released.
+        """
+        recorder = self.macro_recorder
+
+        if self.stick.getRawButton(7) and not self.macro_playing:
+            now = wpilib.Timer.getFPGATimestamp()
+            if not recorder.recording:
+                recorder.start(now)
+
+            # the lift output last set this loop, which may be from climbing
+            # (see winch_control) rather than lift_control.
+            self.control_outputs[4] = self.robot.lift.requested_power
+            recorder.record(now, self.control_outputs)
+        elif recorder.recording:
+            samples = recorder.stop()
+            if samples is not None:
+                self.macro = samples
+
     def lift_control(self):
+        if self.macro_playing:
+            return
+
         liftPct = self.throttle.getRawAxis(constants.liftAxis)
 
         if self.throttle.getRawButton(5):
@@ -54,17 +128,23 @@ class Teleop:
         if constants.liftInv:
             liftPct *= -1
 
+        # hold the lift up against gravity, whatever the stick is doing.
+        hold = float(self.robot.lift.hold_power())
+
         if abs(liftPct) < constants.lift_deadband:
-            self.robot.lift.setLiftPower(self.robot.lift.sustain)
+            self.robot.lift.setLiftPower(hold)
             return
 
-        liftPct *= constants.lift_coeff
+        liftPct = liftPct * constants.lift_coeff + hold
 
         wpilib.SmartDashboard.putNumber("Lift Power", liftPct)
 
         self.robot.lift.setLiftPower(liftPct)
 
     def claw_control(self):
+        if self.macro_playing:
+            return
+
         clawPct = self.throttle.getRawAxis(constants.clawAxis)
 
         if constants.clawInv:
@@ -74,7 +154,11 @@ class Teleop:
         # negative = out
         if abs(clawPct) < constants.claw_deadband:
             if self.claw_const_pressure_active:
-                clawPct = .05
+                # hold the cube with the claw's grip current loop (see
+                # lift.Claw.update()).
+                self.robot.claw.grip()
+                self.control_outputs[5] = self.robot.claw.applied_power
+                return
             else:
                 clawPct = 0
         else:
@@ -88,25 +172,17 @@ class Teleop:
         else:
             clawPct *= constants.claw_out_coeff
 
+        self.control_outputs[5] = clawPct
         self.robot.claw.set_power(clawPct)
 
     def winch_control(self):
-        # if self.throttle.getRawButton(1):
-        #     if (
-        #         abs(self.robot.winch.talon.getSelectedSensorPosition(0))
-        #         < abs(constants.winch_slack)
-        #     ):
-        #         self.robot.winch.forward()
-        #         self.robot.lift.setLiftPower(0)
-        #     else:
-        #         self.robot.winch.forward()
-        #         self.robot.lift.setLiftPower(constants.sync_power)
-        # elif self.throttle.getRawButton(3):
-        #     self.robot.winch.forward()
-        # elif self.throttle.getRawButton(2):
-        #     self.robot.winch.reverse()
-        # else:
-        #     self.robot.winch.stop()
+        # Hold button 1 to climb, running the winch and lift together (see
+        # winch.climb).
+        if self.throttle.getRawButton(1):
+            self.robot.climb.update()
+            return
+
+        self.robot.climb.stop()
 
         if self.throttle.getRawButton(3):
             self.robot.winch.forward()
@@ -123,6 +199,8 @@ class Teleop:
         """
         Drive the robot directly using a joystick.
         """
+        if self.macro_playing:
+            return
 
         ctrl = np.array([
             self.stick.getRawAxis(1),
@@ -183,16 +261,23 @@ class Teleop:
             elif self.high_speed_button.get():
                 speed_coefficient = 1
 
-            self.robot.drivetrain.drive(
+            self.control_outputs[:4] = [
                 ctrl[0] * speed_coefficient,
                 ctrl[1] * speed_coefficient,
                 tw * speed_coefficient,
-                max_wheel_speed=constants.teleop_speed
-            )
+                constants.teleop_speed
+            ]
         else:
-            self.robot.drivetrain.drive(
+            self.control_outputs[:4] = [
                 self.last_applied_control[0],
                 self.last_applied_control[1],
                 self.last_applied_control[2],
-                max_wheel_speed=0
-            )
+                0
+            ]
+
+        self.robot.drivetrain.drive(
+            self.control_outputs[0],
+            self.control_outputs[1],
+            self.control_outputs[2],
+            max_wheel_speed=self.control_outputs[3]
+        )
@@ -0,0 +1,443 @@
+"""
+Per-tick cost benchmarks for the robot's periodic code paths.
+
+Each benchmark builds the robot against the simulated HAL, runs a code path
+many times (advancing simulated time between calls so that timers and state
+machines progress), and compares the median wall-clock cost per call against
+the baseline stored in ``benchmark_baseline.json``. A benchmark fails if its
+median is more than ``BENCHMARK_THRESHOLD`` (default 1.0, i.e. twice as slow)
+above its baseline.
+
+To make results comparable between machines (and between runs on a busy
+machine), a fixed reference workload is timed in between the benchmarked
+calls, and the baseline is scaled by how much slower or faster the reference
+workload ran than when the baseline was recorded.
+
+To record new baselines, for example after an intentional change or on new
+hardware, run::
+
+    BENCHMARK_UPDATE=1 python robot.py test -- -k benchmark
+
+``BENCHMARK_ITERATIONS`` scales the number of iterations of every benchmark.
+"""
+import importlib
+import json
+import math
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pytest
+
+import constants
+
+baseline_file = os.path.join(
+    os.path.dirname(__file__), 'benchmark_baseline.json'
+)
+
+threshold = float(os.environ.get('BENCHMARK_THRESHOLD', 1.0))
+update_baselines = bool(os.environ.get('BENCHMARK_UPDATE'))
+iteration_scale = float(os.environ.get('BENCHMARK_ITERATIONS', 1.0))
+
+#: Fraction of iterations discarded as warm-up.
+warmup_fraction = 0.1
+
+autonomous_modules = ('baseline_simple', 'fsm_auto', 'pathfinder_auto')
+
+#: Maximum median time ``autonomousInit`` may take, in seconds, once
+#: autonomous has been prepared while disabled. This is not scaled by the
+#: reference workload: it is time taken out of the match.
+autonomous_init_budget = 0.005
+
+#: Maximum median time to plan a path around the field, in seconds. Paths
+#: are planned at the start of autonomous, so this is not scaled either.
+path_planning_budget = 0.010
+
+
+def load_baselines():
+    if not os.path.exists(baseline_file):
+        return {}
+
+    with open(baseline_file) as fp:
+        return json.load(fp)
+
+
+def save_baseline(name, result):
+    baselines = load_baselines()
+    baselines[name] = result
+
+    with open(baseline_file, 'w') as fp:
+        json.dump(baselines, fp, indent=4, sort_keys=True)
+        fp.write('\n')
+
+
+def reference_workload():
+    # A fixed mix of pure-Python arithmetic and small NumPy operations,
+    # roughly like the robot code.
+    total = 0
+    for i in range(500):
+        total += math.sin(i) * i
+
+    vec = np.arange(16, dtype=np.float64)
+    for _ in range(20):
+        total += float(np.dot(vec, vec))
+
+    return total
+
+
+def time_calls(fake_time, fn, iterations, step=0.02, reference_every=10):
+    """
+    Time repeated calls to ``fn``, advancing simulated time by ``step``
+    seconds between calls, and timing :func:`reference_workload` after every
+    ``reference_every`` calls.
+
+    Returns:
+        A tuple of arrays ``(durations, reference_durations)``, in seconds,
+        with warm-up calls removed.
+    """
+    iterations = max(int(iterations * iteration_scale), 10)
+    durations = np.empty(iterations)
+    reference = np.empty(iterations // reference_every)
+
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations[i] = time.perf_counter() - start
+
+        if step > 0:
+            fake_time.increment_time_by(step)
+
+        if (i + 1) % reference_every == 0:
+            start = time.perf_counter()
+            reference_workload()
+            reference[i // reference_every] = time.perf_counter() - start
+
+    return (
+        durations[int(iterations * warmup_fraction):],
+        reference[int(reference.size * warmup_fraction):],
+    )
+
+
+def check_benchmark(name, timings):
+    """
+    Compare benchmark results (as returned by :func:`time_calls`) against the
+    stored baseline, or store them as the new baseline if
+    ``BENCHMARK_UPDATE`` is set.
+    """
+    durations, reference = timings
+    result = {
+        'median_us': float(np.median(durations) * 1e6),
+        'p95_us': float(np.percentile(durations, 95) * 1e6),
+        'reference_us': float(np.median(reference) * 1e6),
+        'iterations': int(durations.size),
+    }
+
+    print('{}: median {:.1f} us, p95 {:.1f} us, reference {:.1f} us'.format(
+        name, result['median_us'], result['p95_us'], result['reference_us']
+    ))
+
+    if update_baselines:
+        save_baseline(name, result)
+        return
+
+    baseline = load_baselines().get(name)
+    if baseline is None:
+        warnings.warn('No benchmark baseline recorded for ' + name)
+        return
+
+    # Scale the baseline by how much faster or slower this machine is right
+    # now than when the baseline was recorded.
+    scale = result['reference_us'] / baseline['reference_us']
+    expected = baseline['median_us'] * scale
+    limit = expected * (1 + threshold)
+
+    assert result['median_us'] <= limit, (
+        '{} regressed: median {:.1f} us, baseline {:.1f} us scaled to '
+        '{:.1f} us by reference workload (limit {:.1f} us)'.format(
+            name, result['median_us'], baseline['median_us'], expected, limit
+        )
+    )
+
+
+@pytest.fixture()
+def quiet_robot(robot, monkeypatch):
+    # Robot code prints every caught exception; that is not what is being
+    # measured here.
+    robot_module = sys.modules[type(robot).__module__]
+    monkeypatch.setattr(robot_module, 'log', lambda src, msg: None)
+
+    robot.robotInit()
+    return robot
+
+
+def test_disabled_periodic(quiet_robot, control, fake_time):
+    control.set_autonomous(False)
+    quiet_robot.disabledInit()
+
+    timings = time_calls(fake_time, quiet_robot.disabledPeriodic, 2000)
+    check_benchmark('disabledPeriodic', timings)
+
+
+def test_teleop_periodic(quiet_robot, control, fake_time):
+    control.set_operator_control(True)
+    quiet_robot.teleopInit()
+
+    timings = time_calls(fake_time, quiet_robot.teleopPeriodic, 2000)
+    check_benchmark('teleopPeriodic', timings)
+
+
+def use_autonomous(robot, module_name, monkeypatch):
+    auto_module = importlib.import_module('autonomous.' + module_name)
+    robot_module = sys.modules[type(robot).__module__]
+    monkeypatch.setattr(robot_module, 'Autonomous', auto_module.Autonomous)
+
+
+@pytest.mark.parametrize('module_name', autonomous_modules)
+def test_autonomous_periodic(
+    module_name, quiet_robot, control, fake_time, monkeypatch
+):
+    use_autonomous(quiet_robot, module_name, monkeypatch)
+
+    quiet_robot.autoPositionSelect.tableSelected.setString('Left')
+    control.game_specific_message = 'LRL'
+    control.set_autonomous(True)
+    quiet_robot.autonomousInit()
+
+    timings = time_calls(fake_time, quiet_robot.autonomousPeriodic, 750)
+    check_benchmark('autonomousPeriodic[{}]'.format(module_name), timings)
+
+
+@pytest.mark.parametrize('module_name', autonomous_modules)
+def test_autonomous_init_latency(
+    module_name, quiet_robot, control, fake_time, monkeypatch
+):
+    use_autonomous(quiet_robot, module_name, monkeypatch)
+
+    quiet_robot.autoPositionSelect.tableSelected.setString('Middle-Placement')
+    control.game_specific_message = 'LRL'
+    control.set_autonomous(False)
+    quiet_robot.disabledInit()
+    quiet_robot.disabledPeriodic()
+
+    # Let the simulated Driver Station deliver the game data, so that routines
+    # which use it are timed choosing their path too.
+    control.set_autonomous(True)
+    fake_time.increment_time_by(0.02)
+
+    durations = np.empty(20)
+    for i in range(durations.size):
+        start = time.perf_counter()
+        quiet_robot.autonomousInit()
+        durations[i] = time.perf_counter() - start
+
+    median = float(np.median(durations))
+    print('autonomousInit[{}]: median {:.2f} ms, max {:.2f} ms'.format(
+        module_name, median * 1e3, durations.max() * 1e3
+    ))
+
+    assert median <= autonomous_init_budget, (
+        'autonomousInit[{}] took {:.2f} ms (budget {:.2f} ms)'.format(
+            module_name, median * 1e3, autonomous_init_budget * 1e3
+        )
+    )
+
+
+def test_swerve_drive(quiet_robot, fake_time):
+    drivetrain = quiet_robot.drivetrain
+    inputs = np.random.RandomState(0).uniform(-1, 1, (64, 3))
+    state = {'i': 0}
+
+    def drive():
+        fwd, strafe, rcw = inputs[state['i'] % len(inputs)]
+        drivetrain.drive(fwd, strafe, rcw)
+        state['i'] += 1
+
+    timings = time_calls(fake_time, drive, 5000, step=0)
+    check_benchmark('SwerveDrive.drive', timings)
+
+
+def test_swerve_module_set_steer_angle(quiet_robot, fake_time):
+    module = quiet_robot.drivetrain.modules[0]
+    angles = np.linspace(-math.pi, math.pi, 64)
+    state = {'i': 0}
+
+    def set_steer_angle():
+        module.set_steer_angle(angles[state['i'] % len(angles)])
+        state['i'] += 1
+
+    timings = time_calls(fake_time, set_steer_angle, 5000, step=0)
+    check_benchmark('SwerveModule.set_steer_angle', timings)
+
+
+def test_teleop_drive(quiet_robot, control, fake_time):
+    control.set_operator_control(True)
+    quiet_robot.teleopInit()
+
+    timings = time_calls(fake_time, quiet_robot.teleop.drive, 5000, step=0)
+    check_benchmark('Teleop.drive', timings)
+
+
+@pytest.fixture(scope='module')
+def left_route():
+    from autonomous import pathfinder_auto
+
+    pathfinder_auto.prepare_route('left')
+    return pathfinder_auto.module_trajectories('left')
+
+
+def test_encoder_followers(left_route):
+    import pathfinder as pf
+    from pathfinder.followers import EncoderFollower
+
+    followers = []
+    for i in range(left_route.shape[1]):
+        follower = EncoderFollower([
+            pf.Segment(*row) for row in left_route[:, i].tolist()
+        ])
+        follower.configureEncoder(0, int(80 * 6.67), 4 * 0.0254)
+        follower.configurePIDVA(1.0, 0.0, 0.0, 0.5, 0)
+        followers.append(follower)
+
+    ticks = np.random.RandomState(0).randint(0, 5000, (64, 4)).tolist()
+    state = {'i': 0}
+
+    def calculate():
+        for follower, tick in zip(followers, ticks[state['i'] % 64]):
+            if follower.isFinished():
+                follower.reset()
+
+            follower.calculate(tick)
+            follower.getHeading()
+
+        state['i'] += 1
+
+    timings = time_calls(None, calculate, 5000, step=0)
+    check_benchmark('EncoderFollower x4', timings)
+
+
+def test_swerve_follower(left_route):
+    from autonomous.swerve_follower import SwerveFollower
+
+    follower = SwerveFollower(left_route, int(80 * 6.67), 4 * 0.0254)
+    follower.configure_pidva(1.0, 0.0, 0.0, 0.5, 0)
+
+    ticks = np.random.RandomState(0).randint(0, 5000, (64, 4)).tolist()
+    state = {'i': 0}
+
+    def calculate():
+        if follower.finished:
+            follower.reset()
+
+        follower.calculate(ticks[state['i'] % 64])
+        state['i'] += 1
+
+    timings = time_calls(None, calculate, 5000, step=0)
+    check_benchmark('SwerveFollower.calculate', timings)
+
+
+def test_swerve_follower_time_indexed(left_route):
+    from autonomous.swerve_follower import SwerveFollower
+
+    follower = SwerveFollower(left_route, int(80 * 6.67), 4 * 0.0254)
+    follower.configure_pidva(1.0, 0.0, 0.0, 0.5, 0)
+
+    ticks = np.random.RandomState(0).randint(0, 5000, (64, 4)).tolist()
+    times = np.random.RandomState(1).uniform(
+        0, follower.duration, 64
+    ).tolist()
+    state = {'i': 0}
+
+    def calculate():
+        i = state['i'] % 64
+        follower.calculate_at(times[i], ticks[i])
+        state['i'] += 1
+
+    timings = time_calls(None, calculate, 5000, step=0)
+    check_benchmark('SwerveFollower.calculate_at', timings)
+
+
+def test_holonomic_follower():
+    from autonomous import pathfinder_auto
+    from autonomous.holonomic_follower import HolonomicFollower
+
+    pathfinder_auto.prepare_route('left')
+    follower = HolonomicFollower(
+        pathfinder_auto.path_trajectory('left'), 2.2, 7.0
+    )
+    follower.configure_translation_pid(2.0, 0.0, 0.1)
+    follower.configure_heading_pid(3.0, 0.0, 0.1)
+
+    rng = np.random.RandomState(0)
+    poses = rng.uniform(-1, 1, (64, 3)).tolist()
+    times = np.sort(rng.uniform(0, follower.duration, 64)).tolist()
+    state = {'i': 0}
+
+    def calculate():
+        i = state['i'] % 64
+        if i == 0:
+            follower.reset()
+
+        follower.calculate(times[i], poses[i])
+        state['i'] += 1
+
+    timings = time_calls(None, calculate, 5000, step=0)
+    check_benchmark('HolonomicFollower.calculate', timings)
+
+
+def test_path_planner():
+    from autonomous import fsm_auto, path_planner
+
+    planner = path_planner.PathPlanner()
+    queries = [
+        (start, target)
+        for start in (
+            fsm_auto.start_pos_left, fsm_auto.start_pos_middle,
+            fsm_auto.start_pos_right
+        )
+        for target in sorted(path_planner.targets)
+    ]
+    state = {'i': 0}
+
+    def plan():
+        planner.plan_to_target(*queries[state['i'] % len(queries)])
+        state['i'] += 1
+
+    timings = time_calls(None, plan, 500, step=0)
+    check_benchmark('PathPlanner.plan_to_target', timings)
+
+    median = float(np.median(timings[0]))
+    assert median <= path_planning_budget, (
+        'Path planning took {:.2f} ms (budget {:.2f} ms)'.format(
+            median * 1e3, path_planning_budget * 1e3
+        )
+    )
+
+
+def test_spline_trajectory_generate():
+    from autonomous import pathfinder_auto, spline_trajectory
+
+    route = pathfinder_auto.routes['left']
+    timings = time_calls(None, lambda: spline_trajectory.generate(
+        route.waypoints, route.dt,
+        route.max_velocity, route.max_acceleration, route.max_jerk
+    ), 200, step=0)
+    check_benchmark('spline_trajectory.generate', timings)
+
+
+def test_pathfinder_generate():
+    from autonomous import pathfinder_auto, trajectory_store
+
+    route = pathfinder_auto.routes['left']._replace(fit='hermite_quintic')
+    timings = time_calls(
+        None, lambda: trajectory_store.generate(route), 200, step=0
+    )
+    check_benchmark('pathfinder.generate', timings)
+
+
+def test_load_control_config(quiet_robot, fake_time):
+    timings = time_calls(
+        fake_time, constants.load_control_config, 5000, step=0
+    )
+    check_benchmark('constants.load_control_config', timings)
@@ -0,0 +1,64 @@
+"""
+CAN bus traffic budget tests.
+
+These run the robot in simulation with :mod:`can_monitor` counting every
+Talon SRX call, and fail if the estimated bus utilization or the number of
+one-shot parameter frames sent per loop goes over budget.
+"""
+import pytest
+import wpilib
+
+#: Budgets for each mode, as (maximum average estimated bus utilization,
+#: maximum average one-shot parameter frames per loop).
+budgets = {
+    'disabled': (0.75, 20),
+    'autonomous': (0.90, 40),
+    'teleop': (0.90, 40),
+}
+
+#: Number of loops to run each mode for.
+loops = 250
+
+
+@pytest.fixture()
+def monitored_robot(robot):
+    # The monitor is off unless asked for.
+    prefs = wpilib.Preferences.getInstance()
+    prefs.putBoolean('CAN Monitor', True)
+    yield robot
+
+    prefs.putBoolean('CAN Monitor', False)
+    if robot.can_monitor is not None:
+        robot.can_monitor.uninstall()
+
+
+def run_mode(control, mode):
+    state = {'loops': 0}
+
+    def on_step(tm):
+        if mode == 'autonomous':
+            control.set_autonomous(True)
+        elif mode == 'teleop':
+            control.set_operator_control(True)
+        else:
+            control.set_autonomous(False)
+
+        state['loops'] += 1
+        return state['loops'] < loops
+
+    control.game_specific_message = 'LRL'
+    control.run_test(on_step)
+
+
+@pytest.mark.parametrize('mode', sorted(budgets))
+def test_can_traffic_budget(mode, control, monitored_robot):
+    utilization_budget, param_frame_budget = budgets[mode]
+    run_mode(control, mode)
+
+    monitor = monitored_robot.can_monitor
+    report = monitor.report()
+    print(mode, report)
+
+    assert monitor.loops > 0
+    assert monitor.average_utilization <= utilization_budget, report
+    assert monitor.average_param_frames <= param_frame_budget, report
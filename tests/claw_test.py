@@ -0,0 +1,98 @@
+"""
+Tests for claw cube detection and grip control.
+"""
+import wpilib
+
+
+class ClawAuto(object):
+    # Closes the claw on a cube, holds it, then opens it again.
+    open_time = 2
+
+    def __init__(self, robot, position):
+        self.robot = robot
+        self.log = []
+
+    def update_smart_dashboard(self):
+        pass
+
+    def periodic(self):
+        now = wpilib.Timer.getFPGATimestamp()
+        if not self.log:
+            self.start = now
+            self.robot.claw.close()
+
+        t = now - self.start
+        if t >= self.open_time:
+            self.robot.claw.open()
+
+        claw = self.robot.claw
+        self.log.append((
+            t, claw.state, claw.talon.getOutputCurrent(), claw.applied_power
+        ))
+
+
+def run_claw(robot, simulate, model):
+    # open, with a cube between the jaws (any further and it falls out).
+    model.opening = model.cube_release_opening - 0.05
+    jaws = []
+
+    def on_step(tm):
+        auto = getattr(robot, 'auto', None)
+        if auto is not None and auto.log:
+            jaws.append((auto.log[-1][0], model.opening, model.has_cube))
+
+    simulate(3, [model], ClawAuto, on_step)
+    return robot.auto.log, jaws
+
+
+def first_stall(log, claw, start):
+    # when the jaws first stalled after a move started at ``start``.
+    return min(
+        t for t, _, current, _ in log
+        if t >= start + claw.inrush_time and current >= claw.detect_current
+    )
+
+
+def test_closes_on_cube(robot, simulate, claw_model):
+    log, jaws = run_claw(robot, simulate, claw_model)
+    claw = robot.claw
+
+    # the grip is detected as soon as the jaws stall on the cube, rather
+    # than after a fixed closing time.
+    stall = first_stall(log, claw, 0)
+    closed = [t for t, state, _, _ in log if state == 'closed']
+    assert closed and closed[0] - stall < 0.1
+    assert closed[0] < claw.claw_movement_time
+    assert all(cube for t, _, cube in jaws if t < ClawAuto.open_time)
+
+    # and held with the grip current, not a fixed output...
+    holding = [
+        (current, power) for t, state, current, power in log
+        if state == 'closed' and closed[0] + 1 < t < ClawAuto.open_time
+    ]
+    assert holding
+    assert all(
+        abs(current - claw.grip_current) < 0.5 for current, _ in holding
+    )
+
+    # ...squeezing no harder than the fixed output used to.
+    assert all(0 < power <= 0.05 for _, power in holding)
+    assert not claw.protection.stalled
+
+
+def test_opens_until_stop(robot, simulate, claw_model):
+    log, jaws = run_claw(robot, simulate, claw_model)
+    claw = robot.claw
+
+    # the claw stops driving open once the jaws reach the open stop.
+    stall = first_stall(log, claw, ClawAuto.open_time)
+    neutral = [
+        t for t, state, _, _ in log
+        if state == 'neutral' and t > ClawAuto.open_time
+    ]
+    opened = [t for t, opening, _ in jaws if opening >= 1 and t > stall - 1]
+    assert neutral and opened
+    assert opened[0] <= neutral[0] < stall + 0.1
+    assert neutral[0] - ClawAuto.open_time < claw.claw_movement_time
+    assert not jaws[-1][2]
+    assert log[-1][3] == 0
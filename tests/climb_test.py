@@ -0,0 +1,86 @@
+"""
+Tests for the coordinated winch and lift climb.
+"""
+import wpilib
+
+import constants
+
+
+class ClimbAuto(object):
+    # Raises the lift to hook onto the bar, then climbs.
+    hook_height = 30
+
+    def __init__(self, robot, position):
+        self.robot = robot
+        self.climb_start = None
+        self.log = []
+
+    def update_smart_dashboard(self):
+        pass
+
+    def periodic(self):
+        robot = self.robot
+        now = wpilib.Timer.getFPGATimestamp()
+
+        if self.climb_start is None:
+            robot.lift.set_height(self.hook_height)
+            if not robot.lift.at_target():
+                return
+            self.climb_start = now
+
+        robot.climb.update()
+        self.log.append((
+            now - self.climb_start, robot.climb.phase,
+            robot.winch.get_position(), robot.lift.get_height(),
+            robot.winch.applied_power
+        ))
+
+
+def test_climb(robot, simulate, lift_model, winch_model):
+    model = winch_model
+    simulate(12, [lift_model, winch_model], ClimbAuto)
+    log = robot.auto.log
+    climb = robot.climb
+    slack = constants.winch_slack
+
+    # the phases change with the winch position.
+    phases = [phase for _, phase, _, _, _ in log]
+    assert phases[0] == 'slack' and phases[-1] == 'done'
+    assert all(
+        (phase == 'slack') == (position < slack)
+        for _, phase, position, _, _ in log if phase != 'done'
+    )
+
+    # the lift lowers as the winch takes up the slack, and is at the bottom
+    # by the time the winch takes the robot's weight.
+    for _, phase, position, height, _ in log:
+        if phase == 'slack':
+            expected = ClimbAuto.hook_height * (1 - position / slack)
+            assert abs(height - expected) < climb.max_lift_lag
+    climbing = [height for _, phase, _, height, _ in log if phase == 'climb']
+    assert climbing and max(climbing) < climb.max_lift_lag
+    assert min(climbing) < 1
+
+    # then the winch stops, with the robot up.
+    done = [t for t, phase, _, _, _ in log if phase == 'done']
+    assert done[0] < 5
+    assert log[-1][2] >= slack + climb.climb_distance
+    assert model.climb_height > 0
+    assert log[-1][4] == 0
+    assert not climb.stalled
+
+
+def test_climb_stall(robot, simulate, lift_model, winch_model):
+    # too heavy to lift: the winch stalls as soon as it takes the weight.
+    winch_model.climb_load = 1.2
+    simulate(12, [lift_model, winch_model], ClimbAuto)
+    log = robot.auto.log
+    climb = robot.climb
+
+    climbing = [t for t, phase, _, _, _ in log if phase == 'climb']
+    done = [t for t, phase, _, _, _ in log if phase == 'done']
+    assert climbing and done
+    assert done[0] - climbing[0] < 1
+    assert climb.stalled
+    assert log[-1][2] < constants.winch_slack + climb.climb_distance
+    assert log[-1][4] == 0
@@ -0,0 +1,69 @@
+"""
+Fixtures for running the robot code against the simulated mechanisms.
+"""
+import sys
+
+import pytest
+
+import constants
+from simulation import ClawModel, LiftModel, WinchModel
+
+
+@pytest.fixture()
+def simulate(robot, control, hal_data, monkeypatch):
+    """
+    Run the robot, stepping simulated mechanisms along with it (pyfrc's test
+    clock doesn't run physics).
+
+    Returns a function ``simulate(duration, models=(), autonomous=None,
+    on_step=None)``, which runs the robot for ``duration`` seconds:
+
+    - ``models`` are stepped every robot loop, with the same
+      ``update(hal_data, dt, enabled)`` call the physics engine makes.
+    - If ``autonomous`` is given, it replaces the robot's ``Autonomous``
+      class, and the robot runs in autonomous mode.
+    - ``on_step(tm)`` is called every loop, after the models are stepped, to
+      set inputs or log what the robot is doing; returning True from it ends
+      the run early.
+    """
+    robot_module = sys.modules[type(robot).__module__]
+
+    def run(duration, models=(), autonomous=None, on_step=None):
+        if autonomous is not None:
+            monkeypatch.setattr(robot_module, 'Autonomous', autonomous)
+        last = [0]
+
+        def step(tm):
+            if autonomous is not None:
+                control.set_autonomous(True)
+
+            enabled = hal_data['control']['enabled']
+            for model in models:
+                model.update(hal_data, tm - last[0], enabled)
+            last[0] = tm
+
+            if on_step is not None and on_step(tm):
+                return False
+            return tm < duration
+
+        control.run_test(step)
+
+    return run
+
+
+@pytest.fixture()
+def lift_model():
+    return LiftModel(
+        constants.lift_ids['left'], constants.lift_ids['right'],
+        constants.lift_limit_channel, constants.start_limit_channel
+    )
+
+
+@pytest.fixture()
+def claw_model():
+    return ClawModel(constants.claw_id, constants.claw_follower_id)
+
+
+@pytest.fixture()
+def winch_model():
+    return WinchModel(constants.winch_id, constants.winch_slack)
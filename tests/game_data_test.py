@@ -0,0 +1,73 @@
+"""
+Tests for the non-blocking game data service.
+"""
+import pytest
+
+from autonomous import game_data
+from autonomous.game_data import GameData
+
+
+class DriverStation(object):
+    def __init__(self):
+        self.message = ''
+
+    def getGameSpecificMessage(self):
+        return self.message
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('LRL', 'LRL'),
+    ('rlr', 'RLR'),
+    (b'LLR', 'LLR'),
+    (' RRL\n', 'RRL'),
+    ('', None),
+    (None, None),
+    ('LR', None),
+    ('LXR', None),
+])
+def test_parse(message, expected):
+    assert game_data.parse(message) == expected
+
+
+def test_callbacks_called_once_when_data_arrives():
+    ds = DriverStation()
+    data = GameData(ds)
+    calls = []
+
+    data.when_available(lambda d: calls.append(d.message))
+    assert not data.poll()
+    assert calls == []
+    assert data.switch is None
+
+    ds.message = 'RLR'
+    assert data.poll()
+    assert data.poll()
+    assert calls == ['RLR']
+    assert (data.switch, data.scale, data.far_switch) == ('R', 'L', 'R')
+    assert data.received_time is not None
+
+    # Already available: called immediately.
+    data.when_available(lambda d: calls.append('late'))
+    assert calls == ['RLR', 'late']
+
+
+def test_cancel_and_stale_data():
+    ds = DriverStation()
+    data = GameData(ds)
+    calls = []
+
+    ds.message = 'LLL'
+    data.poll()
+
+    # Cleared between matches.
+    ds.message = ''
+    assert not data.poll()
+    assert data.message is None
+
+    callback = calls.append
+    data.when_available(callback)
+    data.cancel(callback)
+
+    ds.message = 'RRR'
+    data.poll()
+    assert calls == []
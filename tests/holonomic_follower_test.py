@@ -0,0 +1,147 @@
+"""
+Tests for swerve odometry and the holonomic trajectory follower.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from autonomous import holonomic_follower, spline_trajectory
+from autonomous.holonomic_follower import HolonomicFollower, heading_profile
+from swerve.odometry import SwerveOdometry, chassis_displacement
+
+# 1 tick per meter
+ticks_per_revolution = 100
+wheel_diameter = 100 / math.pi
+
+
+def make_trajectory():
+    return spline_trajectory.generate(
+        [(0, 0, 0), (2, 1, 0)], 0.02, 1.5, 2.0, 60.0
+    )
+
+
+def test_pure_rotation_cancels():
+    # Modules at the corners of a square, steered tangent to a circle
+    # around the center (front right, front left, back right, back left).
+    angles = [3 * math.pi / 4, math.pi / 4, -3 * math.pi / 4, -math.pi / 4]
+    forward, right = chassis_displacement(angles, [0.1] * 4)
+
+    assert forward == pytest.approx(0, abs=1e-12)
+    assert right == pytest.approx(0, abs=1e-12)
+
+
+def test_odometry_translation():
+    odometry = SwerveOdometry(
+        ticks_per_revolution, wheel_diameter, [1, -1, 1, -1]
+    )
+
+    # The first update only takes the starting sensor readings.
+    assert odometry.update(0.5, [0] * 4, [10, 10, 10, 10]) == (0, 0, 0)
+
+    x, y, heading = odometry.update(0.5, [0] * 4, [12, 8, 12, 8])
+    assert (x, y, heading) == pytest.approx((2, 0, 0))
+
+    # Strafe right, while facing 90 degrees clockwise from the start.
+    x, y, heading = odometry.update(
+        0.5 + math.pi / 2, [math.pi / 2] * 4, [13, 7, 13, 7]
+    )
+    assert heading == pytest.approx(math.pi / 2)
+    assert x == pytest.approx(2 - math.sqrt(0.5))
+    assert y == pytest.approx(math.sqrt(0.5))
+
+
+def test_odometry_reset():
+    odometry = SwerveOdometry(ticks_per_revolution, wheel_diameter)
+    odometry.update(0, [0] * 4, [0] * 4)
+    odometry.update(0, [0] * 4, [5] * 4)
+
+    # Resetting the encoders along with the odometry doesn't count as
+    # moving backwards.
+    odometry.reset(*odometry.pose)
+    odometry.update(0, [0] * 4, [0] * 4)
+    assert odometry.update(0, [0] * 4, [1] * 4) == pytest.approx((6, 0, 0))
+
+
+def test_heading_profile():
+    trajectory = make_trajectory()
+    headings = heading_profile(trajectory, 0.1, 2 * math.pi - 0.1)
+
+    assert headings[0] == pytest.approx(0.1)
+    assert headings[-1] == pytest.approx(-0.1)
+    assert np.all(np.diff(headings) <= 1e-12)
+
+
+def test_feedforward_on_path():
+    trajectory = make_trajectory()
+    follower = HolonomicFollower(trajectory, 2.0, 4.0)
+    follower.configure_translation_pid(2.0, 0, 0)
+
+    t = follower.duration / 2
+    x, y, heading, vx, vy, omega = follower.sample(t)
+    forward, strafe, rotate = follower.calculate(t, (x, y, 0))
+
+    assert forward == pytest.approx(vx / 2.0)
+    assert strafe == pytest.approx(vy / 2.0)
+    assert rotate == pytest.approx(0)
+
+
+def test_chassis_frame():
+    trajectory = make_trajectory()
+    follower = HolonomicFollower(trajectory, 1.0, 1.0)
+    follower.configure_translation_pid(1.0, 0, 0)
+    follower.configure_heading_pid(1.0, 0, 0)
+
+    # Past the end of the trajectory, only feedback is applied. Facing 90
+    # degrees clockwise, a target straight ahead on the field is to the
+    # robot's left.
+    end = follower.sample(follower.duration)
+    forward, strafe, rotate = follower.calculate(
+        follower.duration + 1, (end[0] - 1, end[1], math.pi / 2)
+    )
+
+    assert forward == pytest.approx(0, abs=1e-12)
+    assert strafe == pytest.approx(-1)
+    assert rotate == pytest.approx(
+        holonomic_follower.rotate_direction * -math.pi / 2
+    )
+
+
+def test_closed_loop_tracking():
+    trajectory = make_trajectory()
+    headings = heading_profile(trajectory, 0, math.pi / 2)
+
+    max_velocity, max_angular_velocity = 2.0, 4.0
+    follower = HolonomicFollower(
+        trajectory, max_velocity, max_angular_velocity, headings
+    )
+    follower.configure_translation_pid(3.0, 0, 0)
+    follower.configure_heading_pid(4.0, 0, 0)
+
+    # Start a little off the path, and drive a perfect chassis.
+    x, y, heading = 0.1, -0.1, 0.2
+    dt = 0.02
+    worst = 0
+    for step in range(int((follower.duration + 1) / dt)):
+        t = step * dt
+        forward, strafe, rotate = follower.calculate(t, (x, y, heading))
+
+        forward *= max_velocity
+        strafe *= max_velocity
+        omega = (
+            holonomic_follower.rotate_direction * rotate
+            * max_angular_velocity
+        )
+
+        x += (forward * math.cos(heading) - strafe * math.sin(heading)) * dt
+        y += (forward * math.sin(heading) + strafe * math.cos(heading)) * dt
+        heading += omega * dt
+
+        if t > 1:
+            worst = max(worst, math.hypot(*follower.error[:2]))
+
+    end = follower.sample(follower.duration)
+    assert worst < 0.05
+    assert (x, y) == pytest.approx((end[0], end[1]), abs=0.01)
+    assert heading == pytest.approx(math.pi / 2, abs=0.01)
+    assert follower.settled(0.01, 0.01)
@@ -0,0 +1,332 @@
+"""
+Tests for lift height control.
+"""
+import math
+
+import numpy as np
+import pytest
+import wpilib
+
+import constants
+from lift import ManualControlLift, RD4BLift, feedforward, kinematics
+from lift.kinematics import LiftKinematics
+from lift.motion_profile import TrapezoidalProfile
+from simulation import LiftModel
+
+
+def sample_profile(profile, dt=0.01):
+    t = 0
+    samples = []
+    while t < profile.duration + dt:
+        samples.append(profile.sample(t))
+        t += dt
+    return samples
+
+
+def test_trapezoid():
+    profile = TrapezoidalProfile(0, 100, 20, 10)
+    # 2s accelerating, 3s cruising, 2s decelerating.
+    assert profile.duration == pytest.approx(7)
+    assert profile.sample(1) == pytest.approx((5, 10, 10))
+    assert profile.sample(3.5) == pytest.approx((50, 20, 0))
+    assert profile.sample(6) == pytest.approx((95, 10, -10))
+    assert profile.sample(7) == (100, 0, 0)
+    assert profile.sample(-1) == (0, 0, 0)
+
+    samples = sample_profile(profile)
+    assert max(abs(v) for _, v, _ in samples) <= 20
+    assert all(
+        b[0] >= a[0] for a, b in zip(samples, samples[1:])
+    )
+
+
+def test_triangle_in_negative_direction():
+    profile = TrapezoidalProfile(0, -10, 20, 10)
+    # too short to reach full speed: accelerate to 10 and straight back.
+    assert profile.duration == pytest.approx(2)
+    assert profile.sample(0.5) == pytest.approx((-1.25, -5, -10))
+    assert profile.sample(1.5) == pytest.approx((-8.75, -5, 10))
+    assert profile.finished(2)
+    assert not profile.finished(1.9)
+
+
+def test_start_velocity():
+    # already moving towards the goal: no overshoot, and smooth.
+    profile = TrapezoidalProfile(0, 100, 20, 10, start_velocity=15)
+    assert profile.sample(0)[1] == 15
+    assert profile.sample(0.01)[1] == pytest.approx(15.1)
+    assert max(p for p, _, _ in sample_profile(profile)) <= 100 + 1e-9
+
+    # moving away from the goal: turn around first.
+    profile = TrapezoidalProfile(0, 100, 20, 10, start_velocity=-10)
+    assert profile.sample(1) == pytest.approx((-5, 0, 10))
+    assert profile.sample(profile.duration) == (100, 0, 0)
+
+    # too fast to stop in time: brake harder, but stop at the goal.
+    profile = TrapezoidalProfile(0, 5, 20, 10, start_velocity=20)
+    assert profile.duration == pytest.approx(0.5)
+    samples = sample_profile(profile, 0.001)
+    assert max(p for p, _, _ in samples) <= 5 + 1e-9
+
+    with pytest.raises(ValueError):
+        TrapezoidalProfile(0, 1, 0, 10)
+
+
+def test_height_conversion(robot):
+    robot.robotInit()
+    lift = robot.lift
+
+    assert lift.height_to_position(0) == pytest.approx(0)
+    assert lift.position_to_height(0) == pytest.approx(0)
+
+    # the lift rises as the encoder counts down.
+    for height in (6, 30, 60):
+        position = lift.height_to_position(height)
+        assert position < 0
+        assert lift.position_to_height(position) == pytest.approx(height)
+
+
+def test_kinematics_tables():
+    k = LiftKinematics(30, 512 / math.pi, 100)
+
+    # matches the exact equations, thousands of points at a time.
+    angles = np.linspace(k.bottom_angle, k.top_angle, 5000)
+    heights = 60 * (np.sin(angles) - math.sin(k.bottom_angle))
+    positions = 100 + angles * 512 / math.pi
+
+    assert np.allclose(k.height(positions), heights, atol=1e-3)
+    assert np.allclose(k.position(heights), positions, atol=1e-2)
+    assert np.allclose(k.angle(heights), angles, atol=1e-4)
+    assert np.allclose(
+        k.mechanical_advantage(heights), 60 * np.cos(angles), atol=1e-3
+    )
+
+    assert k.height(100) == pytest.approx(60 * -math.sin(k.bottom_angle))
+    assert k.max_height == pytest.approx(120 * math.sin(k.top_angle))
+
+    # out of reach heights are clamped to the ends of the lift's travel.
+    assert k.position(-5) == pytest.approx(k.positions[0])
+    assert k.position(500) == pytest.approx(k.positions[-1])
+
+
+def test_kinematics_counting_down():
+    k = LiftKinematics(30, -100)
+    positions = np.linspace(k.positions[-1], k.positions[0], 100)
+    heights = k.height(positions)
+
+    assert np.all(np.diff(heights) < 0)
+    assert np.allclose(k.position(heights), positions)
+
+    with pytest.raises(ValueError):
+        LiftKinematics(30, 100, bottom_angle=0.5, top_angle=0.5)
+
+
+def test_kinematics_from_limits():
+    k = kinematics.from_limits(30, 512 / math.pi, 100, 100 - 256)
+    assert k.bottom_angle == pytest.approx(-math.pi / 2)
+    assert k.top_angle == pytest.approx(math.pi / 2)
+
+    k = kinematics.from_limits(30, 512 / math.pi, 100, 100 - 128, 100 + 128)
+    assert k.top_angle == pytest.approx(math.pi / 4)
+    assert k.max_height == pytest.approx(120 * math.sin(math.pi / 4))
+
+
+def test_geometry_from_preferences(robot, control):
+    # the robot code and the simulated lift both use the measured geometry.
+    prefs = wpilib.Preferences.getInstance()
+    prefs.putFloat("Lift: Units Per Radian", -600)
+    prefs.putFloat("Lift: Horizontal Position", -300)
+    prefs.putInt("Lift: Upper Limit", -900)
+
+    try:
+        control.run_test(lambda tm: False)
+        model = LiftModel(
+            constants.lift_ids['left'], constants.lift_ids['right'],
+            constants.lift_limit_channel, constants.start_limit_channel
+        )
+
+        for k in (robot.lift.kinematics, model.kinematics):
+            assert k.bottom_angle == pytest.approx(-0.5)
+            assert k.top_angle == pytest.approx(1)
+            assert k.position(0) == pytest.approx(0)
+
+        assert model.min_angle == pytest.approx(-0.5)
+        assert model.max_angle == pytest.approx(1)
+        model.theta = 0
+        assert model.encoder_position == pytest.approx(-300)
+        assert model.height == pytest.approx(60 * math.sin(0.5))
+    finally:
+        for key in (
+            "Lift: Units Per Radian", "Lift: Horizontal Position",
+            "Lift: Upper Limit"
+        ):
+            prefs.remove(key)
+
+    # without them, the defaults are used.
+    k = ManualControlLift.load_kinematics()
+    assert k.bottom_angle == pytest.approx(math.radians(-40))
+    assert k.top_angle == pytest.approx(math.radians(40))
+
+
+def test_rd4b_lift_height(robot):
+    from hal_impl.data import hal_data
+
+    robot.robotInit()
+    prefs = wpilib.Preferences.getInstance()
+    prefs.putFloat("lift potentiometer horizontal angle", 300)
+    prefs.putFloat("lift potentiometer base angle", 300 - 128)
+    prefs.putFloat("lift limit up", 300 + 128)
+
+    rd4b = RD4BLift(50, 51)
+
+    # the arms are horizontal, halfway up.
+    hal_data['CAN'][50]['analog_position'] = 300
+    assert rd4b.getHeight() == pytest.approx(60 * math.sin(math.pi / 4))
+
+    rd4b.set_height(60 * math.sin(math.pi / 4))
+    assert rd4b.setpoint == pytest.approx(300)
+
+
+class HeightAuto(object):
+    # Runs the lift up to a height, then back down a bit.
+    heights = [(0, 30), (3, 12)]
+
+    def __init__(self, robot, position):
+        self.robot = robot
+        self.log = []
+
+    def update_smart_dashboard(self):
+        pass
+
+    def periodic(self):
+        now = wpilib.Timer.getFPGATimestamp()
+        if not self.log:
+            self.start = now
+
+        t = now - self.start
+        for start, height in self.heights:
+            if t >= start:
+                target = height
+        self.robot.lift.set_height(target)
+
+        self.log.append((
+            t, target, self.robot.lift.get_height(),
+            self.robot.lift.at_target()
+        ))
+
+
+def test_runs_to_height(robot, simulate, lift_model):
+    simulate(6, [lift_model], HeightAuto)
+    log = robot.auto.log
+
+    # Up to the switch height, without overshooting.
+    rising = [entry for entry in log if entry[0] < 3]
+    assert max(height for _, _, height, _ in rising) < 30.5
+    arrived = [t for t, _, _, at_target in rising if at_target]
+    assert arrived and arrived[0] < 2
+    assert all(abs(height - 30) < 1 for t, _, height, _ in rising
+               if t >= arrived[0])
+
+    # and back down, holding there.
+    falling = [entry for entry in log if entry[0] >= 3]
+    assert min(height for _, _, height, _ in falling) > 11.5
+    assert falling[-1][3]
+    assert falling[-1][2] == pytest.approx(12, abs=1)
+
+    # manual control takes over again.
+    robot.lift.setLiftPower(0)
+    assert not robot.lift.at_target()
+
+
+def test_gravity_feedforward_table():
+    table = feedforward.parse_text('6: -0.07, 30: -0.09, 66: -0.06')
+    assert table(18) == pytest.approx(-0.08)
+    assert table(0) == pytest.approx(-0.07)
+    assert table(100) == pytest.approx(-0.06)
+    assert feedforward.parse_text(table.to_text()).outputs.tolist() == [
+        -0.07, -0.09, -0.06
+    ]
+
+    for bad in ('', '6 -0.07', '30: -0.09, 6: -0.07', 'x: 1'):
+        with pytest.raises(ValueError):
+            feedforward.parse_text(bad)
+
+
+def test_gravity_calibration(robot, control, simulate, lift_model):
+    model = lift_model
+
+    def on_step(tm):
+        control.set_test_mode(True)
+
+        calibration = getattr(robot, 'lift_calibration', None)
+        return calibration and calibration.finished
+
+    simulate(90, [model], on_step=on_step)
+    calibration = robot.lift_calibration
+    assert calibration.finished
+
+    # matches the simulated lift's gravity load and friction.
+    kinematics = robot.lift.kinematics
+    for height, output, friction in zip(
+        calibration.heights, calibration.outputs, calibration.friction
+    ):
+        gravity = model.gravity_load * math.cos(kinematics.angle(height))
+        assert output == pytest.approx(-gravity, abs=0.01)
+        # (the lift has to move a little before the ramp notices.)
+        assert model.friction <= friction < model.friction + 0.025
+
+    # and is saved for next time.
+    prefs = wpilib.Preferences.getInstance()
+    saved = feedforward.parse_text(prefs.getString(
+        "Lift: Gravity Feedforward", ''
+    ))
+    assert saved(30) == pytest.approx(calibration.table(30), abs=1e-3)
+    assert robot.lift.hold_power(30) == calibration.table(30)
+
+
+class StallAuto(object):
+    # Drives the lift into its top hard stop, and keeps pushing.
+    def __init__(self, robot, position):
+        self.robot = robot
+        self.log = []
+
+    def update_smart_dashboard(self):
+        pass
+
+    def periodic(self):
+        self.robot.lift.setLiftPower(-1)
+
+
+def test_stall_protection(robot, simulate, lift_model):
+    model = lift_model
+    log = []
+
+    def on_step(tm):
+        lift = getattr(robot, 'lift', None)
+        if lift is not None:
+            log.append((
+                tm, model.theta, lift.applied_power, lift.protection.stalled,
+                float(lift.hold_power())
+            ))
+
+    simulate(3, [model], StallAuto, on_step)
+
+    # the stall is caught soon after the lift reaches the top...
+    top = [tm for tm, theta, _, _, _ in log if theta >= model.max_angle]
+    stalled = [tm for tm, _, _, s, _ in log if s]
+    assert top and stalled
+    assert 0 < stalled[0] - top[0] < 0.4
+
+    # ...and the motors are cut back to holding the lift up, though they're
+    # still being asked for full power.
+    cooling = [entry for entry in log if entry[3]]
+    assert all(
+        power == pytest.approx(hold) for _, _, power, _, hold in cooling
+    )
+    assert robot.lift.requested_power == -1
+
+    # so the lift stays at the top, rather than dropping.
+    assert all(
+        theta == pytest.approx(model.max_angle, abs=0.005)
+        for tm, theta, _, _, _ in log if tm >= top[0]
+    )
@@ -0,0 +1,163 @@
+"""
+Tests for driver macro recording and playback.
+"""
+import numpy as np
+import pytest
+
+import constants
+from macro import CHANNELS, MacroPlayer, MacroRecorder
+
+
+def outputs(value):
+    return [value] * len(CHANNELS)
+
+
+def test_recording_grows_buffer():
+    recorder = MacroRecorder(capacity=4)
+
+    # not recording yet: ignored.
+    recorder.record(0, outputs(9))
+
+    recorder.start(10)
+    for i in range(10):
+        recorder.record(10 + i * 0.02, outputs(i))
+
+    samples = recorder.stop()
+    assert not recorder.recording
+    assert samples.shape == (10, len(CHANNELS) + 1)
+    assert samples.dtype == np.float32
+    np.testing.assert_allclose(samples[:, 0], np.arange(10) * 0.02, atol=1e-5)
+    np.testing.assert_array_equal(
+        samples[:, 1:], np.repeat(np.arange(10), len(CHANNELS)).reshape(
+            10, len(CHANNELS)
+        )
+    )
+
+    # a new recording starts from scratch.
+    recorder.start(20)
+    recorder.record(20, outputs(1))
+    recorder.record(20.5, outputs(2))
+    samples = recorder.stop()
+    assert samples.shape[0] == 2
+    assert samples[1, 0] == pytest.approx(0.5)
+
+
+def test_too_short_to_play():
+    recorder = MacroRecorder()
+
+    recorder.start(0)
+    assert recorder.stop() is None
+
+    recorder.start(0)
+    recorder.record(0, outputs(1))
+    assert recorder.stop() is None
+
+
+def test_playback_interpolates_by_time():
+    # unevenly spaced samples, as from a robot loop running late.
+    recorder = MacroRecorder()
+    recorder.start(0)
+    for t, value in ((0, 0), (0.1, 1), (0.4, 4), (0.5, -1)):
+        recorder.record(t, outputs(value))
+
+    player = MacroPlayer(recorder.stop(), 100)
+    assert player.duration == pytest.approx(0.5)
+
+    assert player.sample(100) == pytest.approx(outputs(0))
+    assert player.sample(100.05) == pytest.approx(outputs(0.5))
+    assert player.sample(100.25) == pytest.approx(outputs(2.5))
+    assert player.sample(100.45) == pytest.approx(outputs(1.5))
+
+    # before it starts, the first sample; once it's over, nothing.
+    assert player.sample(99) == pytest.approx(outputs(0))
+    assert player.sample(100.5) is None
+    assert player.sample(200) is None
+
+
+def test_teleop_macro(robot, control, hal_data):
+    # record a second of driving the lift, then play it back.
+    stick = hal_data['joysticks'][0]
+    throttle = hal_data['joysticks'][1]
+    log = []
+
+    def on_step(tm):
+        control.set_operator_control(enabled=True)
+
+        recording = 1 <= tm < 2
+        stick['buttons'][7] = recording
+        throttle['axes'][constants.liftAxis] = 0.5 if recording else 0
+
+        # released part way through, then held past the end.
+        stick['buttons'][8] = 2.5 <= tm < 2.75 or 3.5 <= tm < 5.5
+
+        teleop = getattr(robot, 'teleop', None)
+        if teleop is not None:
+            log.append((
+                tm, teleop.macro_playing, robot.lift.requested_power,
+                float(robot.lift.hold_power())
+            ))
+        return tm < 6
+
+    control.run_test(on_step)
+
+    macro = robot.teleop.macro
+    assert macro is not None
+    assert macro[-1, 0] == pytest.approx(1, abs=0.05)
+    recorded_lift = macro[:, 1 + CHANNELS.index('lift')]
+    assert np.all(recorded_lift == recorded_lift[0])
+
+    def playing(start, end):
+        return [
+            (is_playing, power, hold) for tm, is_playing, power, hold in log
+            if start < tm < end
+        ]
+
+    # the macro drives the lift while the button is held...
+    assert all(
+        is_playing and power == pytest.approx(recorded_lift[0])
+        for is_playing, power, _ in playing(2.55, 2.75)
+    )
+    assert all(
+        is_playing for is_playing, _, _ in playing(3.55, 4.45)
+    )
+
+    # ...and the driver gets it back when the button is released, or the
+    # macro ends with it still held.
+    for start, end in ((2.8, 3.5), (4.6, 5.5)):
+        steps = playing(start, end)
+        assert steps
+        assert all(
+            not is_playing and power == pytest.approx(hold)
+            for is_playing, power, hold in steps
+        )
+
+
+def test_macro_records_climb(robot, control, simulate, hal_data, lift_model,
+                             winch_model):
+    # record while climbing, with the lift stick pushed up: the climb drives
+    # the lift, so that's what the macro should play back.
+    stick = hal_data['joysticks'][0]
+    throttle = hal_data['joysticks'][1]
+    log = []
+
+    def on_step(tm):
+        control.set_operator_control(enabled=True)
+        throttle['buttons'][1] = True
+        throttle['axes'][constants.liftAxis] = -1
+        stick['buttons'][7] = 0.2 <= tm < 1.2
+
+        # (the outputs from the last robot loop.)
+        teleop = getattr(robot, 'teleop', None)
+        if teleop is not None and teleop.macro_recorder.recording:
+            log.append(robot.lift.requested_power)
+
+    simulate(1.5, [lift_model, winch_model], on_step=on_step)
+
+    recorded_lift = robot.teleop.macro[:, 1 + CHANNELS.index('lift')]
+    np.testing.assert_allclose(recorded_lift, log, atol=1e-6)
+
+    # holding the lift while taking up the slack, then pulling it down:
+    # never raising it, as the stick would have.
+    assert recorded_lift[0] == pytest.approx(robot.lift.sustain)
+    assert recorded_lift[-1] == pytest.approx(constants.sync_power)
+    assert np.all(recorded_lift > robot.lift.sustain - 0.01)
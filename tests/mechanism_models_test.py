@@ -0,0 +1,228 @@
+"""
+Tests for the simulated lift, claw and winch.
+"""
+import pytest
+from ctre.talonsrx import TalonSRX
+
+import constants
+from simulation import ClawModel, LiftModel, WinchModel
+
+ControlMode = TalonSRX.ControlMode
+
+
+def make_hal_data(*talon_ids):
+    # just the fields the models read.
+    return {
+        'CAN': {
+            talon_id: {
+                'control_mode': ControlMode.PercentOutput, 'value': 0,
+                'pulse_width_position': 0, 'quad_position': 0,
+            } for talon_id in talon_ids
+        },
+        'dio': [{'value': True} for _ in range(10)],
+    }
+
+
+def run(model, hal_data, duration, dt=0.01):
+    for _ in range(int(round(duration / dt))):
+        model.update(hal_data, dt)
+
+
+def make_lift():
+    lift_ids = constants.lift_ids['left'], constants.lift_ids['right']
+    model = LiftModel(
+        lift_ids[0], lift_ids[1],
+        constants.lift_limit_channel, constants.start_limit_channel
+    )
+    return model, make_hal_data(*lift_ids)
+
+
+def lift_switches(hal_data):
+    # (bottom, start position) limit switches, as pressed or not.
+    dio = hal_data['dio']
+    return (
+        not dio[constants.lift_limit_channel]['value'],
+        not dio[constants.start_limit_channel]['value'],
+    )
+
+
+def test_lift_limit_switches():
+    model, hal_data = make_lift()
+    main = hal_data['CAN'][model.main_id]
+
+    # starts at the bottom.
+    model.update(hal_data, 0.01)
+    assert lift_switches(hal_data) == (True, False)
+    assert model.height == 0
+
+    # drive it all the way up, watching the switches on the way.
+    main['value'] = -1
+    log = []
+    for _ in range(400):
+        model.update(hal_data, 0.01)
+        log.append((model.theta, model.height, lift_switches(hal_data)))
+
+    for theta, height, (bottom, start) in log:
+        assert bottom == (theta <= model.min_angle + 1e-3)
+        assert start == (
+            model.start_switch_height
+            <= height <= model.start_switch_height + model.start_switch_travel
+        )
+    assert any(start for _, _, (_, start) in log)
+    assert not log[-1][2][0]
+
+    # stopped by the hard stop at the top.
+    assert model.theta == model.max_angle
+    assert model.omega == 0
+    assert model.height == pytest.approx(model.kinematics.max_height)
+
+    # the encoder counts down as the lift rises.
+    assert main['pulse_width_position'] == pytest.approx(
+        model.kinematics.position(model.height), abs=1
+    )
+    assert main['pulse_width_position'] < 0
+
+
+def test_lift_sags_under_gravity():
+    model, hal_data = make_lift()
+    main = hal_data['CAN'][model.main_id]
+
+    # arms horizontal, where gravity pulls hardest.
+    model.theta = 0
+    run(model, hal_data, 0.5)
+    assert model.theta < 0
+    assert model.omega < 0
+
+    run(model, hal_data, 20)
+    assert model.theta == model.min_angle
+    assert lift_switches(hal_data)[0]
+
+    # but the sustain output holds it still.
+    model.theta = 0
+    model.omega = 0
+    main['value'] = -0.08
+    run(model, hal_data, 2)
+    assert model.theta == 0
+
+    # and the motors are disabled with the robot.
+    main['value'] = -1
+    for _ in range(50):
+        model.update(hal_data, 0.01, enabled=False)
+    assert model.theta < 0
+
+
+def make_claw(has_cube=True):
+    model = ClawModel(
+        constants.claw_id, constants.claw_follower_id, has_cube=has_cube
+    )
+    hal_data = make_hal_data(constants.claw_id, constants.claw_follower_id)
+    return model, hal_data, hal_data['CAN'][constants.claw_id]
+
+
+def test_claw_grips_cube():
+    model, hal_data, talon = make_claw()
+
+    talon['value'] = 1
+    run(model, hal_data, 0.5)
+
+    # stalled against the cube, with the reverse limit switch closed.
+    assert model.opening == model.cube_grip_opening
+    assert model.has_cube
+    assert talon['limit_switch_closed_rev']
+    assert not talon['limit_switch_closed_for']
+    assert talon['output_current'] == pytest.approx(
+        model.free_current + model.stall_current
+    )
+
+
+def test_claw_releases_cube():
+    model, hal_data, talon = make_claw()
+
+    talon['value'] = -1
+    log = []
+    for _ in range(100):
+        model.update(hal_data, 0.01)
+        log.append((
+            model.opening, model.has_cube, talon['limit_switch_closed_for']
+        ))
+
+    # the cube drops out part way, and the jaws open to the stop.
+    for opening, has_cube, fully_open in log:
+        if opening >= model.cube_release_opening:
+            assert not has_cube
+        assert fully_open == (opening >= 1)
+    assert log[-1] == (1, False, True)
+    assert not talon['limit_switch_closed_rev']
+
+    # with no cube, they close all the way, without the grip switch.
+    talon['value'] = 1
+    run(model, hal_data, 1)
+    assert model.opening == 0
+    assert not talon['limit_switch_closed_rev']
+    assert not talon['limit_switch_closed_for']
+
+
+def make_winch():
+    model = WinchModel(constants.winch_id, constants.winch_slack)
+    hal_data = make_hal_data(constants.winch_id)
+    return model, hal_data, hal_data['CAN'][constants.winch_id]
+
+
+def test_winch_tracks_output():
+    model, hal_data, talon = make_winch()
+
+    # reeling in the slack at full and half output.
+    for output in (1, 0.5):
+        model.position = 0
+        model.velocity = 0
+        talon['value'] = output
+        run(model, hal_data, 0.5)
+
+        speed = model.free_speed * (output - model.friction)
+        assert model.velocity == pytest.approx(speed, rel=0.01)
+        # (less the time getting up to speed.)
+        assert model.position == pytest.approx(
+            speed * 10 * (0.5 - model.time_constant), rel=0.02
+        )
+        assert model.climb_height == 0
+
+    # reading the encoder, including after robot code resets it.
+    assert talon['quad_position'] == int(model.position)
+    assert talon['quad_velocity'] == int(round(model.velocity))
+    talon['quad_position'] = 0
+    position = model.position
+    talon['value'] = 0
+    run(model, hal_data, 1)
+    assert talon['quad_position'] == int(model.position - position)
+
+    # driving out unwinds it.
+    talon['value'] = -1
+    before = model.position
+    run(model, hal_data, 0.2)
+    assert model.position < before
+
+
+def test_winch_lifts_robot():
+    model, hal_data, talon = make_winch()
+    model.position = model.slack
+
+    talon['value'] = 1
+    run(model, hal_data, 1)
+
+    # slowed by the robot's weight.
+    speed = model.free_speed * (1 - model.climb_load - model.friction)
+    assert model.velocity == pytest.approx(speed, rel=0.01)
+    assert model.climb_height == pytest.approx(
+        (model.position - model.slack) / model.ticks_per_inch
+    )
+    assert model.climb_height > 0
+
+    # and holds the robot up with the motor off, since the gearbox can't be
+    # backdriven.
+    talon['value'] = 0
+    run(model, hal_data, 0.5)
+    height = model.climb_height
+    run(model, hal_data, 2)
+    assert model.climb_height == height > 0
+    assert model.velocity == 0
+    assert talon['quad_velocity'] == 0
@@ -0,0 +1,52 @@
+"""
+Tests for the Monte Carlo evaluation.
+"""
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from simulation import monte_carlo, runner
+
+SCENARIOS = [runner.Scenario('Left', 'LRL', 'baseline_simple', 15)]
+
+
+@pytest.fixture(autouse=True)
+def spawn_workers(monkeypatch):
+    # Forked workers would start with the WPILib state of the robot under
+    # test here, so start fresh ones, like runner_test does.
+    monkeypatch.setattr(
+        monte_carlo, 'multiprocessing', multiprocessing.get_context('spawn')
+    )
+
+
+def test_seeded_run():
+    params, nominal, results = monte_carlo.run(SCENARIOS, 2, seed=1234)
+
+    assert params.shape == (1, 2, len(monte_carlo.PARAMETERS))
+    for i, (_, low, high) in enumerate(monte_carlo.PARAMETER_RANGES):
+        assert np.all((low <= params[..., i]) & (params[..., i] <= high))
+
+    assert [r.scenario for r in nominal] == SCENARIOS
+    assert [[r.scenario for r in row] for row in results] == [SCENARIOS * 2]
+    for result in nominal + results[0]:
+        assert result.faults == []
+
+    summary = monte_carlo.summarize(params, nominal, results)
+    assert summary['placed'].shape == (1, 2)
+    assert summary['pose_error'].shape == (1, 2, 3)
+    # (the perturbed robots end up somewhere else.)
+    assert np.all(np.abs(summary['pose_error'][..., :2]).sum(axis=-1) > 0)
+    assert summary['success_rate'].shape == (1,)
+    assert summary['distance_percentiles'].shape == (1, 3)
+    assert summary['sensitivity'].shape == (len(monte_carlo.PARAMETERS), 2)
+    assert monte_carlo.format_summary(SCENARIOS, summary)
+
+    # the same seed gives the same samples, and the same outcomes.
+    again = monte_carlo.run(SCENARIOS, 2, seed=1234)
+    np.testing.assert_array_equal(again[0], params)
+    assert again[1] == nominal
+    assert again[2] == results
+
+    other = monte_carlo.run(SCENARIOS, 2, seed=4321)
+    assert not np.array_equal(other[0], params)
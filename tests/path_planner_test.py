@@ -0,0 +1,98 @@
+"""
+Tests for the field path planner.
+"""
+
+import numpy as np
+import pytest
+
+from autonomous import fsm_auto, path_planner
+from autonomous.path_planner import (
+    PathPlanner, points_in_boxes, segments_hit_boxes
+)
+
+starts = [
+    fsm_auto.start_pos_left, fsm_auto.start_pos_middle,
+    fsm_auto.start_pos_right,
+]
+
+
+def path_length(start, waypoints):
+    points = np.vstack(([start], waypoints))
+    return float(np.sum(np.hypot(*np.diff(points, axis=0).T)))
+
+
+def test_segments_hit_boxes():
+    boxes = np.array([(0, 0, 10, 10)], dtype=np.float64)
+    hits = segments_hit_boxes(
+        [(-5, 5), (-5, 0), (-5, -5), (5, 5), (-5, 20), (5, -5)],
+        [(15, 5), (15, 0), (15, 15), (6, 6), (20, 15), (5, -1)],
+        boxes
+    )
+
+    # Through the middle, along an edge, through a corner diagonally,
+    # entirely inside, missing, and stopping short.
+    assert hits[:, 0].tolist() == [True, False, True, True, False, False]
+
+
+@pytest.mark.parametrize('target', sorted(path_planner.targets))
+@pytest.mark.parametrize('start', range(len(starts)))
+def test_paths_are_clear(start, target):
+    planner = PathPlanner()
+    start = starts[start]
+    waypoints, target_point = planner.plan_to_target(start, target)
+
+    approach, expected_target = path_planner.targets[target]
+    np.testing.assert_allclose(waypoints[-1], approach)
+    np.testing.assert_allclose(target_point, expected_target)
+
+    points = np.vstack(([start], waypoints))
+    assert not np.any(
+        segments_hit_boxes(points[:-1], points[1:], planner.boxes)
+    )
+    assert np.all(planner.on_field(points))
+    assert not np.any(points_in_boxes(points, planner.boxes))
+
+
+def test_no_longer_than_hand_written_paths():
+    planner = PathPlanner()
+    for start, target, path in (
+        (fsm_auto.start_pos_middle, 'left-switch', 'direct-left'),
+        (fsm_auto.start_pos_middle, 'right-switch', 'direct-right'),
+        (fsm_auto.start_pos_left, 'left-switch', 'l-drive-left'),
+    ):
+        waypoints, _ = planner.plan_to_target(start, target)
+        assert path_length(start, waypoints) <= path_length(
+            start, fsm_auto.Autonomous.PATHS[path]
+        ) + 1e-9
+
+
+def test_straight_line_when_clear():
+    waypoints = PathPlanner().plan((30, 30), (120, 290))
+    np.testing.assert_allclose(waypoints, [(120, 290)])
+
+
+def test_blocked_points():
+    planner = PathPlanner()
+    with pytest.raises(ValueError):
+        planner.plan((21.25, 197), (168, 164))
+
+    with pytest.raises(ValueError):
+        planner.plan((0, 0), (168, 48.5))
+
+
+def test_fsm_auto_plans_from_start_position(robot, control, simulate):
+    # with the game data already in when autonomous starts, the path is
+    # planned straight away, from the starting position.
+    control.game_specific_message = 'RLR'
+
+    def on_step(tm):
+        robot.autoPositionSelect.tableSelected.setString('Left')
+        return getattr(robot, 'auto', None) is not None
+
+    simulate(15, autonomous=fsm_auto.Autonomous, on_step=on_step)
+
+    waypoints, target = PathPlanner().plan_to_target(
+        fsm_auto.start_pos_left, 'right-switch'
+    )
+    np.testing.assert_allclose(robot.auto.waypoints, waypoints)
+    np.testing.assert_allclose(robot.auto.target, target)
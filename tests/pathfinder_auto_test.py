@@ -0,0 +1,61 @@
+"""
+Tests for pathfinder_auto's routine.
+"""
+import pytest
+
+import constants
+from autonomous import pathfinder_auto
+
+
+def run_placement(robot, simulate, hal_data, data_time):
+    # place a cube from the middle, with the game data coming in data_time
+    # seconds into autonomous.
+    log = []
+
+    def on_step(tm):
+        robot.autoPositionSelect.tableSelected.setString('Middle-Placement')
+        if tm >= data_time:
+            hal_data['event']['game_specific_message'] = 'LRL'
+
+        if getattr(robot, 'auto', None) is not None:
+            log.append((
+                tm, robot.lift.requested_power, robot.claw.requested_power
+            ))
+
+    simulate(14, autonomous=pathfinder_auto.Autonomous, on_step=on_step)
+    return log
+
+
+def eject_start(log):
+    return next(tm for tm, _, claw in log if claw == -0.5)
+
+
+@pytest.mark.parametrize('data_time', [0, 1])
+def test_lift_raised_before_eject(robot, simulate, hal_data, data_time):
+    log = run_placement(robot, simulate, hal_data, data_time)
+    assert robot.auto.eject_cube
+
+    # the lift is raised to the switch height for 1.5 s, either during the
+    # startup routine or, with the game data too late for that, right
+    # before ejecting.
+    raising = [tm for tm, lift, _ in log if lift == -0.4]
+    assert raising
+    assert raising[-1] - raising[0] == pytest.approx(1.5, abs=0.05)
+
+    start = eject_start(log)
+    assert raising[-1] < start
+    if data_time > 0:
+        assert start - raising[-1] < 0.05
+    else:
+        assert start - raising[-1] > 1
+
+    # and held there while the cube is ejected.
+    assert all(lift == -0.08 for tm, lift, _ in log if tm >= start)
+
+
+def test_stops_at_end_of_route(robot, simulate, hal_data):
+    run_placement(robot, simulate, hal_data, 0)
+    assert robot.auto.traj_finished
+
+    for _, _, drive_id in constants.swerve_config:
+        assert hal_data['CAN'][drive_id]['value'] == 0
@@ -0,0 +1,93 @@
+"""
+Tests for motor stall and overheating protection.
+"""
+import pytest
+import wpilib
+
+from protection import MotorProtection
+
+
+def run(protection, samples, start=0, dt=0.02):
+    # feed (current, velocity, output) samples, one per robot loop.
+    t = start
+    for current, velocity, output in samples:
+        protection.update(current, velocity, output, now=t)
+        t += dt
+    return t
+
+
+def test_stall_detection():
+    p = MotorProtection(stall_current=50, stall_velocity=2, stall_time=0.1)
+
+    # high current while moving isn't a stall.
+    t = run(p, [(80, 30, -1)] * 20)
+    assert not p.stalled
+
+    # nor is high current for less than the stall time.
+    t = run(p, [(80, 0, -1)] * 5, t)
+    assert not p.stalled
+
+    t = run(p, [(80, 0, -1)] * 2, t)
+    assert p.stalled
+    assert p.stall_direction == -1
+    assert p.limit(-1) == 0
+    assert p.max_output == 0
+
+    # backing off is still allowed.
+    assert p.limit(0.5) == 0.5
+
+
+def test_stall_cooldown():
+    p = MotorProtection(
+        stall_current=50, stall_time=0.1, cooldown=0.5, stall_output=0.2
+    )
+    t = run(p, [(80, None, 1)] * 7)
+    assert p.stalled
+    assert p.limit(1) == 0.2
+
+    # with the output limited, the current drops.
+    t = run(p, [(10, None, 1)] * 23, t)
+    assert p.stalled
+    t = run(p, [(10, None, 1)], t)
+    assert not p.stalled
+    assert p.limit(1) == 1
+
+    # still jammed: trips again.
+    run(p, [(80, None, 1)] * 7, t)
+    assert p.stalled
+
+
+def test_thermal_derating():
+    p = MotorProtection(
+        stall_current=200, continuous_current=40, thermal_time_constant=2,
+        derate_start=0.5
+    )
+
+    # at the continuous rating, the motor heats up to a load of 1...
+    run(p, [(40, None, 1)] * 1000)
+    assert p.thermal_load == pytest.approx(1, abs=1e-3)
+    assert p.limit(1) == pytest.approx(0, abs=1e-3)
+
+    # ...and cools down when it stops.
+    run(p, [(0, None, 0)] * 50, 20)
+    assert 0.5 < p.thermal_load < 1
+    assert 0 < p.limit(1) < 1
+    assert p.limit(0.01) == 0.01
+
+    run(p, [(0, None, 0)] * 200, 30)
+    assert p.thermal_load < 0.5
+    assert p.limit(-1) == -1
+
+
+def test_load_config_values(robot):
+    prefs = wpilib.Preferences.getInstance()
+    prefs.putFloat('Test: Stall Current', 12)
+    prefs.putFloat('Test: Stall Velocity', 3)
+
+    p = MotorProtection(stall_current=50)
+    p.heat = 100
+    p.load_config_values('Test')
+    assert p.stall_current == 12
+    assert p.stall_velocity is None  # no velocity sensor.
+    assert p.continuous_current == 40
+    assert p.heat == 100
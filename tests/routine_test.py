@@ -0,0 +1,149 @@
+"""
+Tests for declarative autonomous routines.
+"""
+from autonomous import routine
+from autonomous.routine import (
+    Routine, action, deadline, parallel, race, repeat_until, run, sequence,
+    wait, wait_until
+)
+
+
+class Counter(object):
+    """An action that finishes after being updated a number of times."""
+
+    def __init__(self, log, name, updates):
+        self.log = log
+        self.name = name
+        self.updates = updates
+        self.count = 0
+
+    def update(self):
+        self.count += 1
+        self.log.append(self.name)
+        return self.count >= self.updates
+
+    def end(self, interrupted):
+        self.log.append((self.name, 'interrupted' if interrupted else 'end'))
+
+    def node(self):
+        return action(self.update, end=self.end, name=self.name)
+
+
+def test_sequence_transitions_in_same_loop():
+    log = []
+    a, b = Counter(log, 'a', 2), Counter(log, 'b', 1)
+    r = Routine(sequence(a.node(), run(lambda: log.append('run')), b.node()))
+
+    r.start(0)
+    assert log == ['a']
+    assert r.active_names() == ['a']
+
+    # 'a' finishes, and 'run' and 'b' both start (and 'b' finishes) in the
+    # same loop.
+    assert r.update(0.02)
+    assert log == ['a', 'a', ('a', 'end'), 'run', 'b', ('b', 'end')]
+    assert r.finished
+
+
+def test_flat_layout():
+    r = Routine(sequence(
+        wait(1), parallel(wait(1), sequence(wait(1), wait(1))), wait(1)
+    ))
+
+    assert r.kinds[0] == routine.SEQUENCE
+    assert r.children[0] == (1, 2, 7)
+    assert r.children[2] == (3, 4)
+    assert r.parents[5] == 4
+    assert r.ends == [8, 2, 7, 4, 7, 6, 7, 8]
+
+
+def test_parallel_waits_for_all():
+    log = []
+    a, b = Counter(log, 'a', 1), Counter(log, 'b', 3)
+    r = Routine(parallel(a.node(), b.node()))
+
+    r.start(0)
+    assert r.active_names() == ['b']
+    assert not r.update(0.02)
+    assert r.update(0.04)
+    assert log.count('b') == 3
+
+
+def test_race_interrupts_the_rest():
+    log = []
+    a, b = Counter(log, 'a', 2), Counter(log, 'b', 10)
+    r = Routine(race(a.node(), b.node()))
+
+    r.start(0)
+    assert r.update(0.02)
+    assert ('b', 'interrupted') in log
+    assert r.active_names() == []
+
+
+def test_deadline():
+    log = []
+    main, other = Counter(log, 'main', 3), Counter(log, 'other', 1)
+    lift = Counter(log, 'lift', 10)
+    r = Routine(sequence(
+        deadline(main.node(), other.node(), lift.node()), run(list)
+    ))
+
+    r.start(0)
+    r.update(0.02)
+    assert r.active_names() == ['main', 'lift']
+
+    assert r.update(0.04)
+    assert ('lift', 'interrupted') in log
+    assert ('other', 'end') in log
+
+
+def test_waits():
+    state = {'ready': False}
+    r = Routine(sequence(
+        wait(0.5), wait_until(lambda: state['ready']),
+        wait_until(lambda: False, timeout=1)
+    ))
+
+    r.start(10)
+    assert not r.update(10.4)
+    assert not r.update(10.5)
+
+    state['ready'] = True
+    assert not r.update(10.6)
+    assert not r.update(11.5)
+    assert r.update(11.6)
+
+
+def test_repeat_until():
+    log = []
+    state = {'n': 0}
+
+    def step():
+        state['n'] += 1
+        log.append(state['n'])
+
+    r = Routine(repeat_until(lambda: state['n'] >= 3, run(step)))
+
+    r.start(0)
+    assert log == [1]
+
+    # Each repetition waits for the next loop.
+    assert not r.update(0.02)
+    assert log == [1, 2]
+    assert r.update(0.04)
+    assert log == [1, 2, 3]
+
+
+def test_stop_and_restart():
+    log = []
+    a = Counter(log, 'a', 10)
+    r = Routine(sequence(a.node()))
+
+    r.start(0)
+    r.stop()
+    assert log == ['a', ('a', 'interrupted')]
+    assert not r.running and not r.finished
+
+    r.start(1)
+    assert r.running
+    assert r.active_names() == ['a']
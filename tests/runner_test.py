@@ -0,0 +1,45 @@
+"""
+Tests for the headless simulation runner.
+"""
+import multiprocessing
+import time
+
+from simulation import runner
+
+
+def run_in_worker(scenario):
+    # Runs in a fresh process, like the runner's own workers, since the
+    # robot under test here has already set up WPILib's global state.
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(runner.run_quietly, (scenario,))
+
+
+def test_faster_than_real_time():
+    scenario = runner.Scenario('Left', 'LRL', 'baseline_simple', 15)
+    context = multiprocessing.get_context('spawn')
+
+    with context.Pool(1) as pool:
+        # (starting the worker process isn't counted.)
+        pool.apply(time.monotonic)
+
+        start = time.monotonic()
+        result = pool.apply(runner.run_quietly, (scenario,))
+        elapsed = time.monotonic() - start
+
+    assert result.faults == []
+    assert result.placement_time is not None
+    assert elapsed < scenario.duration / 5
+
+
+def test_pathfinder_auto_follows_route():
+    # every module's encoder feedback has the right sign, so the robot
+    # drives the route to the left switch without turning.
+    result = run_in_worker(
+        runner.Scenario('Middle-Placement', 'LRL', 'pathfinder_auto', 15)
+    )
+
+    assert result.faults == []
+    assert abs(result.heading) < 5
+    assert result.placement_time is not None
+    assert result.y < runner.STARTING_POSES['Middle-Placement'][1] - 5
@@ -0,0 +1,130 @@
+"""
+Tests for the autonomous schedule planner.
+"""
+import ast
+import glob
+import os
+
+import pytest
+
+from autonomous import baseline_simple, pathfinder_auto
+from autonomous import schedule_planner as sp
+from autonomous.schedule_planner import action, plan, sequential
+
+
+def test_independent_actions_run_in_parallel():
+    actions = [
+        action('drive', 3, ['drivetrain']),
+        action('lift', 1, ['lift']),
+        action('eject', 1, ['claw'], after=['drive', 'lift']),
+    ]
+
+    assert sequential(actions).makespan == 5
+
+    schedule = plan(actions)
+    assert schedule.makespan == 4
+    assert schedule.starts == {'drive': 0, 'lift': 0, 'eject': 3}
+    assert schedule.critical_path == ['drive', 'eject']
+
+
+def test_resource_conflicts_are_ordered_optimally():
+    # Both actions need the lift; doing 'b' first lets 'c' start earlier.
+    actions = [
+        action('a', 2, ['lift']),
+        action('b', 1, ['lift']),
+        action('c', 3, ['drivetrain'], after=['b']),
+    ]
+
+    schedule = plan(actions)
+    assert schedule.makespan == 4
+    assert schedule.starts['b'] == 0
+    assert schedule.starts['a'] == 1
+    assert schedule.critical_path == ['b', 'c']
+
+
+def test_invalid_dependencies():
+    with pytest.raises(ValueError):
+        plan([action('a', 1, [], after=['missing'])])
+
+    with pytest.raises(ValueError):
+        plan([
+            action('a', 1, [], after=['b']),
+            action('b', 1, [], after=['a']),
+        ])
+
+
+def test_robot_code_does_not_import_simulation():
+    # the planned timelines run on the robot, so they mustn't depend on the
+    # simulation's models.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for path in glob.glob(os.path.join(root, 'autonomous', '*.py')):
+        with open(path) as f:
+            tree = ast.parse(f.read())
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                names = [node.module or '']
+            else:
+                continue
+            assert not any(
+                name.split('.')[0] == 'simulation' for name in names
+            ), path
+
+
+def test_timelines_split_around_untimed_actions():
+    schedule = plan([
+        action('shake', 2, ['drivetrain'], phases={'speed': 250},
+               end={'speed': 0}),
+        action('route', 4, ['drivetrain'], after=['shake']),
+        action('lift', 1, ['lift'], phases={'lift': -0.5},
+               end={'lift': 0}),
+        action('eject', 1, ['claw'], after=['route', 'lift'],
+               phases={'claw': -0.5}, end={'claw': 0}),
+    ])
+
+    before, after = sp.to_timelines(schedule)
+    assert before.phases == [
+        (1, {'speed': 250, 'lift': -0.5}),
+        (1, {'lift': 0}),
+        (0, {'speed': 0}),
+    ]
+    assert after.phases == [(1, {'claw': -0.5}), (0, {'claw': 0})]
+
+    # a timed action can't run while an untimed one does.
+    schedule = plan([
+        action('route', 4, ['drivetrain']),
+        action('lift', 1, ['lift'], phases={'lift': -0.5}),
+    ])
+    with pytest.raises(ValueError):
+        sp.to_timelines(schedule)
+
+
+def test_autonomous_timelines_match_plan():
+    timelines = sp.to_timelines(
+        plan(sp.baseline_actions()), sp.baseline_final
+    )
+    assert [t.phases for t in timelines] == [
+        baseline_simple.baseline_timeline.phases
+    ]
+
+    # The trajectory's duration doesn't change the timelines.
+    startup, eject = sp.to_timelines(
+        plan(sp.pathfinder_actions('left', 3))
+    )
+    assert startup.phases == pathfinder_auto.placement_startup_timeline.phases
+    assert eject.phases == pathfinder_auto.eject_timeline.phases
+
+    # With the game data arriving late, the lift is raised after the route.
+    startup, eject = sp.to_timelines(
+        plan(sp.pathfinder_actions('left', 3, late=True))
+    )
+    assert startup.phases == pathfinder_auto.startup_timeline.phases
+    assert eject.phases == pathfinder_auto.raise_eject_timeline.phases
+
+    startup, after = sp.to_timelines(
+        plan(sp.pathfinder_actions('straight-forward', 3, eject=False))
+    )
+    assert startup.phases == pathfinder_auto.startup_timeline.phases
+    assert len(after) == 0
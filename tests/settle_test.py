@@ -0,0 +1,100 @@
+"""
+Tests for the settle detector.
+"""
+from settle import SettleDetector, max_abs
+
+
+def test_max_abs():
+    assert max_abs(-3) == 3
+    assert max_abs([1, -4, 2]) == 4
+
+
+def test_settles_immediately_without_dwell():
+    detector = SettleDetector(1)
+    assert not detector.update(2, now=0)
+    assert detector.update(0.5, now=0.02)
+    assert detector.settled
+    assert not detector.timed_out
+
+
+def test_dwell_time():
+    detector = SettleDetector(1, dwell_time=0.1)
+    assert not detector.update(0.5, now=0)
+    assert not detector.update(0.5, now=0.06)
+    assert detector.update(0.5, now=0.1)
+
+    # leaving the tolerance restarts the dwell time.
+    assert not detector.update(5, now=0.12)
+    assert not detector.update(0.5, now=0.14)
+    assert detector.update(0.5, now=0.25)
+
+
+def test_window_averages_error():
+    detector = SettleDetector(1, window=3)
+    detector.update(3, now=0)
+    detector.update(0, now=0.02)
+    assert detector.error == 1.5
+    detector.update(0, now=0.04)
+    assert detector.error == 1
+    assert detector.settled
+
+    # the oldest sample drops out of the window.
+    detector.update(0, now=0.06)
+    assert detector.error == 0
+
+
+def test_sequence_errors_use_worst():
+    detector = SettleDetector(1)
+    assert not detector.update([0.1, -2, 0.5], now=0)
+    assert detector.update([0.1, -0.9, 0.5], now=0.02)
+
+
+def test_rate_tolerance():
+    detector = SettleDetector(1, rate_tolerance=10)
+    detector.update(5, now=0)
+
+    # within tolerance, but swinging through the setpoint.
+    assert not detector.update(0.5, now=0.02)
+    assert detector.rate == 225
+    assert detector.update(0.4, now=0.04)
+
+    # a measured rate is used instead of the estimate.
+    assert not detector.update(0.4, now=0.06, rate=-20)
+
+
+def test_timeout():
+    detector = SettleDetector(1, timeout=1)
+    detector.reset(now=10)
+    assert not detector.update(5, now=10.5)
+    assert detector.update(5, now=11)
+    assert detector.timed_out
+    assert not detector.settled
+    assert detector.done
+
+
+def test_reset():
+    detector = SettleDetector(1, window=2, timeout=1)
+    detector.update(0, now=0)
+    assert detector.settled
+
+    detector.reset()
+    assert not detector.done
+    assert not detector.update(5, now=5)
+    assert detector.error == 5
+
+    # the timeout starts at the first update after reset() without a time.
+    assert not detector.update(5, now=5.5)
+    assert detector.update(5, now=6)
+
+
+def test_reset_forgets_window():
+    detector = SettleDetector(10, window=3)
+    for t in (0, 0.02, 0.04):
+        detector.update(500, now=t)
+
+    # the samples from before the reset don't count towards the average.
+    detector.reset()
+    assert not detector.update(400, now=0.06)
+    assert detector.error == 400
+    assert not detector.update(200, now=0.08)
+    assert detector.error == 300
@@ -0,0 +1,96 @@
+"""
+Validation of the NumPy trajectory generator against pathfinder.
+"""
+import math
+
+import numpy as np
+import pathfinder as pf
+import pytest
+
+from autonomous import pathfinder_auto
+from autonomous import spline_trajectory
+from autonomous import trajectory_store
+
+curvy_route = trajectory_store.Route(
+    [(0, 0, 0), (2, 1, math.pi / 2), (1.5, 3, math.pi)],
+    'hermite_quintic', pf.SAMPLES_HIGH, 0.02, 1.5, 2.0, 60.0
+)
+
+routes = dict(
+    (name, route._replace(fit='hermite_quintic'))
+    for name, route in pathfinder_auto.routes.items()
+)
+routes['curvy'] = curvy_route
+
+
+@pytest.mark.parametrize('name', sorted(routes))
+def test_matches_pathfinder(name):
+    route = routes[name]
+    expected = trajectory_store.generate(route)
+    actual = spline_trajectory.generate(
+        route.waypoints, route.dt,
+        route.max_velocity, route.max_acceleration, route.max_jerk
+    )
+
+    assert actual.dtype == trajectory_store.segment_dtype
+    assert len(actual) == len(expected)
+
+    # Arc lengths differ slightly with the number of samples used.
+    for field in ('position', 'velocity'):
+        np.testing.assert_allclose(actual[field], expected[field], atol=1e-3)
+    np.testing.assert_allclose(
+        actual['acceleration'], expected['acceleration'], atol=0.02
+    )
+
+    distance = np.hypot(
+        actual['x'] - expected['x'], actual['y'] - expected['y']
+    )
+    assert distance.max() < 1e-3
+
+    heading_error = (
+        (actual['heading'] - expected['heading'] + math.pi) % (2 * math.pi)
+        - math.pi
+    )
+    assert np.abs(heading_error).max() < 1e-3
+
+
+def test_respects_limits():
+    route = curvy_route
+    trajectory = spline_trajectory.generate(
+        route.waypoints, route.dt,
+        route.max_velocity, route.max_acceleration, route.max_jerk
+    )
+
+    assert trajectory['velocity'].max() <= route.max_velocity + 1e-9
+    assert np.abs(trajectory['acceleration']).max() <= (
+        route.max_acceleration + 1e-9
+    )
+    assert trajectory['velocity'][-1] == pytest.approx(0)
+
+    np.testing.assert_allclose(
+        (trajectory['x'][-1], trajectory['y'][-1]), (1.5, 3), atol=1e-6
+    )
+
+
+def test_accepts_xy_waypoints():
+    legs = np.array([
+        pathfinder_auto.ldiv_leg1, pathfinder_auto.ldiv_leg2
+    ])
+
+    with_angles = spline_trajectory.generate(
+        np.column_stack((legs, [0, 0])), 0.05, 1.0, 2.0, 60.0
+    )
+    without_angles = spline_trajectory.generate(legs, 0.05, 1.0, 2.0, 60.0)
+
+    np.testing.assert_array_equal(with_angles, without_angles)
+
+
+def test_swerve_modify_matches_pathfinder():
+    trajectory = spline_trajectory.generate(
+        curvy_route.waypoints, 0.05, 1.5, 2.0, 60.0
+    )
+
+    np.testing.assert_allclose(
+        spline_trajectory.swerve_modify(trajectory, 0.6, 0.5).tolist(),
+        trajectory_store.swerve_modify(trajectory, 0.6, 0.5).tolist()
+    )
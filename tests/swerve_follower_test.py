@@ -0,0 +1,108 @@
+"""
+Tests for the vectorized swerve trajectory follower.
+"""
+import math
+
+import numpy as np
+import pathfinder as pf
+from pathfinder.followers import EncoderFollower
+
+from autonomous import trajectory_store
+from autonomous.swerve_follower import SwerveFollower, module_array
+
+route = trajectory_store.Route(
+    [(0, 0, 0), (2, 1, 0)], 'hermite_cubic', pf.SAMPLES_LOW,
+    0.05, 1.5, 2.0, 60.0
+)
+
+
+def test_matches_encoder_followers():
+    modules = trajectory_store.swerve_modify(
+        trajectory_store.generate(route), 0.6, 0.5
+    )
+    gains = (1.0, 0.0, 0.2, 0.5, 0.1)
+
+    followers = []
+    for module in modules:
+        follower = EncoderFollower(trajectory_store.array_to_segments(module))
+        follower.configureEncoder(10, 534, 0.1)
+        follower.configurePIDVA(*gains)
+        followers.append(follower)
+
+    swerve_follower = SwerveFollower(module_array(modules), 534, 0.1)
+    swerve_follower.configure_pidva(*gains)
+    swerve_follower.configure_encoders([10] * 4)
+
+    rng = np.random.RandomState(0)
+    for _ in range(modules.shape[1] + 2):
+        ticks = rng.randint(0, 3000, 4)
+
+        expected_outputs = [
+            follower.calculate(int(tick))
+            for follower, tick in zip(followers, ticks)
+        ]
+        expected_headings = [follower.getHeading() for follower in followers]
+
+        outputs, headings = swerve_follower.calculate(ticks)
+        np.testing.assert_allclose(outputs, expected_outputs, atol=1e-9)
+        np.testing.assert_allclose(headings, expected_headings, atol=1e-9)
+
+    assert swerve_follower.finished
+    assert all(follower.isFinished() for follower in followers)
+
+    swerve_follower.reset()
+    assert not swerve_follower.finished
+
+
+def make_follower():
+    modules = trajectory_store.swerve_modify(
+        trajectory_store.generate(route), 0.6, 0.5
+    )
+
+    follower = SwerveFollower(module_array(modules), 534, 0.1)
+    follower.configure_pidva(1.0, 0.0, 0.2, 0.5, 0.1)
+    return follower
+
+
+def test_time_indexed_matches_stepping_on_segment_times():
+    stepped = make_follower()
+    timed = make_follower()
+    ticks = [120, 130, 140, 150]
+
+    i = 0
+    while not stepped.finished:
+        outputs, headings = stepped.calculate(ticks)
+        timed_outputs, timed_headings = timed.calculate_at(
+            i * route.dt, ticks
+        )
+
+        np.testing.assert_allclose(timed_outputs, outputs, atol=1e-9)
+        np.testing.assert_allclose(timed_headings, headings, atol=1e-9)
+        i += 1
+
+    assert timed.finished_at(i * route.dt)
+    assert not timed.finished_at((i - 0.5) * route.dt)
+
+
+def test_sample_interpolates_between_segments():
+    follower = make_follower()
+    traj = follower.trajectories
+
+    position, velocity, _, _ = follower.sample(2.5 * route.dt)
+    np.testing.assert_allclose(
+        position, (traj[2, :, 3] + traj[3, :, 3]) / 2
+    )
+    np.testing.assert_allclose(
+        velocity, (traj[2, :, 4] + traj[3, :, 4]) / 2
+    )
+
+    # Before the start and after the end, the first and last segments.
+    np.testing.assert_allclose(follower.sample(-1)[0], traj[0, :, 3])
+    np.testing.assert_allclose(follower.sample(1e3)[0], traj[-1, :, 3])
+
+    # Headings don't swing the long way round across +/- pi.
+    traj = traj.copy()
+    traj[0, :, 7] = math.pi - 0.1
+    traj[1, :, 7] = -math.pi + 0.1
+    _, _, _, heading = SwerveFollower(traj, 534, 0.1).sample(0.5 * route.dt)
+    np.testing.assert_allclose(np.abs(heading), math.pi, atol=1e-9)
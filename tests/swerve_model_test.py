@@ -0,0 +1,177 @@
+"""
+Tests for the simulated swerve modules.
+"""
+import math
+
+import numpy as np
+import pytest
+from ctre.talonsrx import TalonSRX
+
+import constants
+from simulation import SwerveModuleModel
+from simulation.swerve_model import module_positions
+from swerve.constants import swerve_defaults
+
+ControlMode = TalonSRX.ControlMode
+
+
+def make_model(config=None):
+    model = SwerveModuleModel(
+        config or constants.swerve_config,
+        constants.chassis_length, constants.chassis_width
+    )
+
+    # just the Talon fields the model reads.
+    can = {}
+    for talon_id in model.steer_ids + model.drive_ids:
+        can[talon_id] = {
+            'control_mode': ControlMode.PercentOutput, 'value': 0,
+            'pid0_target': 0, 'analog_position': 0, 'quad_position': 0,
+        }
+
+    return model, {'CAN': can}
+
+
+def command(model, hal_data, name, angle=None, velocity=None):
+    # steer a module to an angle (radians), and drive it at a velocity
+    # (ticks / 100ms), the way swerve.SwerveModule does.
+    i = model.names.index(name)
+    can = hal_data['CAN']
+
+    if angle is not None:
+        steer = can[model.steer_ids[i]]
+        steer['control_mode'] = ControlMode.Position
+        steer['pid0_target'] = model.steer_offsets[i] + angle * 512 / math.pi
+
+    if velocity is not None:
+        drive = can[model.drive_ids[i]]
+        drive['control_mode'] = ControlMode.Velocity
+        drive['pid0_target'] = velocity * model.drive_sign[i]
+
+
+def run(model, hal_data, duration, dt=0.01):
+    for _ in range(int(round(duration / dt))):
+        result = model.update(hal_data, dt)
+    return result
+
+
+def command_chassis(model, hal_data, forward, right, rotate_cw):
+    # module velocities for a chassis velocity (feet / second, radians /
+    # second): a module at (x, y) moves at (forward - w y, right + w x).
+    for name, (x, y) in zip(model.names, model.positions):
+        vx = forward - rotate_cw * y
+        vy = right + rotate_cw * x
+        command(
+            model, hal_data, name, math.atan2(vy, vx),
+            math.hypot(vx, vy) / model.velocity_conversion
+        )
+
+
+def test_steer_response():
+    model, hal_data = make_model()
+    start = model.steer_pos.copy()
+
+    command(model, hal_data, 'Front Right', angle=100 * math.pi / 512)
+    run(model, hal_data, model.steer_time_constant)
+
+    # first order: 63% of the way there after one time constant.
+    moved = model.steer_pos - start
+    assert moved[0] == pytest.approx(100 * (1 - math.exp(-1)), abs=0.5)
+    assert np.all(moved[1:] == 0)
+
+    # large moves are slew rate limited.
+    command(model, hal_data, 'Front Right', angle=2 * math.pi)
+    before = model.steer_pos[0]
+    run(model, hal_data, 0.1)
+    assert model.steer_pos[0] - before == pytest.approx(
+        model.steer_max_rate * 0.1
+    )
+
+
+def test_drive_response():
+    model, hal_data = make_model()
+
+    command(model, hal_data, 'Back Right', angle=0, velocity=200)
+    run(model, hal_data, model.drive_time_constant)
+
+    i = model.names.index('Back Right')
+    assert model.drive_vel[i] == pytest.approx(
+        200 * (1 - math.exp(-1)), abs=0.5
+    )
+
+    # the commanded speed is limited to free speed.
+    command(model, hal_data, 'Back Right', velocity=10000)
+    run(model, hal_data, 2)
+    assert model.drive_vel[i] == pytest.approx(
+        model.drive_free_speed, abs=0.5
+    )
+    assert model.drive_current[i] == pytest.approx(
+        model.drive_free_current, abs=0.1
+    )
+
+
+def test_sensors_are_quantized():
+    model, hal_data = make_model()
+    can = hal_data['CAN']
+
+    for name in model.names:
+        command(model, hal_data, name, angle=0.123, velocity=123.4)
+    run(model, hal_data, 0.37)
+
+    for i in range(len(model.names)):
+        steer = can[model.steer_ids[i]]
+        drive = can[model.drive_ids[i]]
+
+        assert steer['analog_position'] == int(round(model.steer_pos[i]))
+        assert steer['analog_in_raw'] == steer['analog_position'] % 1024
+        assert drive['quad_position'] == int(model.drive_pos[i])
+        assert drive['quad_velocity'] == int(round(model.drive_vel[i]))
+
+        for value in (
+            steer['analog_position'], steer['analog_in_raw'],
+            drive['quad_position'], drive['quad_velocity'],
+        ):
+            assert isinstance(value, int)
+
+    # encoder resets by robot code are kept.
+    can[model.drive_ids[0]]['quad_position'] = 0
+    model.update(hal_data, 0.01)
+    assert abs(model.drive_pos[0]) < 20
+
+
+@pytest.mark.parametrize('velocity', [
+    (3, 0, 0), (0, 2, 0), (0, 0, 1.5), (2, -1, 0.5),
+])
+def test_chassis_velocity(velocity):
+    model, hal_data = make_model()
+
+    command_chassis(model, hal_data, *velocity)
+    strafe, forward, rotate_cw = run(model, hal_data, 2)
+
+    assert (forward, strafe, rotate_cw) == pytest.approx(velocity, abs=0.02)
+
+
+def test_module_order():
+    # modules are found by name, whatever order they're configured in.
+    shuffled = constants.swerve_config[::-1]
+    results = []
+    for config in (constants.swerve_config, shuffled):
+        model, hal_data = make_model(config)
+        command_chassis(model, hal_data, 1, 0.5, 1)
+        results.append(run(model, hal_data, 2))
+
+        # each module's own CAN IDs, offset and position.
+        for name, steer_id, drive_id in config:
+            i = model.names.index(name)
+            assert model.steer_ids[i] == steer_id
+            assert model.drive_ids[i] == drive_id
+            assert model.steer_offsets[i] == swerve_defaults[name]['Offset']
+            np.testing.assert_allclose(
+                model.positions[i], np.multiply(module_positions[name], (
+                    constants.chassis_length / 12,
+                    constants.chassis_width / 12
+                ))
+            )
+
+    assert results[0] == pytest.approx(results[1])
+    assert results[0] == pytest.approx((0.5, 1, 1), abs=0.02)
@@ -0,0 +1,127 @@
+"""
+Tests for timed autonomous sequences.
+"""
+import pytest
+
+from autonomous import timeline
+from autonomous.timeline import Sequencer, Timeline
+
+
+def make_sequencer(phases):
+    log = []
+    actuators = [
+        (name, lambda value, name=name: log.append((name, value)))
+        for name in ('angle', 'speed', 'lift')
+    ]
+    return Sequencer(Timeline(phases), actuators), log
+
+
+def test_boundaries_and_states():
+    t = Timeline([
+        (1, {'lift': 1}),
+        (0.5, {'speed': 2}),
+        (0, {'lift': 0}),
+    ])
+
+    assert t.boundaries == [1, 1.5, 1.5]
+    assert t.duration == 1.5
+    assert t.states[1] == {'lift': 1, 'speed': 2}
+    assert t.states[2] == {'lift': 0, 'speed': 2}
+
+    assert t.phase_at(0) == 0
+    assert t.phase_at(0.99) == 0
+    assert t.phase_at(1) == 1
+    assert t.phase_at(1.5) == 3
+
+
+def test_invalid_phases():
+    with pytest.raises(ValueError):
+        Timeline([(-1, {})])
+
+    with pytest.raises(ValueError):
+        Timeline([(1, {}, 'extra')])
+
+    with pytest.raises(ValueError):
+        Sequencer(Timeline([(1, {'winch': 1})]), [('lift', print)])
+
+
+def test_commands_only_on_transitions():
+    seq, log = make_sequencer([
+        (1, {'angle': 0, 'lift': -0.5}),
+        (1, {'lift': 0, 'speed': 100}),
+        (1, {'speed': 100, 'angle': 0}),
+        (0, {'speed': 0}),
+    ])
+
+    seq.start(10)
+    assert log == []
+    assert not seq.update(10)
+    assert log == [('angle', 0), ('lift', -0.5)]
+    del log[:]
+
+    assert not seq.update(10.5)
+    assert log == []
+
+    # commanded in actuator order, not the order in the phase.
+    assert not seq.update(11)
+    assert log == [('speed', 100), ('lift', 0)]
+    del log[:]
+
+    # targets that don't change aren't commanded again.
+    assert not seq.update(12.5)
+    assert seq.phase == 2
+    assert log == []
+
+    assert seq.update(13)
+    assert seq.finished
+    assert log == [('speed', 0)]
+
+
+def test_skipped_phases_and_parameters():
+    seq, log = make_sequencer([
+        (1, {'angle': 'drive angle', 'speed': 'drive speed'}),
+        (1, {'speed': 0, 'lift': 1}),
+        (1, {'lift': 0}),
+    ])
+
+    seq.start(0, {'drive angle': 0.5, 'drive speed': 250})
+    seq.update(0.02)
+    assert log == [('angle', 0.5), ('speed', 250)]
+    del log[:]
+
+    # a slow loop skips the middle phase entirely.
+    assert not seq.update(2.5)
+    assert seq.phase == 2
+    assert log == [('speed', 0), ('lift', 0)]
+
+
+def test_json_round_trip(tmpdir):
+    t = Timeline([(1, {'lift': -0.6}), (0, {'lift': 0})])
+    loaded = timeline.parse(t.to_json())
+    assert loaded.phases == t.phases
+
+    path = tmpdir.join('timeline.json')
+    path.write('[[0.5, {"claw": -0.5}], [0, {"claw": 0}]]')
+    loaded = timeline.load(str(path))
+    assert loaded.boundaries == [0.5, 0.5]
+
+    with pytest.raises(ValueError):
+        timeline.parse('{"lift": 1}')
+
+
+def test_text_round_trip():
+    t = Timeline([
+        (3, {'angle': 'drive angle', 'speed': 'drive speed'}),
+        (0.5, {'lift': -0.6, 'speed': 0}),
+    ])
+
+    text = t.to_text()
+    assert '"' not in text and "'" not in text
+    assert text == (
+        '3: angle=drive angle, speed=drive speed; 0.5: lift=-0.6, speed=0'
+    )
+    assert timeline.parse_text(text).phases == t.phases
+
+    for bad in ('lift=1', '1: lift', '1: =2', 'x: lift=1'):
+        with pytest.raises(ValueError):
+            timeline.parse_text(bad)
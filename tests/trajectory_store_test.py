@@ -0,0 +1,113 @@
+"""
+Tests for the on-disk trajectory store.
+"""
+import os
+
+import numpy as np
+import pathfinder as pf
+
+from autonomous import trajectory_store
+from autonomous.trajectory_store import Route, TrajectoryStore
+
+route = Route(
+    [(0, 0, 0), (2, 1, 0)], 'hermite_cubic', pf.SAMPLES_LOW,
+    0.05, 1.5, 2.0, 60.0
+)
+
+
+def test_route_key_depends_on_inputs():
+    assert trajectory_store.route_key(route) == trajectory_store.route_key(
+        Route(*route)
+    )
+
+    assert trajectory_store.route_key(route) != trajectory_store.route_key(
+        route._replace(waypoints=[(0, 0, 0), (2, 1.01, 0)])
+    )
+
+    assert trajectory_store.route_key(route) != trajectory_store.route_key(
+        route._replace(max_velocity=1.6)
+    )
+
+
+def test_segments_round_trip():
+    _, segments = pf.generate(
+        [pf.Waypoint(*wp) for wp in route.waypoints],
+        pf.FIT_HERMITE_CUBIC, route.samples, route.dt,
+        route.max_velocity, route.max_acceleration, route.max_jerk
+    )
+
+    array = trajectory_store.segments_to_array(segments)
+    assert array.dtype == trajectory_store.segment_dtype
+    assert len(array) == len(segments)
+
+    for original, copy in zip(
+        segments, trajectory_store.array_to_segments(array)
+    ):
+        for field in trajectory_store.segment_dtype.names:
+            assert getattr(copy, field) == getattr(original, field)
+
+
+def test_store_generates_once_and_memory_maps(tmpdir):
+    store = TrajectoryStore(str(tmpdir))
+    assert store.load('test', route) is None
+
+    array = store.get('test', route)
+    assert isinstance(array, np.memmap)
+    assert not array.flags.writeable
+    assert os.listdir(str(tmpdir)) == [os.path.basename(
+        store.path('test', route)
+    )]
+
+    # A fresh store loads the same file, rather than regenerating it.
+    mtime = os.path.getmtime(store.path('test', route))
+    reloaded = TrajectoryStore(str(tmpdir)).get('test', route)
+    assert os.path.getmtime(store.path('test', route)) == mtime
+    np.testing.assert_array_equal(reloaded, array)
+
+
+def test_store_replaces_stale_trajectories(tmpdir):
+    store = TrajectoryStore(str(tmpdir))
+    store.get('test', route)
+    store.get('other', route)
+
+    changed = route._replace(max_velocity=1.0)
+    array = store.get('test', changed)
+
+    assert sorted(os.listdir(str(tmpdir))) == sorted([
+        os.path.basename(store.path('test', changed)),
+        os.path.basename(store.path('other', route)),
+    ])
+    assert array['velocity'].max() <= 1.0 + 1e-9
+
+
+def test_store_module_trajectories(tmpdir):
+    store = TrajectoryStore(str(tmpdir))
+    modules = store.get_modules('test', route, 0.6, 0.5)
+
+    path = store.get('test', route)
+    modifier = pf.modifiers.SwerveModifier(
+        trajectory_store.array_to_segments(path)
+    )
+    modifier.modify(0.6, 0.5)
+
+    assert modules.shape == (4, len(path))
+    np.testing.assert_array_equal(
+        modules[0],
+        trajectory_store.segments_to_array(
+            modifier.getFrontRightTrajectory()
+        )
+    )
+    np.testing.assert_array_equal(
+        modules[3],
+        trajectory_store.segments_to_array(modifier.getBackLeftTrajectory())
+    )
+
+    # Changing the wheelbase keeps the path, but replaces the modules.
+    other = store.get_modules('test', route, 0.7, 0.5)
+    assert not np.array_equal(other, modules)
+    assert sorted(os.listdir(str(tmpdir))) == sorted([
+        os.path.basename(store.path('test', route)),
+        os.path.basename(store.path(
+            'test-modules', route, wheelbase_width=0.7, wheelbase_depth=0.5
+        )),
+    ])
@@ -1 +1,2 @@
 from .winch import Winch  # noqa: F401
+from .climb import ClimbController  # noqa: F401
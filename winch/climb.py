@@ -0,0 +1,175 @@
+"""
+Coordinated climbing with the winch and the lift.
+
+To climb, the driver raises the lift to hook the rope onto the bar, then
+holds the climb button. A :class:`ClimbController` then runs the winch and
+the lift together, through these phases:
+
+- **slack**: the winch reels in the rope's slack at full power, and the lift
+  lowers in step with it, reaching the bottom just as the slack runs out.
+  The lift's target height is interpolated from the winch position, so the
+  two stay in step however fast the winch actually turns; if the lift falls
+  behind, the winch is slowed down until it catches up.
+- **climb**: once the winch has taken up the slack (``constants.winch_slack``
+  ticks), it is carrying the robot's weight; it keeps reeling in at full
+  power while the lift is driven the rest of the way down at
+  ``constants.sync_power``.
+- **done**: the winch has reeled in ``climb_distance`` ticks past the slack,
+  or has stalled (its :class:`protection.MotorProtection` tripped, i.e. the
+  robot is pulled up against the bar). The winch is stopped; its gearbox
+  isn't backdrivable, so the robot stays up.
+
+Every phase change is decided from the winch position (or a stall), not
+from timers, so the climb goes as fast as the mechanism does. Releasing the
+button stops the climb, and holding it again carries on from wherever the
+winch is.
+
+If the lift hasn't found its zero, its height isn't known, so it is just
+left still until the slack is taken up.
+"""
+import wpilib
+
+import constants
+
+
+class ClimbController(object):
+    """
+    Runs the winch and lift together to climb.
+
+    Args:
+        winch (winch.Winch): the winch.
+        lift (lift.ManualControlLift): the lift.
+
+    Attributes:
+        phase (str): the current phase: 'idle', 'slack', 'climb' or 'done'.
+        stalled (bool): whether the climb finished because the winch
+            stalled.
+    """
+    winch_power = 1.0  #: winch output while climbing
+    climb_distance = 12000  #: ticks to reel in past the slack
+    lift_kP = 0.05  #: lift output per inch it is above its target height
+    #: how far, in inches, the lift can fall behind the winch: the winch
+    #: slows down from half this, and stops altogether at it
+    max_lift_lag = 4
+
+    def __init__(self, winch, lift):
+        self.winch = winch
+        self.lift = lift
+
+        self.phase = 'idle'
+        self.stalled = False
+
+        self.start_position = 0
+        self.start_height = 0
+
+    def load_config_values(self):
+        """Load the climb settings from Preferences."""
+        prefs = wpilib.Preferences.getInstance()
+
+        self.winch_power = prefs.getFloat(
+            "Climb: Winch Power", self.winch_power
+        )
+        self.climb_distance = prefs.getFloat(
+            "Climb: Distance", self.climb_distance
+        )
+        self.lift_kP = prefs.getFloat("Climb: Lift kP", self.lift_kP)
+        self.max_lift_lag = prefs.getFloat(
+            "Climb: Max Lift Lag", self.max_lift_lag
+        )
+
+    def update_smart_dashboard(self):
+        wpilib.SmartDashboard.putString("Climb Phase", self.phase)
+
+    @property
+    def finished(self):
+        """Whether the robot has finished climbing."""
+        return self.phase == 'done'
+
+    def start(self):
+        """
+        Start (or carry on) climbing from wherever the winch and lift are
+        now.
+        """
+        self.stalled = False
+        self.start_position = self.winch.get_position()
+        self.start_height = (
+            self.lift.get_height() if self.lift.lift_zero_found else 0
+        )
+        self.phase = self._position_phase(self.start_position)
+
+    def stop(self):
+        """
+        Stop climbing. This leaves the motors to whatever drives them next.
+        """
+        self.phase = 'idle'
+
+    def _position_phase(self, position):
+        if position >= constants.winch_slack + self.climb_distance:
+            return 'done'
+        elif position >= constants.winch_slack:
+            return 'climb'
+        else:
+            return 'slack'
+
+    def lift_target(self, position):
+        """
+        Get the height, in inches, the lift should be at for a winch
+        position: it lowers linearly from where it was when the climb
+        started, to the bottom when the slack runs out.
+        """
+        remaining = constants.winch_slack - position
+        total = constants.winch_slack - self.start_position
+        if remaining <= 0 or total <= 0:
+            return 0
+
+        return self.start_height * min(remaining / total, 1)
+
+    def update(self):
+        """
+        Run the climb. Call this once every robot loop while the climb
+        button is held.
+
+        Returns:
+            True once the robot has finished climbing.
+        """
+        if self.phase == 'idle':
+            self.start()
+
+        position = self.winch.get_position()
+        if self.phase != 'done':
+            if self.phase == 'climb' and self.winch.protection.stalled:
+                self.stalled = True
+                self.phase = 'done'
+            else:
+                self.phase = self._position_phase(position)
+
+        if self.phase == 'done':
+            self.winch.stop()
+            self.lift.setLiftPower(0)
+            return True
+
+        if self.phase == 'climb':
+            # (the bottom limit switch stops the lift.)
+            self.winch.set_power(self.winch_power)
+            self.lift.setLiftPower(constants.sync_power)
+            return False
+
+        if not self.lift.lift_zero_found:
+            self.winch.set_power(self.winch_power)
+            self.lift.setLiftPower(0)
+            return False
+
+        # Drive the lift towards its target height, lowering no faster than
+        # sync_power.
+        height = self.lift.get_height()
+        lag = height - self.lift_target(position)
+        power = self.lift.hold_power(height) + self.lift_kP * lag
+        self.lift.setLiftPower(
+            max(-constants.sync_power, min(constants.sync_power, power))
+        )
+
+        # Slow the winch down if the lift is falling behind.
+        scale = min(max(2 - 2 * lag / self.max_lift_lag, 0), 1)
+        self.winch.set_power(self.winch_power * scale)
+
+        return False
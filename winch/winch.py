@@ -5,6 +5,8 @@ Author: Chris McKinnon
 from ctre.talonsrx import TalonSRX
 import wpilib
 
+import protection
+
 
 class Winch:
     def __init__(self, talon_id):
@@ -15,14 +17,51 @@ class Winch:
         self.talon.setQuadraturePosition(0, 0)
         self.talon.setInverted(True)
 
+        # stall and overheating protection.
+        self.protection = protection.MotorProtection(
+            stall_current=80, stall_velocity=20, stall_time=0.25, cooldown=1,
+            continuous_current=40, thermal_time_constant=30
+        )
+        self.requested_power = 0
+        self.applied_power = 0
+
+    def load_config_values(self):
+        """Load the winch's protection thresholds from Preferences."""
+        self.protection.load_config_values("Winch")
+
     def forward(self):
-        self.talon.set(TalonSRX.ControlMode.PercentOutput, 0.75)
+        self.set_power(0.75)
 
     def reverse(self):
-        self.talon.set(TalonSRX.ControlMode.PercentOutput, -0.75)
+        self.set_power(-0.75)
 
     def stop(self):
-        self.talon.set(TalonSRX.ControlMode.PercentOutput, 0)
+        self.set_power(0)
+
+    def get_position(self):
+        """Get how much rope has been reeled in, in encoder ticks."""
+        return abs(self.talon.getSelectedSensorPosition(0))
+
+    def set_power(self, power):
+        self.requested_power = power
+        self.applied_power = self.protection.limit(power)
+        self.talon.set(TalonSRX.ControlMode.PercentOutput, self.applied_power)
+
+    def protect(self):
+        """
+        Sample the winch motor current and velocity, and limit the output if
+        the winch has stalled or the motor is overheating (see
+        :mod:`protection`). Call this once every robot loop.
+        """
+        self.protection.update(
+            self.talon.getOutputCurrent(),
+            self.talon.getSelectedSensorVelocity(0),
+            self.requested_power
+        )
+
+        # re-apply the last output if the limit on it has changed.
+        if self.protection.limit(self.requested_power) != self.applied_power:
+            self.set_power(self.requested_power)
 
     def update_smart_dashboard(self):
         wpilib.SmartDashboard.putNumber(